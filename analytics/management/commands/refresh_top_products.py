@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from analytics.rollups import get_config, refresh_top_products
+
+
+class Command(BaseCommand):
+    help = (
+        "Refreshes Category.top_product of every category, so sales that fell out of the last "
+        "STORE_ANALYTICS['TOP_PRODUCT_DAYS'] days stop counting even when no order is placed. Runs "
+        "forever, refreshing every --interval seconds, unless --once is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='refresh once and exit')
+        parser.add_argument('--interval', type=float, default=3600.0, help='seconds between refreshes')
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                started = time.perf_counter()
+                categories = refresh_top_products()
+                self.stdout.write(
+                    f'Refreshed the top product of {categories} categories over the last '
+                    f'{get_config()["TOP_PRODUCT_DAYS"]} days in {time.perf_counter() - started:.2f}s'
+                )
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
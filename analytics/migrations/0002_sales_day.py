@@ -0,0 +1,56 @@
+# Generated by Django 5.1.15 on 2026-10-18 21:51
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import F, Sum
+from django.utils import timezone
+
+
+def fill_sales_days(apps, schema_editor):
+    # The days of the orders already counted in the other rollups.
+    OrderRollupState = apps.get_model('analytics', 'OrderRollupState')
+    Order = apps.get_model('store', 'Order')
+    OrderItem = apps.get_model('store', 'OrderItem')
+    SalesDay = apps.get_model('analytics', 'SalesDay')
+    db = schema_editor.connection.alias
+
+    days = defaultdict(lambda: {'orders': 0, 'units': 0, 'revenue': Decimal(0)})
+    order_ids = list(OrderRollupState.objects.using(db).filter(counted=True).values_list('order_id', flat=True))
+    for start in range(0, len(order_ids), 1000):
+        chunk = order_ids[start:start + 1000]
+        created = dict(Order.objects.using(db).filter(id__in=chunk).values_list('id', 'datetime_created'))
+        for order_id, datetime_created in created.items():
+            days[timezone.localdate(datetime_created)]['orders'] += 1
+        for order_id, units, revenue in OrderItem.objects.using(db).filter(order_id__in=chunk) \
+                .values('order_id').annotate(units=Sum('quantity'), revenue=Sum(F('quantity') * F('unit_price'), output_field=models.DecimalField())) \
+                .values_list('order_id', 'units', 'revenue'):
+            totals = days[timezone.localdate(created[order_id])]
+            totals['units'] += units
+            totals['revenue'] += revenue
+    SalesDay.objects.using(db).bulk_create([SalesDay(date=day, **totals) for day, totals in days.items()])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('orders', models.IntegerField(default=0)),
+                ('units', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('date',), name='analytics_day_uniq')],
+            },
+        ),
+        migrations.RunPython(fill_sales_days, migrations.RunPython.noop),
+    ]
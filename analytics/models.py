@@ -0,0 +1,145 @@
+from django.db import connections, models
+
+from store.models import Category, Customer, Order, Product
+
+
+class RollupQuerySet(models.QuerySet):
+    def increment(self, keys, rows, combine=None, batch_size=500):
+        """
+        Adds `rows` (dicts keyed by attname) to the rollup rows with the same
+        `keys`, inserting the missing ones, in one INSERT ... ON CONFLICT per
+        batch. Fields are summed unless `combine` maps them to 'min', 'max'
+        or 'set'.
+        """
+        if not rows:
+            return 0
+        connection = connections[self.db]
+        quote = connection.ops.quote_name
+        meta = self.model._meta
+        table = quote(meta.db_table)
+        fields = [meta.get_field(name) for name in rows[0]]
+        columns = [quote(field.column) for field in fields]
+        combine = combine or {}
+
+        updates = []
+        for field, column in zip(fields, columns):
+            if field.name in keys:
+                continue
+            new = f'VALUES({column})' if connection.vendor == 'mysql' else f'excluded.{column}'
+            old = column if connection.vendor == 'mysql' else f'{table}.{column}'
+            how = combine.get(field.name, 'add')
+            if how == 'add':
+                value = f'{old} + {new}'
+            elif how == 'set':
+                value = new
+            else:
+                function = {'min': 'LEAST', 'max': 'GREATEST'}[how]
+                if connection.vendor == 'sqlite':
+                    function = how.upper()
+                value = f'{function}(COALESCE({old}, {new}), COALESCE({new}, {old}))'
+            updates.append(f'{column} = {value}')
+
+        if connection.vendor == 'mysql':
+            conflict = f'ON DUPLICATE KEY UPDATE {", ".join(updates)}'
+        else:
+            key_columns = ', '.join(quote(meta.get_field(name).column) for name in keys)
+            conflict = f'ON CONFLICT ({key_columns}) DO UPDATE SET {", ".join(updates)}'
+
+        placeholders = f'({", ".join(["%s"] * len(fields))})'
+        count = 0
+        with connection.cursor() as cursor:
+            for start in range(0, len(rows), batch_size):
+                batch = rows[start:start + batch_size]
+                params = [
+                    field.get_db_prep_save(row[field.attname], connection) for row in batch for field in fields
+                ]
+                cursor.execute(
+                    f'INSERT INTO {table} ({", ".join(columns)}) '
+                    f'VALUES {", ".join([placeholders] * len(batch))} {conflict}',
+                    params,
+                )
+                count += len(batch)
+        return count
+
+
+class ProductSalesDay(models.Model):
+    date = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='+')
+    orders = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    objects = RollupQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'date'], name='analytics_product_day_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['category', 'date'], name='analytics_prod_cat_date_idx'),
+            models.Index(fields=['date'], name='analytics_prod_date_idx'),
+        ]
+
+
+class SalesDay(models.Model):
+    """
+    The totals of a day over every category. An order with items in several
+    categories is one order here but one in each of their CategorySalesDay.
+    """
+    date = models.DateField()
+    orders = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    objects = RollupQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date'], name='analytics_day_uniq'),
+        ]
+
+
+class CategorySalesDay(models.Model):
+    date = models.DateField()
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='+')
+    orders = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    objects = RollupQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['category', 'date'], name='analytics_category_day_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['date'], name='analytics_cat_date_idx'),
+        ]
+
+
+class CustomerLifetimeValue(models.Model):
+    customer = models.OneToOneField(Customer, on_delete=models.CASCADE, primary_key=True, related_name='+')
+    orders = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    first_order_at = models.DateTimeField(null=True)
+    last_order_at = models.DateTimeField(null=True)
+
+    objects = RollupQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-revenue'], name='analytics_customer_rev_idx'),
+        ]
+
+
+class OrderRollupState(models.Model):
+    """
+    Whether an order is currently counted in the rollups. Applying an order
+    again is a no-op unless its status moved it in or out of the counted
+    set, which makes the updates safe to repeat.
+    """
+    order = models.OneToOneField(Order, on_delete=models.CASCADE, primary_key=True, related_name='+')
+    counted = models.BooleanField()
+    datetime_applied = models.DateTimeField(auto_now=True)
@@ -0,0 +1,145 @@
+"""
+Incremental maintenance of the sales rollups.
+
+`apply_orders` moves a batch of orders in or out of the rollups according
+to their status: canceled orders are not counted, every other order is.
+Which orders are counted is recorded in `OrderRollupState` in the same
+transaction as the increments, so applying an order twice, from a
+redelivered outbox event or an overlapping backfill, changes
+nothing. Two transactions applying the same new order can't both commit:
+the second one fails on the state's primary key and rolls back its
+increments.
+
+`refresh_top_products` runs after every applied batch for the categories
+it touched; as the TOP_PRODUCT_DAYS window moves on without sales,
+`manage.py refresh_top_products` refreshes every category.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import OuterRef, Subquery, Sum
+from django.utils import timezone
+
+from store.caching import bump_versions
+from store.models import Category, Order, OrderItem
+
+from .models import CategorySalesDay, CustomerLifetimeValue, OrderRollupState, ProductSalesDay, SalesDay
+
+
+def get_config():
+    return dict({'TOP_PRODUCT_DAYS': 30, 'MAX_RANGE_DAYS': 366}, **getattr(settings, 'STORE_ANALYTICS', {}))
+
+
+def _totals():
+    return {'orders': 0, 'units': 0, 'revenue': Decimal(0)}
+
+
+def apply_orders(order_ids):
+    """
+    Brings the rollups in line with the current status of `order_ids` and
+    returns the ids of the orders that changed them.
+    """
+    with transaction.atomic():
+        counted = dict(
+            OrderRollupState.objects.select_for_update()
+            .filter(order_id__in=order_ids)
+            .values_list('order_id', 'counted')
+        )
+        signs, orders = {}, {}
+        for order_id, status, customer_id, created in Order.objects.filter(id__in=order_ids) \
+                .values_list('id', 'status', 'customer_id', 'datetime_created'):
+            should_count = status != Order.ORDER_STATUS_CANCELED
+            if should_count != counted.get(order_id, False):
+                signs[order_id] = 1 if should_count else -1
+                orders[order_id] = (customer_id, created)
+        if not signs:
+            return set()
+
+        # State first, so a concurrent apply of the same new order fails
+        # before it has incremented anything.
+        now = timezone.now()
+        for sign in (1, -1):
+            OrderRollupState.objects \
+                .filter(order_id__in=[order_id for order_id in signs if order_id in counted and signs[order_id] == sign]) \
+                .update(counted=sign == 1, datetime_applied=now)
+        OrderRollupState.objects.bulk_create([
+            OrderRollupState(order_id=order_id, counted=True)
+            for order_id, sign in signs.items() if order_id not in counted
+        ])
+
+        products = defaultdict(_totals)
+        categories = defaultdict(_totals)
+        days = defaultdict(_totals)
+        customers = defaultdict(_totals)
+        category_orders = set()
+        for order_id, product_id, category_id, quantity, unit_price in OrderItem.objects \
+                .filter(order_id__in=signs) \
+                .values_list('order_id', 'product_id', 'product__category_id', 'quantity', 'unit_price'):
+            sign = signs[order_id]
+            customer_id, created = orders[order_id]
+            day = timezone.localdate(created)
+            revenue = quantity * unit_price * sign
+            for totals in (products[product_id, category_id, day], categories[category_id, day], days[day],
+                           customers[customer_id]):
+                totals['units'] += quantity * sign
+                totals['revenue'] += revenue
+            products[product_id, category_id, day]['orders'] += sign
+            if (order_id, category_id) not in category_orders:
+                category_orders.add((order_id, category_id))
+                categories[category_id, day]['orders'] += sign
+
+        for order_id, sign in signs.items():
+            customer_id, created = orders[order_id]
+            days[timezone.localdate(created)]['orders'] += sign
+            customer = customers[customer_id]
+            customer['orders'] += sign
+            if sign > 0:
+                customer['first_order_at'] = min(customer.get('first_order_at') or created, created)
+                customer['last_order_at'] = max(customer.get('last_order_at') or created, created)
+
+        ProductSalesDay.objects.increment(['product', 'date'], [
+            dict(product_id=product_id, date=day, category_id=category_id, **totals)
+            for (product_id, category_id, day), totals in products.items()
+        ], combine={'category': 'set'})
+        CategorySalesDay.objects.increment(['category', 'date'], [
+            dict(category_id=category_id, date=day, **totals)
+            for (category_id, day), totals in categories.items()
+        ])
+        SalesDay.objects.increment(['date'], [
+            dict(date=day, **totals) for day, totals in days.items()
+        ])
+        CustomerLifetimeValue.objects.increment(['customer'], [
+            dict(customer_id=customer_id, orders=totals['orders'], units=totals['units'],
+                 revenue=totals['revenue'], first_order_at=totals.get('first_order_at'),
+                 last_order_at=totals.get('last_order_at'))
+            for customer_id, totals in customers.items()
+        ], combine={'first_order_at': 'min', 'last_order_at': 'max'})
+
+        category_ids = {category_id for category_id, _ in categories}
+        transaction.on_commit(lambda: refresh_top_products(category_ids))
+    return set(signs)
+
+
+def refresh_top_products(category_ids=None):
+    """
+    Sets `Category.top_product` to the product with the most units sold in
+    the last TOP_PRODUCT_DAYS days, or to NULL when nothing sold.
+    """
+    since = timezone.localdate() - timedelta(days=get_config()['TOP_PRODUCT_DAYS'] - 1)
+    best = ProductSalesDay.objects \
+        .filter(category=OuterRef('pk'), date__gte=since) \
+        .values('product') \
+        .annotate(total_units=Sum('units'), total_revenue=Sum('revenue')) \
+        .filter(total_units__gt=0) \
+        .order_by('-total_units', '-total_revenue', 'product') \
+        .values('product')[:1]
+    categories = Category.objects.all()
+    if category_ids is not None:
+        categories = categories.filter(id__in=category_ids)
+    updated = categories.update(top_product=Subquery(best))
+    if updated:
+        bump_versions(Category)
+    return updated
@@ -0,0 +1,35 @@
+from django.db.models import DEFERRED
+from django.db.models.signals import post_init, post_save
+from django.dispatch import receiver
+
+from store.models import Order, OrderEvent
+from store.outbox import publish
+from store.signals import order_created, order_status_changed
+
+from .rollups import apply_orders
+
+
+@receiver(order_created)
+@receiver(order_status_changed)
+def roll_up_order(sender, order, **kwargs):
+    # Delivered from the outbox, possibly more than once.
+    apply_orders([order.id])
+
+
+@receiver(post_init, sender=Order)
+def remember_order_status(sender, instance, **kwargs):
+    instance._rollup_status = instance.__dict__.get('status', DEFERRED)
+
+
+@receiver(post_save, sender=Order)
+def roll_up_order_status(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    # New orders have no items yet, they are rolled up on order_created.
+    if created or raw or (update_fields is not None and 'status' not in update_fields):
+        return
+    # A deferred status isn't known to be unchanged, it is published anyway.
+    if instance._rollup_status == instance.status:
+        return
+    instance._rollup_status = instance.status
+    # Through the outbox rather than on commit, so a failing rollup is
+    # retried instead of failing the update that was already committed.
+    publish(instance, OrderEvent.EVENT_ORDER_STATUS_CHANGED)
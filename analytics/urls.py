@@ -0,0 +1,12 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'analytics'
+
+urlpatterns = [
+    path('sales/daily/', views.DailySalesView.as_view(), name='daily-sales'),
+    path('sales/categories/', views.CategorySalesView.as_view(), name='category-sales'),
+    path('sales/products/', views.ProductSalesView.as_view(), name='product-sales'),
+    path('customers/', views.CustomerValueView.as_view(), name='customer-value'),
+]
@@ -0,0 +1,91 @@
+from datetime import timedelta
+
+from django.db.models import F, Sum
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .models import CategorySalesDay, CustomerLifetimeValue, ProductSalesDay, SalesDay
+from .rollups import get_config
+
+TOTALS = {'orders': Sum('orders'), 'units': Sum('units'), 'revenue': Sum('revenue')}
+
+
+class ReportQuerySerializer(serializers.Serializer):
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    category = serializers.IntegerField(required=False)
+    ordering = serializers.ChoiceField(choices=['revenue', 'units', 'orders'], default='revenue')
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=10)
+
+    def validate(self, data):
+        data['end'] = data.get('end') or timezone.localdate()
+        data['start'] = data.get('start') or data['end'] - timedelta(days=29)
+        if data['start'] > data['end']:
+            raise serializers.ValidationError('start has to be before end')
+        max_days = get_config()['MAX_RANGE_DAYS']
+        if (data['end'] - data['start']).days >= max_days:
+            raise serializers.ValidationError(f'the range can not be longer than {max_days} days')
+        return data
+
+
+class ReportView(APIView):
+    """
+    Reads only the rollup tables, within a bounded date range, so the cost of
+    a report doesn't grow with the number of orders.
+    """
+    permission_classes = [IsAdminUser]
+    query_budget = 1
+
+    def get_params(self, request):
+        serializer = ReportQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data
+
+    def in_range(self, queryset, params):
+        queryset = queryset.filter(date__range=(params['start'], params['end']))
+        if 'category' in params:
+            queryset = queryset.filter(category_id=params['category'])
+        return queryset
+
+
+class DailySalesView(ReportView):
+    def get(self, request):
+        params = self.get_params(request)
+        # Summing CategorySalesDay would count an order once per category.
+        rollup = CategorySalesDay if 'category' in params else SalesDay
+        rows = self.in_range(rollup.objects, params) \
+            .values('date').annotate(**TOTALS).order_by('date')
+        return Response(list(rows))
+
+
+class CategorySalesView(ReportView):
+    def get(self, request):
+        params = self.get_params(request)
+        rows = self.in_range(CategorySalesDay.objects, params) \
+            .values('category_id', title=F('category__title')).annotate(**TOTALS) \
+            .order_by(f'-{params["ordering"]}', 'category_id')
+        return Response(list(rows))
+
+
+class ProductSalesView(ReportView):
+    def get(self, request):
+        params = self.get_params(request)
+        rows = self.in_range(ProductSalesDay.objects, params) \
+            .values('product_id', 'category_id', name=F('product__name')) \
+            .annotate(**TOTALS) \
+            .order_by(f'-{params["ordering"]}', 'product_id')[:params['limit']]
+        return Response(list(rows))
+
+
+class CustomerValueView(ReportView):
+    def get(self, request):
+        params = self.get_params(request)
+        rows = CustomerLifetimeValue.objects \
+            .filter(orders__gt=0) \
+            .order_by(f'-{params["ordering"]}', 'customer_id') \
+            .values('customer_id', 'orders', 'units', 'revenue', 'first_order_at', 'last_order_at',
+                    email=F('customer__user__email'))[:params['limit']]
+        return Response(list(rows))
@@ -0,0 +1,287 @@
+"""
+Settings shared by every profile of the config project. `dev` and
+`production` extend this module; values that differ per deployment are read
+from the environment.
+
+Generated by 'django-admin startproject' using Django 4.2.6.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/4.2/topics/settings/
+
+For the full list of settings and their values, see
+https://docs.djangoproject.com/en/4.2/ref/settings/
+"""
+import os
+from datetime import timedelta
+from pathlib import Path
+
+# Build paths inside the project like this: BASE_DIR / 'subdir'.
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+
+
+def env(name, default=None):
+    return os.environ.get(name, default)
+
+
+def env_bool(name, default=False):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def env_list(name, default=()):
+    value = os.environ.get(name)
+    if value is None:
+        return list(default)
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+
+# Quick-start development settings - unsuitable for production
+# See https://docs.djangoproject.com/en/4.2/howto/deployment/checklist/
+
+# SECURITY WARNING: keep the secret key used in production secret!
+SECRET_KEY = env('DJANGO_SECRET_KEY', 'django-insecure-6v%u=bi$e@hdokt$bezvuew4&vni%$d55xc(pq-&r(7)9)z77-')
+
+# SECURITY WARNING: don't run with debug turned on in production!
+DEBUG = False
+
+ALLOWED_HOSTS = env_list('DJANGO_ALLOWED_HOSTS')
+
+# Name of the settings profile, checked by core.checks.
+STORE_PROFILE = 'base'
+
+
+# Application definition
+
+INSTALLED_APPS = [
+    'django.contrib.admin',
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+    'django_filters',
+    'rest_framework',
+    'djoser',
+
+    # Local Apps
+    'store.apps.StoreConfig',
+    'core',
+    'analytics.apps.AnalyticsConfig',
+]
+
+MIDDLEWARE = [
+    'store.middleware.QueryBudgetMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+]
+
+ROOT_URLCONF = 'config.urls'
+
+TEMPLATES = [
+    {
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'DIRS': [],
+        'APP_DIRS': True,
+        'OPTIONS': {
+            'context_processors': [
+                'django.template.context_processors.debug',
+                'django.template.context_processors.request',
+                'django.contrib.auth.context_processors.auth',
+                'django.contrib.messages.context_processors.messages',
+            ],
+        },
+    },
+]
+
+WSGI_APPLICATION = 'config.wsgi.application'
+
+
+# Database
+# https://docs.djangoproject.com/en/4.2/ref/settings/#databases
+
+DATABASES = {
+    'default': {
+        'ENGINE': env('DB_ENGINE', 'django.db.backends.mysql'),
+        'NAME': env('DB_NAME', 'store2'),
+        'HOST': env('DB_HOST', 'localhost'),
+        'PORT': env('DB_PORT', ''),
+        'USER': env('DB_USER', 'root'),
+        'PASSWORD': env('DB_PASSWORD', '5471'),
+    }
+}
+
+
+# Password validation
+# https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
+
+AUTH_PASSWORD_VALIDATORS = [
+    {
+        'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator',
+    },
+]
+
+
+# Internationalization
+# https://docs.djangoproject.com/en/4.2/topics/i18n/
+
+LANGUAGE_CODE = 'en-us'
+
+TIME_ZONE = 'UTC'
+
+USE_I18N = True
+
+USE_TZ = True
+
+
+# Static files (CSS, JavaScript, Images)
+# https://docs.djangoproject.com/en/4.2/howto/static-files/
+
+STATIC_URL = 'static/'
+
+# Default primary key field type
+# https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
+
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+REST_FRAMEWORK = {
+    'COERCE_DECIMAL_TO_STRING': False,
+    # 'PAGE_SIZE': 10,
+    # 'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
+    'DEFAULT_AUTHENTICATION_CLASSES': (
+        'rest_framework_simplejwt.authentication.JWTAuthentication',
+    ),
+    # 'DEFAULT_PERMISSION_CLASSES': [
+    #     'rest_framework.permissions.IsAuthenticated',
+    # ]
+}
+
+# Tax added on top of Product.unit_price, as a decimal string.
+STORE_TAX_RATE = '0.09'
+
+# Response cache of the read-only product and category endpoints.
+# BACKEND may also be 'store.caching.DjangoCacheBackend' with OPTIONS {'ALIAS': 'default'}.
+# LocMemLRUBackend keeps the versions per process, so with several workers
+# a write only invalidates its own worker; production uses a shared cache.
+STORE_RESPONSE_CACHE = {
+    'BACKEND': 'store.caching.LocMemLRUBackend',
+    'TIMEOUT': 300,
+    'OPTIONS': {
+        'MAX_ENTRIES': 1024,
+    },
+}
+
+# Backend of the product ?search= parameter. 'auto' picks MySQL FULLTEXT or
+# SQLite FTS5 from the database vendor and falls back to
+# 'store.search.InvertedIndexBackend' (pure Python) everywhere else.
+STORE_SEARCH = {
+    'BACKEND': 'auto',
+}
+
+# Query counting of store.middleware.QueryBudgetMiddleware. SAMPLE_RATE is the
+# fraction of requests recorded, RAISE turns an exceeded `query_budget` of a
+# view into an error instead of a logged warning.
+STORE_QUERY_BUDGET = {
+    'SAMPLE_RATE': 0.05,
+    'N_PLUS_ONE_THRESHOLD': 5,
+    'RAISE': False,
+}
+
+# Delivery of the order_created outbox events. With DISPATCH_ON_COMMIT off
+# only `manage.py run_outbox_worker` delivers them.
+STORE_OUTBOX = {
+    'WORKERS': 4,
+    'MAX_ATTEMPTS': 8,
+    'BACKOFF_SECONDS': 2,
+    'LEASE_SECONDS': 300,
+    'DISPATCH_ON_COMMIT': True,
+}
+
+# Sales rollups of the analytics app. Category.top_product is the best seller
+# of the last TOP_PRODUCT_DAYS days, refreshed when orders are rolled up and
+# by `manage.py refresh_top_products` as days pass; reports cover at most
+# MAX_RANGE_DAYS.
+STORE_ANALYTICS = {
+    'TOP_PRODUCT_DAYS': 30,
+    'MAX_RANGE_DAYS': 366,
+}
+
+# Storage of the anonymous carts. BACKEND may also be 'store.carts.KVCartStore'
+# with OPTIONS {'URL': 'redis://localhost:6379/0'} (needs the redis package), or
+# {'CLIENT': 'store.carts.LocalKV', 'MAX_KEYS': 100000} for one process.
+# Database carts idle for TTL_DAYS are deleted by `manage.py sweep_carts`,
+# BATCH_SIZE carts per transaction, key-value carts expire after TTL_DAYS. The
+# sweeper halves its batches while one takes longer than MAX_BATCH_SECONDS and
+# sleeps between them to stay under DUTY_CYCLE of the wall time.
+STORE_CARTS = {
+    'BACKEND': 'store.carts.ORMCartStore',
+    'OPTIONS': {},
+    'TTL_DAYS': 30,
+    'BATCH_SIZE': 500,
+    'MAX_BATCH_SECONDS': 0.1,
+    'DUTY_CYCLE': 0.25,
+}
+
+SIMPLE_JWT = {
+    'AUTH_HEADER_TYPES': ('JWT', ),
+    'ACCESS_TOKEN_LIFETIME': timedelta(days=1),
+    'TOKEN_OBTAIN_SERIALIZER': 'store.authentication.TokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'store.authentication.TokenRefreshSerializer',
+}
+
+# Authentication of the store endpoints, see store.authentication. STATELESS
+# trusts the is_staff and customer_id claims of the token until it expires;
+# off, the user is read through the identity cache and checked to be active,
+# so deactivating or demoting a user takes effect within CACHE_TIMEOUT.
+# Cached users and customers live CACHE_TIMEOUT seconds at most, the permission
+# sets of store.permissions PERMISSION_CACHE_TIMEOUT, or until they change.
+STORE_AUTH = {
+    'STATELESS': True,
+    'CACHE_TIMEOUT': 60,
+    'PERMISSION_CACHE_TIMEOUT': 300,
+    'CACHE_MAX_ENTRIES': 10000,
+}
+
+DJOSER = {
+    'SERIALIZERS': {
+        'user_create': 'core.serializers.UserCreateSerializer',
+        'current_user': 'core.serializers.UserSerializer',
+
+    }
+}
+
+AUTH_USER_MODEL = 'core.CustomUser'
+
+# API logins check passwords in the pool of store.hashing, see STORE_HASHING.
+AUTHENTICATION_BACKENDS = ['store.authentication.HashingModelBackend']
+
+# Password hashing of API logins and registrations. WORKERS is the size of the
+# process pool, one per CPU when None, 0 to hash on the request thread. Past
+# MAX_PENDING hashes waiting or running, requests get a 429. A hash that
+# takes longer than TIMEOUT seconds, or a pool whose worker died, gets a 503.
+STORE_HASHING = {
+    'WORKERS': None,
+    'MAX_PENDING': 64,
+    'START_METHOD': 'spawn',
+    'TIMEOUT': 10,
+}
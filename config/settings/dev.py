@@ -0,0 +1,22 @@
+"""
+Local development: DEBUG, the debug toolbar and every request's queries
+recorded.
+"""
+from .base import *  # noqa: F401,F403
+from .base import INSTALLED_APPS, MIDDLEWARE, STORE_QUERY_BUDGET
+
+STORE_PROFILE = 'dev'
+
+DEBUG = True
+
+INSTALLED_APPS = INSTALLED_APPS + ['debug_toolbar']
+
+MIDDLEWARE = ['debug_toolbar.middleware.DebugToolbarMiddleware'] + MIDDLEWARE
+
+# Configure Internal IPs
+
+INTERNAL_IPS = [
+    "127.0.0.1",
+]
+
+STORE_QUERY_BUDGET = dict(STORE_QUERY_BUDGET, SAMPLE_RATE=1.0)
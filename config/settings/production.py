@@ -0,0 +1,69 @@
+"""
+Production profile. Everything deployment specific comes from the
+environment; core.checks refuses to start when a debug-only component is
+still enabled.
+"""
+from .base import *  # noqa: F401,F403
+from .base import DATABASES, REST_FRAMEWORK, STORE_AUTH, STORE_QUERY_BUDGET, TEMPLATES, env, env_bool, env_int
+
+STORE_PROFILE = 'production'
+
+DEBUG = env_bool('DJANGO_DEBUG', False)
+
+# Keep database connections open between requests instead of connecting on
+# every request; health checks replace a connection that went away. With
+# PostgreSQL, DB_POOL uses Django's connection pool instead, which requires
+# CONN_MAX_AGE = 0.
+DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+if DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql' and env_bool('DB_POOL'):
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default'].setdefault('OPTIONS', {})['pool'] = {
+        'min_size': env_int('DB_POOL_MIN_SIZE', 2),
+        'max_size': env_int('DB_POOL_MAX_SIZE', 10),
+    }
+else:
+    DATABASES['default']['CONN_MAX_AGE'] = env_int('DB_CONN_MAX_AGE', 600)
+
+TEMPLATES[0]['APP_DIRS'] = False
+TEMPLATES[0]['OPTIONS']['loaders'] = [
+    ('django.template.loaders.cached.Loader', [
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ]),
+]
+TEMPLATES[0]['OPTIONS']['context_processors'] = [
+    processor for processor in TEMPLATES[0]['OPTIONS']['context_processors']
+    if processor != 'django.template.context_processors.debug'
+]
+
+# JSON only, no browsable API. JSON_BACKEND=orjson switches to the orjson
+# based renderer and parser, which produce the same documents faster.
+if env('JSON_BACKEND', 'orjson') == 'orjson':
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'] = ['core.renderers.ORJSONRenderer']
+    REST_FRAMEWORK['DEFAULT_PARSER_CLASSES'] = ['core.parsers.ORJSONParser']
+else:
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'] = ['rest_framework.renderers.JSONRenderer']
+    REST_FRAMEWORK['DEFAULT_PARSER_CLASSES'] = ['rest_framework.parsers.JSONParser']
+
+# A cache every worker shares: a write in one worker bumps the response cache
+# versions the others read, which a per-process cache can't do.
+CACHES = {
+    'default': {
+        'BACKEND': env('CACHE_BACKEND', 'django.core.cache.backends.redis.RedisCache'),
+        'LOCATION': env('CACHE_LOCATION', 'redis://127.0.0.1:6379/0'),
+    },
+}
+STORE_RESPONSE_CACHE = {
+    'BACKEND': 'store.caching.DjangoCacheBackend',
+    'TIMEOUT': env_int('RESPONSE_CACHE_TIMEOUT', 300),
+    'OPTIONS': {
+        'ALIAS': 'default',
+    },
+}
+
+# Stateless tokens would keep deactivated and demoted users in for the rest
+# of the token lifetime; checked against the identity cache they are out
+# within STORE_AUTH['CACHE_TIMEOUT'].
+STORE_AUTH['STATELESS'] = env_bool('STORE_AUTH_STATELESS', False)
+
+STORE_QUERY_BUDGET['SAMPLE_RATE'] = float(env('QUERY_BUDGET_SAMPLE_RATE', STORE_QUERY_BUDGET['SAMPLE_RATE']))
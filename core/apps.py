@@ -1,4 +1,5 @@
 from django.apps import AppConfig
+from django.core.exceptions import ImproperlyConfigured
 
 
 class CoreConfig(AppConfig):
@@ -6,3 +7,10 @@ class CoreConfig(AppConfig):
     name = 'core'
 
     from . import signals
+
+    def ready(self):
+        from .checks import check_production_profile
+
+        errors = check_production_profile(None)
+        if errors:
+            raise ImproperlyConfigured('\n'.join(error.msg for error in errors))
@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.core.checks import Error, register
+from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.settings import api_settings
+
+
+@register()
+def check_production_profile(app_configs, **kwargs):
+    """
+    Debug-only components left enabled under config.settings.production.
+    Also run from CoreConfig.ready() so the process refuses to start.
+    """
+    if getattr(settings, 'STORE_PROFILE', None) != 'production':
+        return []
+
+    errors = []
+    if settings.DEBUG:
+        errors.append(Error('DEBUG is enabled under the production profile.', id='core.E001'))
+    if 'debug_toolbar' in settings.INSTALLED_APPS:
+        errors.append(Error('debug_toolbar is installed under the production profile.', id='core.E002'))
+    if any('debug_toolbar' in middleware for middleware in settings.MIDDLEWARE):
+        errors.append(Error('DebugToolbarMiddleware is enabled under the production profile.', id='core.E003'))
+    if any(issubclass(renderer, BrowsableAPIRenderer) for renderer in api_settings.DEFAULT_RENDERER_CLASSES):
+        errors.append(Error('The browsable API renderer is enabled under the production profile.', id='core.E004'))
+    if getattr(settings, 'STORE_QUERY_BUDGET', {}).get('RAISE'):
+        errors.append(Error("STORE_QUERY_BUDGET['RAISE'] is on under the production profile.", id='core.E005'))
+    if settings.SECRET_KEY.startswith('django-insecure-'):
+        errors.append(Error('DJANGO_SECRET_KEY is not set, the development key is in use.', id='core.E006'))
+    if not response_cache_is_shared():
+        errors.append(Error(
+            "STORE_RESPONSE_CACHE keeps its versions per process, writes wouldn't invalidate other workers.",
+            id='core.E007',
+        ))
+    return errors
+
+
+def response_cache_is_shared():
+    config = getattr(settings, 'STORE_RESPONSE_CACHE', {})
+    if config.get('BACKEND', 'store.caching.LocMemLRUBackend') != 'store.caching.DjangoCacheBackend':
+        return False
+    alias = config.get('OPTIONS', {}).get('ALIAS', 'default')
+    backend = settings.CACHES.get(alias, {}).get('BACKEND', '')
+    return backend not in ('django.core.cache.backends.locmem.LocMemCache',
+                           'django.core.cache.backends.dummy.DummyCache')
@@ -1,11 +1,18 @@
+from djoser.conf import settings as djoser_settings
 from djoser.serializers import UserCreateSerializer as DjoserUserCreateSerializer
 from djoser.serializers import UserSerializer as DjoserUserSerializer
 
+from store.accounts import register_user
+
 
 class UserCreateSerializer(DjoserUserCreateSerializer):
     class Meta(DjoserUserCreateSerializer.Meta):
         fields = ['id', 'username', 'password', 'email', 'first_name', 'last_name',]
 
+    def perform_create(self, validated_data):
+        # The user and its customer in one transaction.
+        return register_user(is_active=not djoser_settings.SEND_ACTIVATION_EMAIL, **validated_data)
+
 
 class UserSerializer(DjoserUserSerializer):
     class Meta(DjoserUserSerializer.Meta):
@@ -0,0 +1,196 @@
+"""
+Creation of users together with their customer.
+
+`register_user` is the registration path of `auth/users/`: the password is
+hashed in the executor of `store.hashing`, then the user and the customer
+are inserted in one transaction, instead of the customer being created by
+the post_save signal of the user in a second round trip.
+
+`UserImporter` is behind `manage.py import_users`. Rows are validated a
+batch at a time, their passwords hashed in a process pool, since PBKDF2 is
+CPU bound and holds the GIL, and the users and customers written with
+`bulk_create`, which never sends the signal, in one transaction per batch.
+"""
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connections, transaction
+
+from . import hashing
+from .models import Customer
+from .serializer import UserImportSerializer
+
+
+def register_user(password=None, phone_number=None, birth_date=None, **fields):
+    """
+    Creates a user and its customer, the password hashed beforehand so the
+    transaction only holds the two inserts.
+    """
+    user = get_user_model()(password=hashing.make_password(password), **fields)
+    # Normalizes the username and email like create_user.
+    user.clean()
+    # Tells the post_save handler the customer is created here.
+    user._creating_customer = True
+    with transaction.atomic():
+        user.save()
+        Customer.objects.create(user=user, phone_number=phone_number or None, birth_date=birth_date)
+    return user
+
+
+def bulk_create_users(users, batch_size=None):
+    """
+    `bulk_create` of `users` that also sets their primary keys on backends
+    that can't return them from the INSERT, such as MySQL, by reading them
+    back by username. Must run in the transaction of the insert.
+    """
+    User = get_user_model()
+    User.objects.bulk_create(users, batch_size=batch_size)
+    if not connections[User.objects.db].features.can_return_rows_from_bulk_insert:
+        ids = dict(User.objects.filter(username__in=[user.username for user in users])
+                   .values_list('username', 'id'))
+        for user in users:
+            user.pk = ids[user.username]
+    return users
+
+
+def hash_passwords(passwords, executor=None):
+    """
+    Hashes every password, None for an unusable one, in the processes of
+    `executor` when given.
+    """
+    if executor is None:
+        return [make_password(password) for password in passwords]
+    return list(executor.map(make_password, passwords, chunksize=max(1, len(passwords) // 64)))
+
+
+class UserImporter:
+    """
+    Rows are dicts in the shape of `UserImportSerializer`. A row either
+    gives the raw `password`, hashed by `workers` processes, or the
+    `password_hash` of another Django installation, stored as is; a row
+    with neither creates a user that can't log in.
+    """
+
+    def __init__(self, batch_size=1000, max_errors=1000, workers=None):
+        self.batch_size = batch_size
+        self.max_errors = max_errors
+        self.workers = workers
+        self.executor = None
+        self.usernames = set()
+        self.emails = set()
+        self.phone_numbers = set()
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+
+    def run(self, rows):
+        if self.workers != 0:
+            self.executor = ProcessPoolExecutor(self.workers, initializer=hashing.setup_worker)
+        try:
+            batch = []
+            for number, row in enumerate(rows, 1):
+                batch.append((number, row))
+                if len(batch) >= self.batch_size:
+                    self.import_batch(batch)
+                    batch = []
+            if batch:
+                self.import_batch(batch)
+        finally:
+            if self.executor is not None:
+                self.executor.shutdown()
+                self.executor = None
+        return self.result()
+
+    def result(self):
+        return {
+            'created': self.created,
+            'failed': self.failed,
+            'errors': sorted(self.errors, key=lambda error: error['row']),
+        }
+
+    def error(self, number, errors):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'row': number, 'errors': errors})
+
+    def validate(self, batch):
+        User = get_user_model()
+        valid = []
+        for number, row in batch:
+            if isinstance(row, ValueError):
+                self.error(number, {'non_field_errors': [f'Invalid JSON: {row}']})
+                continue
+            serializer = UserImportSerializer(data=row)
+            if serializer.is_valid():
+                data = dict(serializer.validated_data)
+                data['username'] = User.normalize_username(data['username'])
+                data['email'] = User.objects.normalize_email(data['email'])
+                data['phone_number'] = data.get('phone_number') or None
+                valid.append((number, data))
+            else:
+                self.error(number, serializer.errors)
+        return valid
+
+    def unique(self, valid):
+        """
+        Drops the rows whose username, email or phone number is already
+        taken, by an earlier row or a stored account, reading the stored
+        ones of the batch in a query per field.
+        """
+        User = get_user_model()
+        usernames = set(User.objects.filter(username__in=[data['username'] for _, data in valid])
+                        .values_list('username', flat=True))
+        emails = set(User.objects.filter(email__in=[data['email'] for _, data in valid])
+                     .values_list('email', flat=True))
+        phone_numbers = set(Customer.objects.filter(
+            phone_number__in=[data['phone_number'] for _, data in valid if data['phone_number']])
+            .values_list('phone_number', flat=True))
+
+        unique = []
+        for number, data in valid:
+            errors = {}
+            if data['username'] in usernames or data['username'] in self.usernames:
+                errors['username'] = ['A user with that username already exists.']
+            if data['email'] in emails or data['email'] in self.emails:
+                errors['email'] = ['A user with that email already exists.']
+            if data['phone_number'] and (data['phone_number'] in phone_numbers or
+                                         data['phone_number'] in self.phone_numbers):
+                errors['phone_number'] = ['A customer with that phone number already exists.']
+            if errors:
+                self.error(number, errors)
+                continue
+            self.usernames.add(data['username'])
+            self.emails.add(data['email'])
+            if data['phone_number']:
+                self.phone_numbers.add(data['phone_number'])
+            unique.append(data)
+        return unique
+
+    def import_batch(self, batch):
+        valid = self.validate(batch)
+        if not valid:
+            return
+        rows = self.unique(valid)
+        if not rows:
+            return
+
+        raw = [row for row in rows if 'password_hash' not in row]
+        for row, password in zip(raw, hash_passwords([row.pop('password', None) for row in raw], self.executor)):
+            row['password_hash'] = password
+
+        User = get_user_model()
+        users, customers = [], []
+        for row in rows:
+            users.append(User(
+                username=row['username'], email=row['email'], password=row.pop('password_hash'),
+                first_name=row.get('first_name', ''), last_name=row.get('last_name', ''),
+            ))
+            customers.append(Customer(phone_number=row['phone_number'], birth_date=row.get('birth_date')))
+
+        with transaction.atomic():
+            bulk_create_users(users, batch_size=self.batch_size)
+            for user, customer in zip(users, customers):
+                customer.user_id = user.pk
+            Customer.objects.bulk_create(customers, batch_size=self.batch_size)
+        self.created += len(users)
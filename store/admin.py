@@ -5,6 +5,7 @@ from django.urls import reverse
 from django.utils.html import format_html
 from django.utils.http import urlencode
 
+from .caching import bump_versions
 from .models import Category, Comment, Customer, Order, OrderItem, Product, CartItem, Cart
 
 
@@ -63,11 +64,6 @@ class ProductAdmin(admin.ModelAdmin):
     def product_category(self, product: Product):
         return product.category.title
 
-    def get_queryset(self, request):
-        return super().get_queryset(request) \
-            .prefetch_related('comments') \
-            .annotate(comments_count=Count('comments'))
-
     @admin.display(ordering='comments_count', description='# comments')
     def num_of_comments(self, product: Product):
         url = (
@@ -84,6 +80,7 @@ class ProductAdmin(admin.ModelAdmin):
     @admin.action(description='Clear Inventory')
     def clear_inventory(self, request, queryset):
         update_count = queryset.update(inventory=0)
+        bump_versions(Product)
         self.message_user(
             request,
             f'{update_count} of products inventories cleard to zero.',
@@ -110,6 +107,7 @@ class OrderAdmin(admin.ModelAdmin):
         ]
     list_per_page = 10
     list_editable = ['status']
+    list_select_related = ['customer__user']
     ordering = ['-datetime_created']
     search_fields = ['id']
     inlines = [OrderItemInline]
@@ -117,7 +115,6 @@ class OrderAdmin(admin.ModelAdmin):
     def get_queryset(self, request: HttpRequest):
         return super()\
                 .get_queryset(request)\
-                .prefetch_related('items') \
                 .annotate(items_count=Count('items'))
 
     @admin.display(ordering='items_count', description='# items')
@@ -129,6 +126,7 @@ class OrderAdmin(admin.ModelAdmin):
 class CommentAdmin(admin.ModelAdmin):
     list_display = ['id', 'product', 'status', 'datetime_created']
     list_per_page = 10
+    list_select_related = ['product']
     list_editable = ['status']
     ordering = ['-datetime_created']
     autocomplete_fields = ['product']
@@ -138,6 +136,7 @@ class CommentAdmin(admin.ModelAdmin):
 class CustomerAdmin(admin.ModelAdmin):
     list_display = ['first_name', 'last_name', 'email', 'phone_number']
     list_per_page = 10
+    list_select_related = ['user']
     ordering = ['user__last_name', 'user__first_name']
     search_fields = ['user__first_name__istartswith', 'user__last_name__istartswith']
 
@@ -160,6 +159,7 @@ class OrderItemAdmin(admin.ModelAdmin):
                     'unit_price',
                     ]
     list_per_page = 10
+    list_select_related = ['product']
     autocomplete_fields = ['product']
 
 
@@ -177,7 +177,7 @@ class CartInline(admin.TabularInline):
 @admin.register(Cart)
 class CartAdmin(admin.ModelAdmin):
     list_display = [
-        'id', 'created_at',
+        'id', 'created_at', 'last_activity',
     ]
     inlines = [CartInline]
 
@@ -0,0 +1,105 @@
+"""
+Async versions of the hot read endpoints for the ASGI application.
+
+They reuse the querysets, filters and compiled serializers of the DRF
+viewsets but are plain async Django views: the ORM is driven through its
+async API (`acount`, `aget`, `aiterator`), so the views never block the
+event loop. Only anonymous reads are served here, the DRF viewsets stay the
+write path.
+"""
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .carts import get_cart_store
+from .fast_serializers import compile_serializer
+from .filter import ProductFilter
+from .models import Cart, Product
+from .paginations import DefaultPagination
+from .renderers import get_json_renderer
+from .search import get_search_backend
+from .serializer import CartSerializer, CategorySerializer, ProductSerializer
+from .views import CategoryViewSet, ProductViewSet
+
+
+def render(data, status=200):
+    return HttpResponse(get_json_renderer().render(data), content_type='application/json', status=status)
+
+
+def not_found(model):
+    return render({'detail': f'No {model._meta.object_name} matches the given query.'}, status=404)
+
+
+def order_queryset(request, queryset, ordering_fields):
+    # Same rules as OrderingFilter: unknown fields are ignored.
+    ordering = [
+        field.strip() for field in request.GET.get('ordering', '').split(',')
+        if field.strip().lstrip('-') in ordering_fields
+    ]
+    return queryset.order_by(*ordering) if ordering else queryset
+
+
+async def paginate(request, queryset, serialize):
+    """
+    Page number pagination with the response shape of DefaultPagination.
+    """
+    page_size = DefaultPagination.page_size
+    count = await queryset.acount()
+    try:
+        page = int(request.GET.get('page', 1))
+    except ValueError:
+        page = 0
+    last_page = max(1, -(-count // page_size))
+    if page < 1 or page > last_page:
+        return render({'detail': 'Invalid page.'}, status=404)
+
+    start = (page - 1) * page_size
+    results = [serialize(row) async for row in queryset[start:start + page_size].aiterator()]
+
+    url = request.build_absolute_uri()
+    next_link = replace_query_param(url, 'page', page + 1) if page < last_page else None
+    if page <= 1:
+        previous_link = None
+    elif page == 2:
+        previous_link = remove_query_param(url, 'page')
+    else:
+        previous_link = replace_query_param(url, 'page', page - 1)
+    return render({'count': count, 'next': next_link, 'previous': previous_link, 'results': results})
+
+
+async def product_list(request):
+    filterset = ProductFilter(request.GET, queryset=ProductViewSet.queryset.all(), request=request)
+    if not filterset.is_valid():
+        return render(filterset.errors, status=400)
+    queryset = filterset.qs
+
+    terms = request.GET.get('search', '').strip()
+    if terms:
+        # Backends may run a query to rank the matches; one hop for all of it.
+        queryset = await sync_to_async(get_search_backend().search)(queryset, terms)
+        if not request.GET.get('ordering'):
+            queryset = queryset.order_by('-search_rank', 'id')
+    queryset = order_queryset(request, queryset, ProductViewSet.ordering_fields)
+
+    row = compile_serializer(ProductSerializer).bind({'request': request})
+    return await paginate(request, queryset, row)
+
+
+async def product_detail(request, pk):
+    try:
+        product = await ProductViewSet.queryset.aget(pk=pk)
+    except Product.DoesNotExist:
+        return not_found(Product)
+    return render(compile_serializer(ProductSerializer).one(product, {'request': request}))
+
+
+async def category_list(request):
+    row = compile_serializer(CategorySerializer).bind()
+    return render([row(category) async for category in CategoryViewSet.queryset.aiterator()])
+
+
+async def cart_detail(request, pk):
+    cart = await get_cart_store().aget(pk)
+    if cart is None:
+        return not_found(Cart)
+    return render(compile_serializer(CartSerializer).one(cart))
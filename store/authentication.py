@@ -0,0 +1,263 @@
+"""
+JWT authentication without the user query of every request.
+
+Tokens obtained from `auth/jwt/create/` carry `is_staff` and `customer_id`
+claims next to the user id. With STORE_AUTH['STATELESS'] on,
+`StatelessJWTAuthentication` trusts them and authenticates as a `ClaimsUser`
+without touching the database; anything not in the claims, e.g. the
+permissions, comes from the user loaded through the identity cache. With it
+off, the user itself is read through the cache, still checked to be active.
+Permission checks of a `ClaimsUser` go through the permission cache of
+`store.permissions`.
+
+The identity cache keeps users and customers for STORE_AUTH['CACHE_TIMEOUT']
+seconds and is cleared for a user when it or its customer is saved or
+deleted. Clearing is per process, so other workers may see the old values
+until they expire, and claims stay as issued until the token expires: with
+STATELESS on, a deactivated or demoted user keeps its access for the rest of
+ACCESS_TOKEN_LIFETIME, which is why production turns it off. Refreshing
+reissues the claims from the user.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework.request import Request
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer as BaseTokenObtainPairSerializer
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer as BaseTokenRefreshSerializer
+from rest_framework_simplejwt.tokens import AccessToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .caching import LocMemLRUBackend
+from .hashing import get_hashing_executor
+from .models import Customer
+from .permissions import has_perms
+
+
+class IdentityCache:
+    def __init__(self, timeout=60, max_entries=10000, stateless=True):
+        self.backend = LocMemLRUBackend(max_entries)
+        self.timeout = timeout
+        self.stateless = stateless
+
+    def get_user(self, user_id):
+        key = f'user:{user_id}'
+        user = self.backend.get(key)
+        if user is None:
+            user = get_user_model().objects.filter(**{api_settings.USER_ID_FIELD: user_id}).first()
+            if user is None:
+                return None
+            self.backend.set(key, user, self.timeout)
+        return user
+
+    def get_customer(self, user_id):
+        key = f'customer:{user_id}'
+        customer = self.backend.get(key)
+        if customer is None:
+            customer = Customer.objects.filter(user_id=user_id).first()
+            if customer is None:
+                return None
+            self.backend.set(key, customer, self.timeout)
+        return customer
+
+    def invalidate(self, user_id):
+        self.backend.delete(f'user:{user_id}')
+        self.backend.delete(f'customer:{user_id}')
+
+    def clear(self):
+        self.backend.clear()
+
+
+_identity_cache = None
+
+
+def get_identity_cache():
+    global _identity_cache
+    if _identity_cache is None:
+        config = getattr(settings, 'STORE_AUTH', {})
+        _identity_cache = IdentityCache(
+            timeout=config.get('CACHE_TIMEOUT', 60),
+            max_entries=config.get('CACHE_MAX_ENTRIES', 10000),
+            stateless=config.get('STATELESS', True),
+        )
+    return _identity_cache
+
+
+@receiver(setting_changed)
+def reset_identity_cache(setting, **kwargs):
+    global _identity_cache
+    if setting == 'STORE_AUTH':
+        _identity_cache = None
+
+
+def get_customer_id(user):
+    """
+    The customer id of an authenticated user, from its token when it has
+    the claim.
+    """
+    customer_id = getattr(user, 'customer_id', None)
+    if customer_id is None:
+        customer = get_identity_cache().get_customer(user.pk)
+        customer_id = customer.pk if customer is not None else None
+    return customer_id
+
+
+def set_claims(token, user):
+    token['is_staff'] = user.is_staff
+    customer = Customer.objects.filter(user=user).values_list('id', flat=True).first()
+    if customer is not None:
+        token['customer_id'] = customer
+    elif 'customer_id' in token:
+        del token['customer_id']
+
+
+class TokenObtainPairSerializer(BaseTokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        set_claims(token, user)
+        return token
+
+
+class TokenRefreshSerializer(BaseTokenRefreshSerializer):
+    """
+    Sets the claims of the new access token from the user as it is now,
+    rather than copying those of the refresh token, so a demoted user
+    doesn't stay staff for as long as it keeps refreshing.
+    """
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        access = AccessToken(data['access'])
+        user = get_user_model().objects.get(**{api_settings.USER_ID_FIELD: access[api_settings.USER_ID_CLAIM]})
+        set_claims(access, user)
+        data['access'] = str(access)
+        return data
+
+
+class ClaimsUser(TokenUser):
+    """
+    The user of a token: the id, `is_staff` and `customer_id` are read from
+    its claims, every other attribute from the cached user. Tokens issued
+    before the claims existed fall back to the cached user for them too.
+    """
+
+    @cached_property
+    def user(self):
+        user = get_identity_cache().get_user(self.id)
+        if user is None:
+            # Deleted since the token was issued, as StatelessJWTAuthentication
+            # reports it when it loads the user.
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+        return user
+
+    @cached_property
+    def is_staff(self):
+        if 'is_staff' in self.token:
+            return self.token['is_staff']
+        return self.user.is_staff
+
+    @cached_property
+    def customer_id(self):
+        if 'customer_id' in self.token:
+            return self.token['customer_id']
+        customer = get_identity_cache().get_customer(self.id)
+        return customer.pk if customer is not None else None
+
+    @cached_property
+    def is_superuser(self):
+        return self.user.is_superuser
+
+    @cached_property
+    def username(self):
+        return self.user.get_username()
+
+    def __str__(self):
+        return str(self.user)
+
+    def get_group_permissions(self, obj=None):
+        return self.user.get_group_permissions(obj)
+
+    def get_all_permissions(self, obj=None):
+        return self.user.get_all_permissions(obj)
+
+    def has_perm(self, perm, obj=None):
+        if obj is not None:
+            return self.user.has_perm(perm, obj)
+        return has_perms(self, [perm])
+
+    def has_perms(self, perm_list, obj=None):
+        if obj is not None:
+            return self.user.has_perms(perm_list, obj)
+        return has_perms(self, perm_list)
+
+    def has_module_perms(self, module):
+        return self.user.has_module_perms(module)
+
+    @property
+    def groups(self):
+        return self.user.groups
+
+    @property
+    def user_permissions(self):
+        return self.user.user_permissions
+
+    def __getattr__(self, attr):
+        if attr.startswith('_'):
+            raise AttributeError(attr)
+        if attr in self.token:
+            return self.token[attr]
+        return getattr(self.user, attr)
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        cache = get_identity_cache()
+        if cache.stateless:
+            return ClaimsUser(validated_token)
+
+        user = cache.get_user(validated_token[api_settings.USER_ID_CLAIM])
+        if user is None:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        return user
+
+
+class HashingModelBackend(ModelBackend):
+    """
+    `ModelBackend` checking the passwords of API requests in the hashing
+    executor. Other logins, e.g. of the admin, hash in process as usual.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if not isinstance(request, Request):
+            return super().authenticate(request, username, password, **kwargs)
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        executor = get_hashing_executor()
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # Hashes anyway, so a missing user takes as long as a wrong password.
+            executor.make_password(password)
+            return None
+        valid, upgrade = executor.check_password(password, user.password)
+        if not valid or not self.user_can_authenticate(user):
+            return None
+        if upgrade:
+            user.password = executor.make_password(password)
+            user.save(update_fields=['password'])
+        return user
@@ -0,0 +1,233 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.module_loading import import_string
+from rest_framework.response import Response
+
+
+class LocMemLRUBackend:
+    """
+    In-process LRU store. Version counters are kept apart from the entries so
+    that evicting a page can never reset a version and resurrect stale keys.
+    """
+
+    def __init__(self, max_entries=1024, **options):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None):
+        expires_at = time.monotonic() + timeout if timeout else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def get_versions(self, names):
+        with self._lock:
+            return [self._versions.setdefault(name, 1) for name in names]
+
+    def incr_version(self, name):
+        with self._lock:
+            self._versions[name] = self._versions.get(name, 1) + 1
+            return self._versions[name]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DjangoCacheBackend:
+    """
+    Stores entries in one of the `CACHES` aliases so every worker shares them.
+    Missing version keys start from the current time in nanoseconds, so a
+    version evicted by the cache server never comes back with an old value.
+    """
+    version_prefix = 'store:version:'
+
+    def __init__(self, alias='default', **options):
+        self.cache = caches[alias]
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, value, timeout=None):
+        self.cache.set(key, value, timeout)
+
+    def delete(self, key):
+        self.cache.delete(key)
+
+    def get_versions(self, names):
+        keys = [self.version_prefix + name for name in names]
+        found = self.cache.get_many(keys)
+        versions = []
+        for key in keys:
+            if key not in found:
+                self.cache.add(key, time.time_ns(), None)
+                found[key] = self.cache.get(key)
+            versions.append(found[key])
+        return versions
+
+    def incr_version(self, name):
+        key = self.version_prefix + name
+        try:
+            return self.cache.incr(key)
+        except ValueError:
+            self.cache.add(key, time.time_ns(), None)
+            return self.cache.incr(key)
+
+    def clear(self):
+        self.cache.clear()
+
+
+class ResponseCache:
+    def __init__(self, backend, timeout=300):
+        self.backend = backend
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        value = self.backend.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self.backend.set(key, value, self.timeout)
+
+    def versions(self, models):
+        return self.backend.get_versions([model._meta.label_lower for model in models])
+
+    def bump(self, *models):
+        for model in models:
+            self.backend.incr_version(model._meta.label_lower)
+
+    def scoped_version(self, model, scope):
+        """
+        Version of the rows of `model` that belong to `scope`, e.g. the
+        comments of one product, for entries that only depend on those.
+        """
+        return self.backend.get_versions([f'{model._meta.label_lower}:{scope}'])[0]
+
+    def bump_scoped(self, model, scopes):
+        for scope in set(scopes):
+            self.backend.incr_version(f'{model._meta.label_lower}:{scope}')
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'backend': f'{type(self.backend).__module__}.{type(self.backend).__name__}',
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / total, 4) if total else None,
+            'evictions': getattr(self.backend, 'evictions', None),
+        }
+
+
+_response_cache = None
+
+
+def get_response_cache():
+    global _response_cache
+    if _response_cache is None:
+        config = getattr(settings, 'STORE_RESPONSE_CACHE', {})
+        backend_class = import_string(config.get('BACKEND', 'store.caching.LocMemLRUBackend'))
+        options = {key.lower(): value for key, value in config.get('OPTIONS', {}).items()}
+        _response_cache = ResponseCache(backend_class(**options), config.get('TIMEOUT', 300))
+    return _response_cache
+
+
+def bump_versions(*models):
+    """
+    Bumps once the current transaction commits, immediately outside of one.
+    Bumping earlier would let a concurrent read cache the rows it can still
+    see under the new version, stale until the entry times out.
+    """
+    transaction.on_commit(lambda: get_response_cache().bump(*models))
+
+
+def bump_scoped_versions(model, scopes):
+    scopes = set(scopes)
+    transaction.on_commit(lambda: get_response_cache().bump_scoped(model, scopes))
+
+
+class CachedResponseMixin:
+    """
+    Caches the serialized data of `list` and `retrieve`.
+
+    The key is built from the route, the normalized query string and the
+    current version of every model in `cache_models`; writing any of those
+    models bumps its version, so old entries are simply never read again.
+    """
+    cache_models = ()
+    ignored_query_params = ('format',)
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def get_cache_key(self, request):
+        params = sorted(
+            (key, sorted(values))
+            for key, values in request.query_params.lists()
+            if key not in self.ignored_query_params and any(values)
+        )
+        cache = get_response_cache()
+        parts = [
+            request.get_host(),
+            self.basename,
+            self.action,
+            sorted(self.kwargs.items()),
+            params,
+            cache.versions(self.cache_models),
+        ]
+        return 'store:response:' + hashlib.sha1(repr(parts).encode()).hexdigest()
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        cache = get_response_cache()
+        key = self.get_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data, headers={'X-Cache': 'HIT'})
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data)
+        response['X-Cache'] = 'MISS'
+        return response
@@ -0,0 +1,381 @@
+"""
+Storage of the anonymous carts.
+
+`CartViewSet`, `CartItemsViewSet` and checkout go through the store of
+STORE_CARTS['BACKEND']. Both stores return `Cart` and `CartItem` instances
+shaped like the ORM querysets of the cart endpoints (items loaded with their
+product, `item_total` and `total_price` set), so the serializers and the
+API don't depend on the backend.
+
+`ORMCartStore` keeps carts in the Cart and CartItem tables. `KVCartStore`
+keeps every cart as one hash of `{product_id: quantity}` in a Redis
+compatible store whose TTL is pushed forward by every write, and only
+touches SQL to read the products and, at checkout, to create the order.
+"""
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.db.models import Prefetch
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from . import pricing
+from .models import Cart, CartItem, Product
+
+
+class ORMCartStore:
+    def __init__(self, **options):
+        pass
+
+    def cart_queryset(self):
+        return Cart.objects.prefetch_related(
+            Prefetch('items', queryset=CartItem.objects.select_related('product').annotate(
+                item_total=pricing.line_total_expression()))) \
+            .annotate(total_price=pricing.total_expression('items__quantity', 'items__product__unit_price'))
+
+    def item_queryset(self, cart_id):
+        return CartItem.objects.select_related('product').filter(cart_id=cart_id) \
+            .annotate(item_total=pricing.line_total_expression())
+
+    def create(self):
+        return Cart.objects.create()
+
+    def get(self, cart_id):
+        try:
+            return self.cart_queryset().get(pk=cart_id)
+        except Cart.DoesNotExist:
+            return None
+
+    async def aget(self, cart_id):
+        try:
+            return await self.cart_queryset().aget(pk=cart_id)
+        except Cart.DoesNotExist:
+            return None
+
+    def delete(self, cart_id):
+        with transaction.atomic():
+            CartItem.objects.filter(cart_id=cart_id)._raw_delete(CartItem.objects.db)
+            return Cart.objects.filter(pk=cart_id)._raw_delete(Cart.objects.db) > 0
+
+    def items(self, cart_id):
+        return self.item_queryset(cart_id)
+
+    def get_item(self, cart_id, item_id):
+        return self.item_queryset(cart_id).filter(pk=item_id).first()
+
+    def add_items(self, cart_id, quantities):
+        # Touching first doubles as the existence check of the cart.
+        if not Cart.objects.filter(pk=cart_id).touch():
+            return None
+        CartItem.objects.add_items(cart_id, quantities)
+        return list(self.item_queryset(cart_id).filter(product_id__in=quantities).order_by('id'))
+
+    def set_quantity(self, cart_id, item_id, quantity):
+        CartItem.objects.filter(cart_id=cart_id, pk=item_id).update(quantity=quantity)
+        Cart.objects.filter(pk=cart_id).touch()
+
+    def remove_item(self, cart_id, item_id):
+        CartItem.objects.filter(cart_id=cart_id, pk=item_id)._raw_delete(CartItem.objects.db)
+        Cart.objects.filter(pk=cart_id).touch()
+
+    @contextmanager
+    def checkout(self, cart_id):
+        """
+        Yields the `{product_id: quantity}` of the cart, None when there is
+        no such cart, and deletes the cart if the block succeeds. Must run
+        in a transaction: the cart row stays locked until it ends, which
+        serializes two checkouts of the same cart.
+        """
+        rows = list(
+            Cart.objects.select_for_update(of=('self',))
+            .filter(id=cart_id)
+            .values_list('items__product_id', 'items__quantity')
+        )
+        if not rows:
+            yield None
+            return
+        yield {product_id: quantity for product_id, quantity in rows if product_id is not None}
+        CartItem.objects.filter(cart_id=cart_id)._raw_delete(CartItem.objects.db)
+        Cart.objects.filter(id=cart_id)._raw_delete(Cart.objects.db)
+
+
+class LocalKV:
+    """
+    In-process stand-in for the Redis commands `KVCartStore` uses, with
+    their return values. Expired keys are dropped when read; past
+    `max_keys` the least recently used key is evicted.
+    """
+
+    def __init__(self, max_keys=100000, **options):
+        self.max_keys = max_keys
+        self._hashes = OrderedDict()
+        self._expires = {}
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def _get(self, name):
+        expires_at = self._expires.get(name)
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._drop(name)
+        value = self._hashes.get(name)
+        if value is not None:
+            self._hashes.move_to_end(name)
+        return value
+
+    def _get_or_create(self, name):
+        value = self._get(name)
+        if value is None:
+            value = self._hashes[name] = {}
+            while len(self._hashes) > self.max_keys:
+                self._drop(next(iter(self._hashes)))
+                self.evictions += 1
+        return value
+
+    def _drop(self, name):
+        self._expires.pop(name, None)
+        return self._hashes.pop(name, None) is not None
+
+    def set(self, name, value, ex=None, nx=False):
+        with self._lock:
+            if nx and self._get(name) is not None:
+                return None
+            self._drop(name)
+            self._get_or_create(name)
+            self._hashes[name] = str(value)
+            if ex is not None:
+                self._expires[name] = time.monotonic() + ex
+            return True
+
+    def exists(self, *names):
+        with self._lock:
+            return sum(self._get(name) is not None for name in names)
+
+    def hget(self, name, key):
+        with self._lock:
+            return (self._get(name) or {}).get(key)
+
+    def hgetall(self, name):
+        with self._lock:
+            return dict(self._get(name) or {})
+
+    def hexists(self, name, key):
+        with self._lock:
+            return key in (self._get(name) or {})
+
+    def hset(self, name, key=None, value=None, mapping=None):
+        items = dict(mapping or {})
+        if key is not None:
+            items[key] = value
+        with self._lock:
+            fields = self._get_or_create(name)
+            added = len(items.keys() - fields.keys())
+            fields.update((field, str(field_value)) for field, field_value in items.items())
+            return added
+
+    def hincrby(self, name, key, amount=1):
+        with self._lock:
+            fields = self._get_or_create(name)
+            fields[key] = str(int(fields.get(key, 0)) + amount)
+            return int(fields[key])
+
+    def hdel(self, name, *keys):
+        with self._lock:
+            fields = self._get(name)
+            if fields is None:
+                return 0
+            deleted = sum(fields.pop(key, None) is not None for key in keys)
+            if not fields:
+                self._drop(name)
+            return deleted
+
+    def delete(self, *names):
+        with self._lock:
+            return sum(self._drop(name) for name in names if self._get(name) is not None)
+
+    def expire(self, name, time_seconds):
+        with self._lock:
+            if self._get(name) is None:
+                return False
+            self._expires[name] = time.monotonic() + time_seconds
+            return True
+
+    def flushdb(self):
+        with self._lock:
+            self._hashes.clear()
+            self._expires.clear()
+
+    def __len__(self):
+        return len(self._hashes)
+
+
+class KVCartStore:
+    """
+    A cart is the hash `store:cart:<id>` holding its creation time and
+    `{product_id: quantity}`; quantities are changed with HINCRBY, so
+    concurrent adds don't lose updates. The id of an item is its product
+    id, unique within the cart like the (cart, product) constraint of the
+    rows.
+
+    A checkout claims the cart with the key `store:cart:<id>:checkout`,
+    which expires after `claim_seconds` in case the transaction of the
+    order rolls back after the cart was read. Claimed carts take no more
+    changes.
+
+    OPTIONS: URL connects to Redis with the `redis` package, otherwise
+    CLIENT is the dotted path of the client class (LocalKV by default),
+    built with the remaining options.
+    """
+    prefix = 'store:cart:'
+    created_field = 'created_at'
+    claim_seconds = 60
+
+    def __init__(self, ttl_days=30, url=None, client='store.carts.LocalKV', **options):
+        if url:
+            try:
+                import redis
+            except ImportError as exc:
+                raise ImproperlyConfigured("STORE_CARTS['OPTIONS']['URL'] requires the redis package") from exc
+            self.kv = redis.Redis.from_url(url, decode_responses=True)
+        else:
+            self.kv = import_string(client)(**options)
+        self.ttl = int(timedelta(days=ttl_days).total_seconds())
+
+    def key(self, cart_id):
+        return f'{self.prefix}{cart_id}'
+
+    def claim_key(self, cart_id):
+        return f'{self.prefix}{cart_id}:checkout'
+
+    def _quantities(self, fields):
+        return {int(field): int(value) for field, value in fields.items() if field.isdigit()}
+
+    def _items(self, cart_id, quantities):
+        products = Product.objects.only('id', 'name', 'unit_price').in_bulk(list(quantities))
+        items = []
+        # Products deleted since they were added are left out, as there is no
+        # foreign key to protect them.
+        for product_id in sorted(quantities.keys() & products.keys()):
+            product = products[product_id]
+            item = CartItem(id=product_id, cart_id=cart_id, product=product, quantity=quantities[product_id])
+            item.item_total = item.quantity * product.unit_price
+            items.append(item)
+        return items
+
+    def _cart(self, cart_id, created_at, items):
+        cart = Cart(id=cart_id, created_at=created_at, last_activity=created_at)
+        cart._prefetched_objects_cache = {'items': items}
+        cart.total_price = sum(item.item_total for item in items)
+        return cart
+
+    def create(self):
+        cart_id, created_at = Cart._meta.pk.get_default(), timezone.now()
+        key = self.key(cart_id)
+        self.kv.hset(key, self.created_field, created_at.isoformat())
+        self.kv.expire(key, self.ttl)
+        return self._cart(cart_id, created_at, [])
+
+    def get(self, cart_id):
+        fields = self.kv.hgetall(self.key(cart_id))
+        if self.created_field not in fields:
+            return None
+        created_at = datetime.fromisoformat(fields[self.created_field])
+        return self._cart(cart_id, created_at, self._items(cart_id, self._quantities(fields)))
+
+    async def aget(self, cart_id):
+        return await sync_to_async(self.get)(cart_id)
+
+    def delete(self, cart_id):
+        return self.kv.delete(self.key(cart_id)) > 0
+
+    def items(self, cart_id):
+        return self._items(cart_id, self._quantities(self.kv.hgetall(self.key(cart_id))))
+
+    def get_item(self, cart_id, item_id):
+        quantity = self.kv.hget(self.key(cart_id), str(item_id))
+        if quantity is None:
+            return None
+        items = self._items(cart_id, {int(item_id): int(quantity)})
+        return items[0] if items else None
+
+    def add_items(self, cart_id, quantities):
+        key = self.key(cart_id)
+        # A claimed cart is being ordered: the added items would be lost with it.
+        if self.kv.exists(self.claim_key(cart_id)) or not self.kv.hexists(key, self.created_field):
+            return None
+        totals = {
+            product_id: self.kv.hincrby(key, str(product_id), quantity)
+            for product_id, quantity in quantities.items()
+        }
+        self.kv.expire(key, self.ttl)
+        return self._items(cart_id, totals)
+
+    def set_quantity(self, cart_id, item_id, quantity):
+        # Like the item rows of ORMCartStore, gone once the checkout commits.
+        if self.kv.exists(self.claim_key(cart_id)):
+            return
+        key = self.key(cart_id)
+        self.kv.hset(key, str(item_id), quantity)
+        self.kv.expire(key, self.ttl)
+
+    def remove_item(self, cart_id, item_id):
+        if self.kv.exists(self.claim_key(cart_id)):
+            return
+        key = self.key(cart_id)
+        self.kv.hdel(key, str(item_id))
+        self.kv.expire(key, self.ttl)
+
+    @contextmanager
+    def checkout(self, cart_id):
+        """
+        Same contract as `ORMCartStore.checkout`. The cart is claimed with
+        SET NX so a second checkout of it finds no cart. The cart and the
+        claim are deleted once the transaction commits; the claim is
+        released if the block fails and expires if the transaction rolls
+        back later.
+        """
+        key, claim = self.key(cart_id), self.claim_key(cart_id)
+        if not self.kv.set(claim, 1, ex=self.claim_seconds, nx=True):
+            yield None
+            return
+        fields = self.kv.hgetall(key)
+        if self.created_field not in fields:
+            self.kv.delete(claim)
+            yield None
+            return
+        # Dropped with the transaction if it rolls back.
+        transaction.on_commit(lambda: self.kv.delete(key, claim))
+        try:
+            yield self._quantities(fields)
+        except BaseException:
+            self.kv.delete(claim)
+            raise
+
+
+_store = None
+
+
+def get_cart_store():
+    global _store
+    if _store is None:
+        config = getattr(settings, 'STORE_CARTS', {})
+        backend_class = import_string(config.get('BACKEND', 'store.carts.ORMCartStore'))
+        options = {key.lower(): value for key, value in config.get('OPTIONS', {}).items()}
+        options.setdefault('ttl_days', config.get('TTL_DAYS', 30))
+        _store = backend_class(**options)
+    return _store
+
+
+@receiver(setting_changed)
+def reset_cart_store(setting, **kwargs):
+    global _store
+    if setting == 'STORE_CARTS':
+        _store = None
@@ -0,0 +1,57 @@
+"""
+Turns a cart into an order.
+
+The whole checkout is a fixed number of queries whatever the size of the
+cart: the cart row and its items (none with a key-value cart store), the
+product rows (locked in id order so concurrent checkouts can't deadlock),
+one UPDATE for the inventory, the order, its items, the cart deletion and
+the outbox event.
+"""
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from rest_framework import serializers
+
+from .caching import bump_versions
+from .carts import get_cart_store
+from .models import Customer, Order, OrderItem, Product
+from .outbox import publish
+
+
+def place_order(cart_id, user_id, customer_id=None):
+    with transaction.atomic():
+        if customer_id is None:
+            customer_id = Customer.objects.values_list('id', flat=True).get(user_id=user_id)
+
+        with get_cart_store().checkout(cart_id) as quantities:
+            if quantities is None:
+                raise serializers.ValidationError('There is no such a cart')
+            if not quantities:
+                raise serializers.ValidationError('Your cart is empty. please add at least one item yo your cart')
+
+            products = list(
+                Product.objects.select_for_update()
+                .filter(id__in=quantities)
+                .order_by('id')
+                .values_list('id', 'name', 'unit_price', 'inventory')
+            )
+            out_of_stock = [name for product_id, name, _, inventory in products if inventory < quantities[product_id]]
+            if out_of_stock:
+                raise serializers.ValidationError(f'Not enough inventory for: {", ".join(out_of_stock)}')
+
+            Product.objects.filter(id__in=quantities).update(inventory=Case(
+                *[When(id=product_id, then=F('inventory') - Value(quantity))
+                  for product_id, quantity in quantities.items()],
+                output_field=IntegerField(),
+            ))
+
+            order = Order.objects.create(customer_id=customer_id)
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product_id=product_id, unit_price=unit_price, quantity=quantities[product_id])
+                for product_id, _, unit_price, _ in products
+            ])
+
+        # Receivers of order_created run from the outbox after the commit.
+        publish(order)
+
+        bump_versions(Product)
+    return order
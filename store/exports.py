@@ -0,0 +1,148 @@
+"""
+Full dataset exports streamed in constant memory.
+
+Rows are read a chunk at a time by `chunks`, each chunk a query of its own
+with its `prefetch_related` lookups, serialized with the compiled form of
+the API serializer and written out, so neither the queryset nor the output
+is ever held in full. Chunks aren't read with `QuerySet.iterator()`, since
+mysqlclient fetches the whole result of a query before returning a row.
+"""
+import csv
+
+from django.http import StreamingHttpResponse
+from rest_framework import serializers
+from rest_framework.decorators import action
+from rest_framework.permissions import IsAdminUser
+
+from .fast_serializers import compile_serializer
+from .renderers import CSVRenderer, Echo, NDJSONRenderer
+
+EXPORT_RENDERERS = [NDJSONRenderer, CSVRenderer]
+
+
+def csv_columns(serializer, prefix=''):
+    """
+    Dotted column names of the serializer output. Nested serializers are
+    flattened, a nested list becomes one CSV row per element.
+    """
+    columns = []
+    for field in serializer._readable_fields:
+        if isinstance(field, serializers.ListSerializer):
+            columns += csv_columns(field.child, f'{prefix}{field.field_name}.')
+        elif isinstance(field, serializers.BaseSerializer):
+            columns += csv_columns(field, f'{prefix}{field.field_name}.')
+        else:
+            columns.append(prefix + field.field_name)
+    return columns
+
+
+def flatten(data, prefix='', into=None):
+    into = {} if into is None else into
+    for key, value in data.items():
+        if isinstance(value, dict):
+            flatten(value, f'{prefix}{key}.', into)
+        elif not isinstance(value, list):
+            into[prefix + key] = value
+    return into
+
+
+def csv_records(row, columns):
+    record = flatten(row)
+    lists = [(key, value) for key, value in row.items() if isinstance(value, list)]
+    if not lists or not lists[0][1]:
+        yield [record.get(column) for column in columns]
+        return
+    key, items = lists[0]
+    for item in items:
+        line = dict(record, **flatten(item, f'{key}.'))
+        yield [line.get(column) for column in columns]
+
+
+def chunks(queryset, chunk_size):
+    """
+    Yields the rows of `queryset`, in its order, in lists of at most
+    `chunk_size`. Ordered by primary key, the chunks are keyset pages
+    (`WHERE id > last id LIMIT n`); any other ordering is read as a list
+    of primary keys first, the rows then fetched `chunk_size` keys at a
+    time.
+    """
+    ordering = list(queryset.query.order_by)
+    if not ordering and queryset.query.default_ordering:
+        ordering = list(queryset.model._meta.ordering)
+    if len(ordering) == 1 and isinstance(ordering[0], str) and \
+            ordering[0].lstrip('-') in ('pk', queryset.model._meta.pk.name):
+        seek = 'pk__lt' if ordering[0].startswith('-') else 'pk__gt'
+        page = list(queryset[:chunk_size])
+        while page:
+            yield page
+            if len(page) < chunk_size:
+                return
+            page = list(queryset.filter(**{seek: page[-1].pk})[:chunk_size])
+        return
+
+    pks = list(queryset.values_list('pk', flat=True))
+    for start in range(0, len(pks), chunk_size):
+        chunk = pks[start:start + chunk_size]
+        rows = {row.pk: row for row in queryset.order_by().filter(pk__in=chunk)}
+        yield [rows[pk] for pk in chunk if pk in rows]
+
+
+def stream_export(queryset, serializer_class, export_format, context=None, chunk_size=2000):
+    """
+    Yields the export as byte strings of about `chunk_size` rows each.
+    """
+    serialize = compile_serializer(serializer_class).bind(context)
+    rows = (serialize(instance) for chunk in chunks(queryset, chunk_size) for instance in chunk)
+
+    if export_format == 'csv':
+        columns = csv_columns(serializer_class(context=context))
+        writer = csv.writer(Echo())
+        yield writer.writerow(columns).encode()
+        lines = (writer.writerow(record) for row in rows for record in csv_records(row, columns))
+        encode = str.encode
+    else:
+        render = NDJSONRenderer().render
+        lines = (render(row) for row in rows)
+        encode = None
+
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= chunk_size:
+            yield encode(''.join(chunk)) if encode else b''.join(chunk)
+            chunk = []
+    if chunk:
+        yield encode(''.join(chunk)) if encode else b''.join(chunk)
+
+
+class ExportMixin:
+    """
+    Adds a staff only `export/` action streaming everything the list action
+    would return, with the same filters and ordering but no pagination.
+    The format is picked by `?format=ndjson|csv` or the Accept header.
+    """
+    export_serializer_class = None
+    export_chunk_size = 2000
+
+    def get_permissions(self):
+        if self.action == 'export':
+            return [IsAdminUser()]
+        return super().get_permissions()
+
+    def get_export_serializer_class(self):
+        return self.export_serializer_class or self.get_serializer_class()
+
+    def get_export_queryset(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        return queryset if queryset.ordered else queryset.order_by('pk')
+
+    @action(detail=False, renderer_classes=EXPORT_RENDERERS)
+    def export(self, request, *args, **kwargs):
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            stream_export(self.get_export_queryset(), self.get_export_serializer_class(), renderer.format,
+                          self.get_serializer_context(), self.export_chunk_size),
+            content_type=renderer.media_type,
+        )
+        response['Content-Disposition'] = f'attachment; filename="{self.basename}s.{renderer.format}"'
+        return response
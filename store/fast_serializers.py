@@ -0,0 +1,163 @@
+"""
+Read-only fast path for the hot list/detail outputs.
+
+`compile_serializer` walks the fields of an existing serializer once and turns
+every field into a plain getter + converter pair, so rows are built as dicts
+without going through `Serializer.to_representation`, `get_attribute` and the
+nested serializer machinery for each instance. The output is the same as the
+serializer it was compiled from, field order included.
+"""
+from functools import lru_cache
+from operator import attrgetter
+
+from django.db.models.manager import BaseManager
+from rest_framework import serializers
+from rest_framework.response import Response
+
+
+def _identity(value):
+    return value
+
+
+def _as_str(value):
+    return value if type(value) is str else str(value)
+
+
+def _as_int(value):
+    return value if type(value) is int else int(value)
+
+
+def _converter(field):
+    if isinstance(field, serializers.ChoiceField):
+        return field.to_representation
+    if isinstance(field, serializers.CharField):
+        return _as_str
+    if isinstance(field, serializers.IntegerField):
+        return _as_int
+    if isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is None:
+        return _identity
+    return field.to_representation
+
+
+def _getter(serializer, field):
+    if isinstance(field, serializers.PrimaryKeyRelatedField) and len(field.source_attrs) == 1:
+        # Read the raw `<fk>_id` column instead of loading the related object.
+        model = getattr(getattr(serializer, 'Meta', None), 'model', None)
+        if model is not None:
+            return attrgetter(model._meta.get_field(field.source).attname)
+    if field.source == '*':
+        return _identity
+    return attrgetter(field.source)
+
+
+def _plan_field(serializer, field):
+    if isinstance(field, serializers.SerializerMethodField):
+        return 'method', type(serializer), field.method_name
+
+    get = _getter(serializer, field)
+    if isinstance(field, serializers.ListSerializer):
+        return 'many', get, _plan(field.child)
+    if isinstance(field, serializers.BaseSerializer):
+        return 'one', get, _plan(field)
+    return 'value', get, _converter(field)
+
+
+def _plan(serializer):
+    return [
+        (field.field_name, _plan_field(serializer, field))
+        for field in serializer._readable_fields
+    ]
+
+
+def _many(get, child):
+    def step(instance):
+        items = get(instance)
+        if isinstance(items, BaseManager):
+            items = items.all()
+        return [child(item) for item in items]
+    return step
+
+
+def _one(get, convert):
+    def step(instance):
+        attribute = get(instance)
+        return None if attribute is None else convert(attribute)
+    return step
+
+
+def _build(plan, context, bound):
+    steps = []
+    for name, (kind, first, second) in plan:
+        if kind == 'method':
+            if first not in bound:
+                bound[first] = first(context=context)
+            steps.append((name, getattr(bound[first], second)))
+        elif kind == 'many':
+            steps.append((name, _many(first, _build(second, context, bound))))
+        elif kind == 'one':
+            steps.append((name, _one(first, _build(second, context, bound))))
+        else:
+            steps.append((name, _one(first, second)))
+
+    def row(instance):
+        return {name: step(instance) for name, step in steps}
+    return row
+
+
+class CompiledSerializer:
+    """
+    The field walk happens once per serializer class. Binding for a request
+    only instantiates the serializers that own method fields, which is cheap
+    because DRF builds `fields` lazily.
+    """
+
+    def __init__(self, serializer_class):
+        self.serializer_class = serializer_class
+        self.plan = _plan(serializer_class())
+
+    def bind(self, context=None):
+        return _build(self.plan, context or {}, {})
+
+    def many(self, instances, context=None):
+        row = self.bind(context)
+        return [row(instance) for instance in instances]
+
+    def one(self, instance, context=None):
+        return self.bind(context)(instance)
+
+
+@lru_cache(maxsize=None)
+def compile_serializer(serializer_class):
+    return CompiledSerializer(serializer_class)
+
+
+class FastListMixin:
+    """
+    Serves `list` through the compiled form of `get_serializer_class()`;
+    writes keep using the regular serializers.
+    """
+
+    def get_fast_serializer(self):
+        return compile_serializer(self.get_serializer_class())
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        fast_serializer = self.get_fast_serializer()
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(fast_serializer.many(page, self.get_serializer_context()))
+        return Response(fast_serializer.many(queryset, self.get_serializer_context()))
+
+
+class FastRetrieveMixin:
+    def get_fast_serializer(self):
+        return compile_serializer(self.get_serializer_class())
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        return Response(self.get_fast_serializer().one(instance, self.get_serializer_context()))
+
+
+class FastReadMixin(FastListMixin, FastRetrieveMixin):
+    pass
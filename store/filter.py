@@ -1,10 +1,22 @@
-from django_filters.rest_framework import FilterSet
-from .models import Product
+from django_filters.rest_framework import FilterSet, NumberFilter
+from .models import Order, Product
 
 
 class ProductFilter(FilterSet):
+    price_after_tax__gt = NumberFilter(field_name='price_after_tax', lookup_expr='gt')
+    price_after_tax__lt = NumberFilter(field_name='price_after_tax', lookup_expr='lt')
+
     class Meta:
         model = Product
         fields = {
             'inventory': ['gt', 'lt'],
-        }
\ No newline at end of file
+        }
+
+
+class OrderFilter(FilterSet):
+    total_price__gt = NumberFilter(field_name='total_price', lookup_expr='gt')
+    total_price__lt = NumberFilter(field_name='total_price', lookup_expr='lt')
+
+    class Meta:
+        model = Order
+        fields = ['status']
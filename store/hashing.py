@@ -0,0 +1,200 @@
+"""
+Password hashing off the request workers.
+
+PBKDF2 keeps a CPU busy for a good part of a second and holds the GIL, so a
+burst of logins or registrations stalls every thread of a worker. Passwords
+of API logins (`auth/jwt/create/`, `auth/token/login/`) and registrations
+are hashed and checked in the process pool of `HashingExecutor` instead.
+At most STORE_HASHING['MAX_PENDING'] hashes wait for or run in the pool;
+past that, requests are refused with a 429 and a Retry-After header rather
+than queued behind work they would time out waiting for. A hash not done
+within STORE_HASHING['TIMEOUT'] seconds, or lost to a worker that died, is
+answered with a 503; a broken pool is replaced on the next call. The login
+side is `store.authentication.HashingModelBackend`.
+
+Worker processes import this module before Django is set up, so it must not
+import models.
+"""
+import multiprocessing
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+import django
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class HashQueueFull(APIException):
+    status_code = status.HTTP_429_TOO_MANY_REQUESTS
+    default_detail = 'Too many password checks in progress, retry shortly.'
+    default_code = 'hash_queue_full'
+    # Sent as Retry-After.
+    wait = 1
+
+
+class HashingUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Password checks are unavailable, retry shortly.'
+    default_code = 'hashing_unavailable'
+    wait = 1
+
+
+def setup_worker():
+    # Only needed when the pool doesn't fork, e.g. with the spawn start method.
+    django.setup()
+
+
+def check_password(password, encoded):
+    """
+    `hashers.check_password` for a worker process: returns whether the
+    password matches and whether the hash should be upgraded, which the
+    caller does, since the worker can't save the user.
+    """
+    upgrade = []
+    valid = hashers.check_password(password, encoded, setter=lambda raw_password: upgrade.append(True))
+    return valid, bool(upgrade)
+
+
+class HashingExecutor:
+    """
+    Runs hashing functions in `workers` processes, or in the calling thread
+    with 0 workers, admitting at most `max_pending` at once and waiting
+    `timeout` seconds at most for each.
+    """
+
+    def __init__(self, workers=None, max_pending=64, start_method='spawn', timeout=10, samples=1000):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.start_method = start_method
+        self.timeout = timeout
+        self._pool = None
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=samples)
+        self.pending = 0
+        self.peak_pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.failed = 0
+
+    def get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    self.workers, mp_context=multiprocessing.get_context(self.start_method),
+                    initializer=setup_worker,
+                )
+            return self._pool
+
+    def drop_pool(self, pool):
+        # Another thread may have replaced it already.
+        with self._lock:
+            if self._pool is not pool:
+                return
+            self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, function, *args):
+        pool = self.get_pool()
+        try:
+            future = pool.submit(function, *args)
+            return future.result(self.timeout)
+        except BrokenProcessPool:
+            self.drop_pool(pool)
+            with self._lock:
+                self.failed += 1
+            raise HashingUnavailable()
+        except TimeoutError:
+            future.cancel()
+            with self._lock:
+                self.failed += 1
+            raise HashingUnavailable()
+
+    def run(self, function, *args):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise HashQueueFull()
+            self.pending += 1
+            self.peak_pending = max(self.peak_pending, self.pending)
+        started = time.perf_counter()
+        try:
+            if self.workers == 0:
+                return function(*args)
+            return self.submit(function, *args)
+        finally:
+            with self._lock:
+                self.pending -= 1
+                self.completed += 1
+                self._latencies.append(time.perf_counter() - started)
+
+    def make_password(self, password):
+        return self.run(hashers.make_password, password)
+
+    def check_password(self, password, encoded):
+        return self.run(check_password, password, encoded)
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown()
+
+    def stats(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            pending, peak_pending = self.pending, self.peak_pending
+            completed, rejected, failed = self.completed, self.rejected, self.failed
+
+        def percentile(fraction):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * fraction))] * 1000, 3)
+
+        return {
+            'workers': self.workers,
+            'max_pending': self.max_pending,
+            'pending': pending,
+            'peak_pending': peak_pending,
+            'completed': completed,
+            'rejected': rejected,
+            'failed': failed,
+            'latency_p50_ms': percentile(0.5),
+            'latency_p95_ms': percentile(0.95),
+            'latency_max_ms': percentile(1),
+        }
+
+
+_executor = None
+
+
+def get_hashing_executor():
+    global _executor
+    if _executor is None:
+        config = getattr(settings, 'STORE_HASHING', {})
+        _executor = HashingExecutor(
+            workers=config.get('WORKERS'),
+            max_pending=config.get('MAX_PENDING', 64),
+            start_method=config.get('START_METHOD', 'spawn'),
+            timeout=config.get('TIMEOUT', 10),
+        )
+    return _executor
+
+
+@receiver(setting_changed)
+def reset_hashing_executor(setting, **kwargs):
+    global _executor
+    if setting == 'STORE_HASHING' and _executor is not None:
+        _executor.shutdown()
+        _executor = None
+
+
+def make_password(password):
+    return get_hashing_executor().make_password(password)
+
@@ -0,0 +1,179 @@
+"""
+Bulk creation and update of products, behind `POST /store/products/import/`
+and `manage.py import_products`.
+
+Rows are validated and written a batch at a time. Per batch, the categories
+are resolved by title in one query, the products being updated are read in
+one query, the slugs the new names could collide with in one query more,
+and the rows are written with `bulk_create` and `bulk_update` in a single
+transaction. An invalid row is reported and skipped, the rest of its batch
+is still written.
+"""
+import json
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.text import slugify
+
+from .caching import bump_versions
+from .models import Category, Product
+from .search import get_search_backend
+from .serializer import ProductImportSerializer
+
+UPDATE_FIELDS = ['name', 'category', 'description', 'unit_price', 'inventory', 'datetime_modified']
+
+
+def iter_ndjson(lines):
+    """
+    Yields the object of every non blank line, or the ValueError of a line
+    that isn't valid JSON, so one bad line doesn't end the import.
+    """
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as exc:
+            yield exc
+
+
+class SlugAllocator:
+    """
+    Hands out slugs unique among the products: the slugified name, or the
+    first free `<slug>-<n>`. The slugs a batch of names could collide with
+    are read up front, one query for the plain slugs and, only for the
+    names whose slug is already taken, one for their numbered variants;
+    then every slug is picked in memory.
+    """
+    max_length = Product._meta.get_field('slug').max_length
+
+    def __init__(self, chunk_size=100):
+        self.chunk_size = chunk_size
+        self.taken = set()
+        self.loaded = set()
+
+    def base(self, name):
+        # Leaves room for the suffix within the column.
+        return slugify(name)[:self.max_length - 8].strip('-') or 'product'
+
+    def reserve(self, names):
+        bases = {self.base(name) for name in names} - self.loaded
+        if not bases:
+            return
+        self.loaded.update(bases)
+        taken = set(Product.objects.filter(slug__in=bases).values_list('slug', flat=True))
+        self.taken.update(taken)
+        taken = list(taken)
+        for start in range(0, len(taken), self.chunk_size):
+            condition = reduce(or_, (Q(slug__startswith=f'{base}-') for base in taken[start:start + self.chunk_size]))
+            self.taken.update(Product.objects.filter(condition).values_list('slug', flat=True))
+
+    def allocate(self, name):
+        base = self.base(name)
+        slug, number = base, 1
+        while slug in self.taken:
+            number += 1
+            slug = f'{base}-{number}'
+        self.taken.add(slug)
+        return slug
+
+
+class ProductImporter:
+    """
+    Rows are dicts in the shape of `ProductImportSerializer`; a row with an
+    `id` updates that product, any other row creates one.
+    """
+
+    def __init__(self, batch_size=500, max_errors=1000):
+        self.batch_size = batch_size
+        self.max_errors = max_errors
+        self.slugs = SlugAllocator()
+        self.created = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors = []
+
+    def run(self, rows):
+        batch = []
+        for number, row in enumerate(rows, 1):
+            batch.append((number, row))
+            if len(batch) >= self.batch_size:
+                self.import_batch(batch)
+                batch = []
+        if batch:
+            self.import_batch(batch)
+        if self.created or self.updated:
+            bump_versions(Product)
+        return self.result()
+
+    def result(self):
+        return {
+            'created': self.created,
+            'updated': self.updated,
+            'failed': self.failed,
+            'errors': sorted(self.errors, key=lambda error: error['row']),
+        }
+
+    def error(self, number, errors):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'row': number, 'errors': errors})
+
+    def validate(self, batch):
+        valid = []
+        for number, row in batch:
+            if isinstance(row, ValueError):
+                self.error(number, {'non_field_errors': [f'Invalid JSON: {row}']})
+                continue
+            serializer = ProductImportSerializer(data=row)
+            if serializer.is_valid():
+                valid.append((number, serializer.validated_data))
+            else:
+                self.error(number, serializer.errors)
+        return valid
+
+    def import_batch(self, batch):
+        valid = self.validate(batch)
+        if not valid:
+            return
+
+        categories = {}
+        # Titles aren't unique, the oldest category wins.
+        for category_id, title in Category.objects.filter(title__in={data['category'] for _, data in valid}) \
+                .order_by('-id').values_list('id', 'title'):
+            categories[title] = category_id
+        update_ids = {data['id'] for _, data in valid if 'id' in data}
+        existing = Product.objects.in_bulk(update_ids) if update_ids else {}
+        self.slugs.reserve([data['name'] for _, data in valid if 'id' not in data])
+
+        now = timezone.now()
+        to_create, to_update = [], {}
+        for number, data in valid:
+            data = dict(data)
+            title = data.pop('category')
+            if title not in categories:
+                self.error(number, {'category': [f'There is no category titled "{title}".']})
+                continue
+            data['category_id'] = categories[title]
+            if 'id' not in data:
+                to_create.append(Product(slug=self.slugs.allocate(data['name']), **data))
+                continue
+            product = existing.get(data.pop('id'))
+            if product is None:
+                self.error(number, {'id': ['There is no product with this id.']})
+                continue
+            for field, value in data.items():
+                setattr(product, field, value)
+            product.datetime_modified = now
+            to_update[product.pk] = product
+
+        with transaction.atomic():
+            Product.objects.bulk_create(to_create, batch_size=self.batch_size)
+            Product.objects.bulk_update(to_update.values(), UPDATE_FIELDS, batch_size=self.batch_size)
+        self.created += len(to_create)
+        self.updated += len(to_update)
+        get_search_backend().products_saved([product for product in to_create if product.pk] +
+                                            list(to_update.values()))
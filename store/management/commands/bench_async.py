@@ -0,0 +1,197 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from store.models import Cart, CartItem, Product
+from .benchmark_api import percentile
+
+
+class QueryDelay:
+    """
+    `execute_wrapper` installed on every new connection, standing in for the
+    round trip to a database on another host.
+    """
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def __call__(self, execute, sql, params, many, context):
+        time.sleep(self.seconds)
+        return execute(sql, params, many, context)
+
+    def install(self, sender, connection, **kwargs):
+        connection.execute_wrappers.append(self)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the concurrent throughput of the DRF read endpoints served by the WSGI handler "
+        "from a pool of worker threads with their async versions served by the ASGI handler on one event loop. "
+        "Every request carries a unique query parameter so the response cache never answers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=2000)
+        parser.add_argument('--requests', type=int, default=500, help='requests per endpoint and handler')
+        parser.add_argument('--concurrency', type=int, default=64, help='requests in flight on the event loop')
+        parser.add_argument('--threads', type=int, default=8, help='WSGI worker threads')
+        parser.add_argument('--db-latency', type=float, default=0,
+                            help='milliseconds added to every query to simulate a database over the network')
+        parser.add_argument('--only', nargs='+', default=None, help='endpoint names to run')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--keepdb', action='store_true', help='reuse the test database and its data')
+
+    def seed(self, options):
+        if not (options['keepdb'] and Product.objects.exists()):
+            call_command('generate_fake_data', '--products', str(options['products']), '--customers', '20',
+                         '--orders', '0', '--comments', '0', '--seed', str(options['seed']), stdout=self.stdout)
+
+        product_ids = list(Product.objects.order_by('id').values_list('id', flat=True)[:1000])
+        if not product_ids:
+            raise CommandError('The benchmark needs products.')
+        cart = Cart.objects.create()
+        CartItem.objects.add_items(cart.id, {product_id: 1 for product_id in product_ids[:5]})
+
+        def product(i):
+            return product_ids[i % len(product_ids)]
+
+        # Paths are relative to /store/ and /store/async/.
+        return {
+            'products-list': lambda i: ('products/', f'page={i % 5 + 1}'),
+            'products-filter': lambda i: ('products/', f'inventory__gt={i % 50}&price_after_tax__lt=500'),
+            'products-ordering': lambda i: ('products/', 'ordering=-unit_price'),
+            'product-detail': lambda i: (f'products/{product(i)}/', ''),
+            'categories-list': lambda i: ('categories/', ''),
+            'cart-detail': lambda i: (f'carts/{cart.id}/', ''),
+        }
+
+    def run_wsgi(self, handler, requests, threads):
+        def call(request):
+            path, query_string = request
+            environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query_string,
+                       'SERVER_NAME': 'testserver', 'HTTP_HOST': 'testserver', 'wsgi.input': BytesIO()}
+            setup_testing_defaults(environ)
+            started = time.perf_counter()
+            statuses = []
+            body = b''.join(handler(environ, lambda status, headers, exc_info=None: statuses.append(status)))
+            return time.perf_counter() - started, int(statuses[0].split()[0]), body
+
+        with ThreadPoolExecutor(threads) as executor:
+            started = time.perf_counter()
+            results = list(executor.map(call, requests))
+        return time.perf_counter() - started, results
+
+    def run_asgi(self, handler, requests, concurrency):
+        async def call(request, slots):
+            path, query_string = request
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+                'scheme': 'http', 'path': path, 'root_path': '', 'query_string': query_string.encode(),
+                'headers': [(b'host', b'testserver')], 'server': ('testserver', 80), 'client': ('127.0.0.1', 0),
+            }
+            disconnected = asyncio.Event()
+            messages = []
+
+            async def receive():
+                if not messages:
+                    messages.append(None)
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+                await disconnected.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                messages.append(message)
+
+            async with slots:
+                started = time.perf_counter()
+                await handler(scope, receive, send)
+                elapsed = time.perf_counter() - started
+            disconnected.set()
+            status = next(message['status'] for message in messages[1:] if message['type'] == 'http.response.start')
+            body = b''.join(message.get('body', b'') for message in messages[1:]
+                            if message['type'] == 'http.response.body')
+            return elapsed, status, body
+
+        async def main():
+            slots = asyncio.Semaphore(concurrency)
+            started = time.perf_counter()
+            results = await asyncio.gather(*(call(request, slots) for request in requests))
+            return time.perf_counter() - started, results
+
+        return asyncio.run(main())
+
+    def summarize(self, wall, results):
+        latencies = [elapsed for elapsed, _, _ in results]
+        return {
+            'rps': len(results) / wall,
+            'p50_ms': percentile(latencies, 0.50) * 1000,
+            'p95_ms': percentile(latencies, 0.95) * 1000,
+            'errors': sum(1 for _, status, _ in results if status != 200),
+        }
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = settings.DATABASES[connection.alias]['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        delay = None
+        try:
+            with override_settings(DEBUG=False):
+                endpoints = self.seed(options)
+                if options['only']:
+                    endpoints = {name: endpoints[name] for name in options['only'] if name in endpoints}
+                if options['db_latency']:
+                    # Requests run in their own threads, which open their own connections.
+                    delay = QueryDelay(options['db_latency'] / 1000)
+                    connection_created.connect(delay.install)
+                wsgi, asgi = WSGIHandler(), ASGIHandler()
+                rows = []
+                for name, prepare in endpoints.items():
+                    requests = []
+                    for i in range(options['requests']):
+                        path, query_string = prepare(i)
+                        query_string = '&'.join(filter(None, [query_string, f'bench={i}']))
+                        requests.append((path, query_string))
+                    wsgi_wall, wsgi_results = self.run_wsgi(
+                        wsgi, [(f'/store/{path}', qs) for path, qs in requests], options['threads'])
+                    asgi_wall, asgi_results = self.run_asgi(
+                        asgi, [(f'/store/async/{path}', qs) for path, qs in requests], options['concurrency'])
+                    if wsgi_results[0][2].replace(b'/store/', b'') != asgi_results[0][2].replace(b'/store/async/', b''):
+                        self.stdout.write(self.style.WARNING(f'{name}: WSGI and ASGI responses differ'))
+                    rows.append((name, self.summarize(wsgi_wall, wsgi_results),
+                                 self.summarize(asgi_wall, asgi_results)))
+        finally:
+            if delay is not None:
+                connection_created.disconnect(delay.install)
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        self.stdout.write(
+            f'{options["requests"]} requests per endpoint, {options["threads"]} WSGI threads, '
+            f'{options["concurrency"]} ASGI requests in flight, '
+            f'{options["db_latency"]} ms added per query, {connection.vendor}'
+        )
+        self.stdout.write(
+            f'{"endpoint":<20}{"wsgi req/s":>12}{"p50 ms":>9}{"p95 ms":>9}'
+            f'{"asgi req/s":>12}{"p50 ms":>9}{"p95 ms":>9}{"speedup":>9}'
+        )
+        for name, wsgi, asgi in rows:
+            line = (
+                f'{name:<20}{wsgi["rps"]:>12.1f}{wsgi["p50_ms"]:>9.2f}{wsgi["p95_ms"]:>9.2f}'
+                f'{asgi["rps"]:>12.1f}{asgi["p50_ms"]:>9.2f}{asgi["p95_ms"]:>9.2f}{asgi["rps"] / wsgi["rps"]:>8.2f}x'
+            )
+            if wsgi['errors'] or asgi['errors']:
+                line += self.style.ERROR(f'  non 200 responses: wsgi {wsgi["errors"]}, asgi {asgi["errors"]}')
+            self.stdout.write(line)
+        if any(wsgi['errors'] or asgi['errors'] for _, wsgi, asgi in rows):
+            raise CommandError('Some requests failed.')
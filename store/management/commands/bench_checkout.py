@@ -0,0 +1,130 @@
+import random
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Sum
+from rest_framework import serializers
+
+from store.checkout import place_order
+from store.models import Cart, CartItem, Category, Customer, Order, OrderItem, Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs many checkouts in parallel against a few shared products and checks that "
+        "inventory is never oversold. Creates its own rows and removes them afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--carts', type=int, default=200)
+        parser.add_argument('--products', type=int, default=5, help='shared products every cart draws from')
+        parser.add_argument('--items', type=int, default=3, help='products per cart')
+        parser.add_argument('--inventory', type=int, default=300, help='starting inventory of each product')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def get_customer(self):
+        customer = Customer.objects.select_related('user').first()
+        if customer is None:
+            get_user_model().objects.create(username='bench-checkout')
+            customer = Customer.objects.select_related('user').get(user__username='bench-checkout')
+        return customer
+
+    def setup(self, options):
+        category = Category.objects.create(title='bench-checkout')
+        products = Product.objects.bulk_create([
+            Product(name=f'bench {i}', slug=f'bench-{i}', category=category, description='',
+                    unit_price='10.00', inventory=options['inventory'])
+            for i in range(options['products'])
+        ])
+        carts = Cart.objects.bulk_create([Cart() for _ in range(options['carts'])])
+        items = []
+        for cart in carts:
+            for product in random.sample(products, min(options['items'], len(products))):
+                items.append(CartItem(cart=cart, product=product, quantity=random.randint(1, 5)))
+        CartItem.objects.bulk_create(items)
+        return category, products, [cart.id for cart in carts]
+
+    def checkout(self, user_id, cart_ids, order_ids, lock, results):
+        try:
+            while True:
+                with lock:
+                    if not cart_ids:
+                        return
+                    cart_id = cart_ids.pop()
+                started = time.perf_counter()
+                try:
+                    order = place_order(cart_id, user_id)
+                    outcome = 'placed'
+                    with lock:
+                        order_ids.append(order.id)
+                except serializers.ValidationError:
+                    outcome = 'rejected'
+                except Exception as error:
+                    outcome = f'error: {error.__class__.__name__}: {error}'
+                with lock:
+                    results.append((outcome, time.perf_counter() - started))
+        finally:
+            connection.close()
+
+    def cleanup(self, category, products, cart_ids, order_ids):
+        OrderItem.objects.filter(order_id__in=order_ids).delete()
+        Order.objects.filter(id__in=order_ids).delete()
+        Cart.objects.filter(id__in=cart_ids).delete()
+        Product.objects.filter(id__in=[product.id for product in products]).delete()
+        category.delete()
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        customer = self.get_customer()
+        category, products, cart_ids = self.setup(options)
+        ordered_before = dict(
+            CartItem.objects.filter(product__in=products).values('product')
+            .annotate(total=Sum('quantity')).values_list('product', 'total')
+        )
+
+        lock = threading.Lock()
+        pending, order_ids, results = list(cart_ids), [], []
+        threads = [
+            threading.Thread(target=self.checkout, args=(customer.user_id, pending, order_ids, lock, results))
+            for _ in range(options['threads'])
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        sold = dict(
+            OrderItem.objects.filter(product__in=products).values('product')
+            .annotate(total=Sum('quantity')).values_list('product', 'total')
+        )
+        inventory = dict(Product.objects.filter(id__in=[p.id for p in products]).values_list('id', 'inventory'))
+        self.cleanup(category, products, cart_ids, order_ids)
+
+        outcomes = {}
+        for outcome, _ in results:
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        latencies = sorted(duration for _, duration in results)
+        self.stdout.write(
+            f'{len(results)} checkouts from {options["threads"]} threads in {elapsed:.2f}s '
+            f'({len(results) / elapsed:.0f}/s), demand per product {ordered_before}'
+        )
+        self.stdout.write(
+            f'p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, '
+            f'p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f} ms'
+        )
+        for outcome, count in sorted(outcomes.items()):
+            self.stdout.write(f'  {outcome}: {count}')
+
+        for product in products:
+            remaining = inventory[product.id]
+            if remaining < 0 or remaining + sold.get(product.id, 0) != options['inventory']:
+                raise CommandError(
+                    f'{product.name}: sold {sold.get(product.id, 0)}, {remaining} left of {options["inventory"]}'
+                )
+        self.stdout.write(self.style.SUCCESS('Inventory consistent, nothing oversold.'))
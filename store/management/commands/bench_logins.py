@@ -0,0 +1,115 @@
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from rest_framework.test import APIClient
+
+from store.accounts import bulk_create_users
+from store.hashing import get_hashing_executor
+from store.models import Customer
+
+
+class Command(BaseCommand):
+    help = (
+        "Logs in through POST /auth/jwt/create/ from many threads at once and reports logins/s, "
+        "latency percentiles, the 429s of the hashing admission control and the executor metrics. "
+        "Creates its own users and removes them afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--logins', type=int, default=200)
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--wrong-password', type=float, default=0.1,
+                            help='fraction of the logins with a wrong password')
+        parser.add_argument('--workers', type=int, help="STORE_HASHING['WORKERS'] of the run")
+        parser.add_argument('--max-pending', type=int, help="STORE_HASHING['MAX_PENDING'] of the run")
+
+    def setup(self, options):
+        password = make_password('bench-password')
+        with transaction.atomic():
+            users = bulk_create_users([
+                get_user_model()(username=f'bench-login-{i}', email=f'bench-login-{i}@example.com', password=password)
+                for i in range(options['users'])
+            ])
+            Customer.objects.bulk_create([Customer(user=user) for user in users])
+        return users
+
+    def cleanup(self, users):
+        Customer.objects.filter(user__in=users).delete()
+        get_user_model().objects.filter(id__in=[user.id for user in users]).delete()
+
+    def login(self, users, remaining, wrong_every, lock, results):
+        client = APIClient()
+        try:
+            while True:
+                with lock:
+                    if not remaining:
+                        return
+                    number = remaining.pop()
+                password = 'wrong-password' if wrong_every and number % wrong_every == 0 else 'bench-password'
+                started = time.perf_counter()
+                response = client.post('/auth/jwt/create/', {
+                    'username': users[number % len(users)].username, 'password': password,
+                }, format='json')
+                with lock:
+                    results.append((response.status_code, time.perf_counter() - started))
+        finally:
+            connection.close()
+
+    def handle(self, *args, **options):
+        overrides = {}
+        for option, key in [('workers', 'WORKERS'), ('max_pending', 'MAX_PENDING')]:
+            if options[option] is not None:
+                overrides[key] = options[option]
+
+        setup_test_environment()
+        users = self.setup(options)
+        try:
+            with override_settings(STORE_HASHING=dict(settings.STORE_HASHING, **overrides)):
+                executor = get_hashing_executor()
+                # Starts the pool before the clock does.
+                executor.make_password('warmup')
+
+                lock = threading.Lock()
+                remaining, results = list(range(options['logins'])), []
+                wrong_every = round(1 / options['wrong_password']) if options['wrong_password'] else 0
+                threads = [
+                    threading.Thread(target=self.login, args=(users, remaining, wrong_every, lock, results))
+                    for _ in range(options['threads'])
+                ]
+                started = time.perf_counter()
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                elapsed = time.perf_counter() - started
+                stats = executor.stats()
+        finally:
+            self.cleanup(users)
+            teardown_test_environment()
+
+        statuses = {}
+        for status_code, _ in results:
+            statuses[status_code] = statuses.get(status_code, 0) + 1
+        latencies = sorted(duration for _, duration in results)
+        self.stdout.write(
+            f'{len(results)} logins from {options["threads"]} threads in {elapsed:.2f}s '
+            f'({statuses.get(200, 0) / elapsed:.1f} successful/s), {stats["workers"] or "default"} hashing workers'
+        )
+        self.stdout.write(
+            f'p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, '
+            f'p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f} ms'
+        )
+        for status_code, count in sorted(statuses.items()):
+            self.stdout.write(f'  {status_code}: {count}')
+        self.stdout.write(
+            f'executor: peak pending {stats["peak_pending"]} of {stats["max_pending"]}, rejected {stats["rejected"]}, '
+            f'failed {stats["failed"]}, '
+            f'hash p50 {stats["latency_p50_ms"]} ms, p95 {stats["latency_p95_ms"]} ms'
+        )
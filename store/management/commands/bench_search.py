@@ -0,0 +1,83 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from store.models import Category, Product
+from store.search import InvertedIndexBackend, VENDOR_BACKENDS
+from django.db import connection
+
+WORDS = [
+    'red', 'green', 'blue', 'black', 'white', 'small', 'large', 'smart', 'classic', 'wooden',
+    'steel', 'cotton', 'leather', 'organic', 'wireless', 'portable', 'premium', 'vintage', 'modern', 'compact',
+    'apple', 'coffee', 'chair', 'table', 'lamp', 'phone', 'camera', 'shirt', 'shoes', 'watch',
+    'bottle', 'guitar', 'pillow', 'blanket', 'speaker', 'keyboard', 'monitor', 'backpack', 'jacket', 'kettle',
+]
+
+
+def icontains_search(queryset, terms):
+    for term in terms.split():
+        queryset = queryset.filter(Q(name__icontains=term) | Q(category__title__icontains=term))
+    return queryset
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures ?search= latency of the icontains scan, the database full-text backend "
+        "and the Python inverted index at growing catalogue sizes. Rows are created inside "
+        "a transaction that is rolled back at the end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+        parser.add_argument('--queries', type=int, default=30)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def _measure(self, search, queries, ordering='-search_rank'):
+        # Same work as the list endpoint: COUNT(*) plus the first page.
+        started = time.perf_counter()
+        for terms in queries:
+            queryset = search(Product.objects.select_related('category'), terms)
+            queryset.count()
+            list(queryset.order_by(ordering, 'id')[:10])
+        return (time.perf_counter() - started) / len(queries) * 1000
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        categories = Category.objects.bulk_create(
+            [Category(title=f'{rng.choice(WORDS)} {rng.choice(WORDS)}') for _ in range(50)]
+        )
+        queries = [
+            ' '.join(rng.sample(WORDS, rng.randint(1, 2))) for _ in range(options['queries'])
+        ]
+        db_backend_class = VENDOR_BACKENDS.get(connection.vendor)
+
+        self.stdout.write(f'{"products":>10}{"icontains ms":>15}{"fulltext ms":>14}{"py build s":>12}{"py ms":>10}')
+        created = 0
+        for size in sorted(options['sizes']):
+            while created < size:
+                batch = min(options['batch_size'], size - created)
+                Product.objects.bulk_create([
+                    Product(name=' '.join(rng.sample(WORDS, 3)).title(), slug='bench', description='',
+                            category=rng.choice(categories), unit_price=1, inventory=1)
+                    for _ in range(batch)
+                ])
+                created += batch
+
+            icontains = self._measure(icontains_search, queries, ordering='name')
+            fulltext = self._measure(db_backend_class().search, queries) if db_backend_class else None
+
+            python_backend = InvertedIndexBackend()
+            started = time.perf_counter()
+            python_backend.build()
+            build = time.perf_counter() - started
+            python = self._measure(python_backend.search, queries)
+
+            fulltext_label = f'{fulltext:>14.2f}' if fulltext is not None else f'{"n/a":>14}'
+            self.stdout.write(f'{size:>10}{icontains:>15.2f}{fulltext_label}{build:>12.2f}{python:>10.2f}')
+
+        transaction.set_rollback(True)
@@ -0,0 +1,102 @@
+import random
+import time
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from uuid import uuid4
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from store.fast_serializers import compile_serializer
+from store.models import Cart, CartItem, Category, Customer, Order, OrderItem, Product
+from store.serializer import CartSerializer, OrderAdminSerializer, ProductSerializer
+from core.models import CustomUser
+
+
+def _price():
+    return Decimal(random.randint(100, 99999)) / 100
+
+
+def _prefetch(instance, name, items):
+    instance._prefetched_objects_cache = {name: items}
+
+
+def build_products(size):
+    category = Category(id=1, title='Category')
+    return [
+        Product(id=i, name=f'Product {i}', slug=f'product-{i}', category=category, description='Description',
+                unit_price=_price(), inventory=random.randint(0, 100), comments_count=random.randint(0, 20))
+        for i in range(1, size + 1)
+    ]
+
+
+def build_carts(size):
+    products = build_products(size)
+    cart = Cart(id=uuid4())
+    _prefetch(cart, 'items', [
+        CartItem(id=i, cart=cart, product=product, quantity=random.randint(1, 20))
+        for i, product in enumerate(products, start=1)
+    ])
+    return [cart]
+
+
+def build_orders(size):
+    products = build_products(size)
+    user = CustomUser(id=1, first_name='First', last_name='Last', email='user@example.com')
+    customer = Customer(id=1, user=user, birth_date=date(1990, 1, 1))
+    orders = []
+    for i in range(1, size + 1):
+        order = Order(id=i, customer=customer, status=Order.ORDER_STATUS_UNPAID,
+                      datetime_created=datetime(2023, 1, 1, 12, 30, tzinfo=timezone.utc))
+        _prefetch(order, 'items', [
+            OrderItem(id=i * 10 + j, order=order, product=product, quantity=random.randint(1, 20),
+                      unit_price=product.unit_price)
+            for j, product in enumerate(random.sample(products, min(3, size)))
+        ])
+        orders.append(order)
+    return orders
+
+
+CASES = {
+    'products': (ProductSerializer, build_products),
+    'cart': (CartSerializer, build_carts),
+    'orders': (OrderAdminSerializer, build_orders),
+}
+
+
+class Command(BaseCommand):
+    help = "Compares the DRF serializers with their compiled fast path on in-memory rows"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000])
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def _timeit(self, func, repeat):
+        best = float('inf')
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            best = min(best, time.perf_counter() - started)
+        return best
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        renderer = JSONRenderer()
+
+        self.stdout.write(f'{"case":<10}{"rows":>8}{"drf ms":>12}{"fast ms":>12}{"speedup":>10}')
+        for name, (serializer_class, build) in CASES.items():
+            fast_serializer = compile_serializer(serializer_class)
+            for size in options['sizes']:
+                instances = build(size)
+
+                expected = renderer.render(serializer_class(instances, many=True).data)
+                actual = renderer.render(fast_serializer.many(instances))
+                if expected != actual:
+                    raise CommandError(f'{name}: fast output differs from {serializer_class.__name__}')
+
+                drf = self._timeit(lambda: serializer_class(instances, many=True).data, options['repeat'])
+                fast = self._timeit(lambda: fast_serializer.many(instances), options['repeat'])
+                self.stdout.write(
+                    f'{name:<10}{size:>8}{drf * 1000:>12.3f}{fast * 1000:>12.3f}{drf / fast:>9.1f}x'
+                )
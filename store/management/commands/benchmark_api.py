@@ -0,0 +1,246 @@
+import json
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (
+    CaptureQueriesContext, override_settings, setup_test_environment, teardown_test_environment,
+)
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.settings import api_settings
+
+from store.authentication import TokenObtainPairSerializer, get_identity_cache
+from store.caching import bump_versions
+from store.carts import get_cart_store
+from store.models import Category, Comment, Customer, Order, OrderItem, Product
+
+
+class Scenario:
+    """
+    One endpoint. `prepare(i)` runs untimed before the i-th request and
+    returns the path, and the body for writes.
+    """
+
+    def __init__(self, name, user, method, prepare, expected_status=200):
+        self.name = name
+        self.user = user
+        self.method = method
+        self.prepare = prepare
+        self.expected_status = expected_status
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds a test database, drives every store endpoint through the test client and reports "
+        "latency percentiles, requests/s and SQL queries per request. --save-baseline writes the "
+        "results as JSON, --compare fails when a later run is slower or runs more queries."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=2000)
+        parser.add_argument('--customers', type=int, default=200)
+        parser.add_argument('--orders', type=int, default=2000)
+        parser.add_argument('--comments', type=int, default=None, help='defaults to three per product')
+        parser.add_argument('--requests', type=int, default=50, help='timed requests per endpoint')
+        parser.add_argument('--warmup', type=int, default=5, help='untimed requests per endpoint')
+        parser.add_argument('--cold-cache', action='store_true',
+                            help='invalidate the response cache before every request')
+        parser.add_argument('--only', nargs='+', default=None, help='endpoint names to run')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--keepdb', action='store_true', help='reuse the test database and its data')
+        parser.add_argument('--cart-backend', metavar='PATH',
+                            help="STORE_CARTS['BACKEND'] of the run, e.g. store.carts.KVCartStore")
+        parser.add_argument('--save-baseline', metavar='PATH')
+        parser.add_argument('--compare', metavar='PATH', help='baseline to compare the run with')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='allowed p95 slowdown against the baseline, 0.2 = 20%%')
+
+    def seed(self, options):
+        if options['keepdb'] and Product.objects.exists():
+            return
+        arguments = ['--products', options['products'], '--customers', options['customers'],
+                     '--orders', options['orders'], '--seed', options['seed']]
+        if options['comments'] is not None:
+            arguments += ['--comments', options['comments']]
+        call_command('generate_fake_data', *map(str, arguments), stdout=self.stdout)
+
+    def get_scenarios(self):
+        User = get_user_model()
+        customers = list(Customer.objects.select_related('user').order_by('id')[:2])
+        if len(customers) < 2:
+            raise CommandError('The benchmark needs at least two customers.')
+        staff = customers[0].user
+        User.objects.filter(pk=staff.pk).update(is_staff=True)
+        staff.is_staff = True
+        customer = customers[1].user
+
+        product_ids = list(Product.objects.order_by('id').values_list('id', flat=True)[:1000])
+        category_id = Category.objects.order_by('id').values_list('id', flat=True).first()
+        order_id = Order.objects.filter(customer=customers[1]).values_list('id', flat=True).first()
+        if order_id is None:
+            # order-detail runs as this customer, another customer's order would be a 404.
+            order = Order.objects.create(customer=customers[1])
+            product_price = Product.objects.order_by('id').values_list('id', 'unit_price').first()
+            OrderItem.objects.create(order=order, product_id=product_price[0], quantity=1, unit_price=product_price[1])
+            order_id = order.id
+        search_term = Product.objects.order_by('id').values_list('name', flat=True).first().split()[0]
+        commented_product_id = Comment.objects.values_list('product_id', flat=True).first() or product_ids[0]
+
+        def product(i):
+            return product_ids[i % len(product_ids)]
+
+        carts = get_cart_store()
+        cart = carts.create()
+        cart_item_id = carts.add_items(cart.id, {product(i): 1 for i in range(5)})[0].id
+
+        def new_cart(i):
+            # Seeded products may have no inventory left, or run out over the checkouts.
+            Product.objects.filter(id__in=[product(i), product(i + 1)], inventory__lt=1).update(inventory=1)
+            new = carts.create()
+            carts.add_items(new.id, {product(i): 1, product(i + 1): 1})
+            return new
+
+        return [
+            Scenario('products-list', None, 'get', lambda i: (f'/store/products/?page={i % 5 + 1}', None)),
+            Scenario('products-filter', None, 'get',
+                     lambda i: (f'/store/products/?inventory__gt={i % 50}&price_after_tax__lt=500', None)),
+            Scenario('products-search', None, 'get', lambda i: (f'/store/products/?search={search_term}', None)),
+            Scenario('products-ordering', None, 'get', lambda i: ('/store/products/?ordering=-unit_price', None)),
+            Scenario('products-cursor', None, 'get',
+                     lambda i: ('/store/products/?pagination=cursor&ordering=unit_price', None)),
+            Scenario('product-detail', None, 'get', lambda i: (f'/store/products/{product(i)}/', None)),
+            Scenario('categories-list', None, 'get', lambda i: ('/store/categories/', None)),
+            Scenario('category-detail', None, 'get', lambda i: (f'/store/categories/{category_id}/', None)),
+            Scenario('comments-list', None, 'get',
+                     lambda i: (f'/store/products/{commented_product_id}/comments/', None)),
+            Scenario('comment-create', customer, 'post',
+                     lambda i: (f'/store/products/{product(i)}/comments/', {'name': 'bench', 'body': 'body'}), 201),
+            Scenario('cart-create', None, 'post', lambda i: ('/store/carts/', {}), 201),
+            Scenario('cart-detail', None, 'get', lambda i: (f'/store/carts/{cart.id}/', None)),
+            Scenario('cart-add-item', None, 'post',
+                     lambda i: (f'/store/carts/{cart.id}/items/', {'product': product(i), 'quantity': 1}), 201),
+            Scenario('cart-bulk-add', None, 'post',
+                     lambda i: (f'/store/carts/{cart.id}/items/bulk/',
+                                [{'product': product(i + j), 'quantity': 1} for j in range(10)]), 201),
+            Scenario('cart-item-patch', None, 'patch',
+                     lambda i: (f'/store/carts/{cart.id}/items/{cart_item_id}/', {'quantity': i % 5 + 1})),
+            Scenario('checkout', customer, 'post', lambda i: ('/store/orders/', {'cart_id': str(new_cart(i).id)})),
+            Scenario('orders-list-customer', customer, 'get', lambda i: ('/store/orders/', None)),
+            Scenario('orders-list-staff', staff, 'get', lambda i: ('/store/orders/', None)),
+            Scenario('order-detail', customer, 'get', lambda i: (f'/store/orders/{order_id}/', None)),
+            Scenario('customer-me', customer, 'get', lambda i: ('/store/customers/me/', None)),
+            Scenario('customers-list', staff, 'get', lambda i: ('/store/customers/', None)),
+        ]
+
+    def run_scenario(self, scenario, options):
+        client = APIClient()
+        if scenario.user is not None:
+            # A real access token, so the authentication of the endpoint is measured too.
+            token = TokenObtainPairSerializer.get_token(scenario.user).access_token
+            client.credentials(HTTP_AUTHORIZATION=f'{api_settings.AUTH_HEADER_TYPES[0]} {token}')
+            # The query budgets leave out the misses of the identity cache.
+            get_identity_cache().get_user(scenario.user.pk)
+            get_identity_cache().get_customer(scenario.user.pk)
+        send = getattr(client, scenario.method)
+
+        latencies, queries, unexpected = [], [], {}
+        for i in range(options['warmup'] + options['requests']):
+            path, data = scenario.prepare(i)
+            if options['cold_cache']:
+                bump_versions(Product, Category, Comment)
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = send(path, data, format='json') if data is not None else send(path)
+                elapsed = time.perf_counter() - started
+            if response.status_code != scenario.expected_status:
+                unexpected[response.status_code] = unexpected.get(response.status_code, 0) + 1
+            if i >= options['warmup']:
+                latencies.append(elapsed)
+                queries.append(len(captured))
+
+        return {
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+            'rps': round(len(latencies) / sum(latencies), 1),
+            'queries': round(statistics.mean(queries), 2),
+            'unexpected_status': unexpected,
+        }
+
+    def compare(self, results, path, threshold):
+        with open(path) as baseline_file:
+            baseline = json.load(baseline_file)['endpoints']
+        regressions = []
+        for name, result in results.items():
+            before = baseline.get(name)
+            if before is None:
+                continue
+            if result['p95_ms'] > before['p95_ms'] * (1 + threshold):
+                regressions.append(f'{name}: p95 {before["p95_ms"]} -> {result["p95_ms"]} ms')
+            if result['queries'] > before['queries']:
+                regressions.append(f'{name}: queries {before["queries"]} -> {result["queries"]}')
+        return regressions
+
+    def report(self, results):
+        self.stdout.write(
+            f'{"endpoint":<24}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"req/s":>10}{"queries":>9}'
+        )
+        for name, result in results.items():
+            line = (
+                f'{name:<24}{result["p50_ms"]:>10.2f}{result["p95_ms"]:>10.2f}{result["p99_ms"]:>10.2f}'
+                f'{result["rps"]:>10.1f}{result["queries"]:>9.1f}'
+            )
+            if result['unexpected_status']:
+                line += self.style.ERROR(f'  unexpected status {result["unexpected_status"]}')
+            self.stdout.write(line)
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = settings.DATABASES[connection.alias]['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            # Checkout events stay in the outbox: delivering them from its threads would compete with the
+            # measured requests, and lock SQLite's shared in-memory test database.
+            overrides = {'STORE_OUTBOX': dict(settings.STORE_OUTBOX, DISPATCH_ON_COMMIT=False)}
+            if options['cart_backend']:
+                overrides['STORE_CARTS'] = dict(settings.STORE_CARTS, BACKEND=options['cart_backend'])
+            with override_settings(DEBUG=False, **overrides):
+                self.seed(options)
+                scenarios = self.get_scenarios()
+                if options['only']:
+                    scenarios = [scenario for scenario in scenarios if scenario.name in options['only']]
+                results = {scenario.name: self.run_scenario(scenario, options) for scenario in scenarios}
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        self.report(results)
+
+        if options['save_baseline']:
+            with open(options['save_baseline'], 'w') as baseline_file:
+                json.dump({
+                    'options': {key: options[key] for key in ['products', 'customers', 'orders', 'comments',
+                                                              'requests', 'cold_cache', 'cart_backend', 'seed']},
+                    'vendor': connection.vendor,
+                    'endpoints': results,
+                }, baseline_file, indent=2)
+            self.stdout.write(f'Baseline written to {options["save_baseline"]}')
+
+        failed = [name for name, result in results.items() if result['unexpected_status']]
+        if options['compare']:
+            regressions = self.compare(results, options['compare'], options['threshold'])
+            for regression in regressions:
+                self.stdout.write(self.style.ERROR(regression))
+            if regressions:
+                raise CommandError(f'{len(regressions)} regressions against {options["compare"]}')
+        if failed:
+            raise CommandError(f'Unexpected status codes from: {", ".join(failed)}')
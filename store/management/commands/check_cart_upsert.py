@@ -0,0 +1,69 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from store.models import Cart, CartItem, Product
+from store.serializer import AddCartItemSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Adds the same products to one cart from many threads at once and checks that no "
+        "quantity was lost and no add failed on the (cart, product) unique constraint"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--adds', type=int, default=20, help='adds per thread')
+        parser.add_argument('--products', type=int, default=3, help='distinct products added to the cart')
+
+    def add_to_cart(self, cart_id, product_ids, adds, barrier, errors):
+        try:
+            barrier.wait()
+            for i in range(adds):
+                serializer = AddCartItemSerializer(
+                    data={'product': product_ids[i % len(product_ids)], 'quantity': 1},
+                    context={'cart_pk': cart_id},
+                )
+                serializer.is_valid(raise_exception=True)
+                serializer.save()
+        except Exception as error:
+            errors.append(error)
+        finally:
+            connection.close()
+
+    def handle(self, *args, **options):
+        product_ids = list(Product.objects.order_by('id').values_list('id', flat=True)[:options['products']])
+        if not product_ids:
+            raise CommandError('No products, run generate_fake_data first.')
+
+        cart = Cart.objects.create()
+        threads_count, adds = options['threads'], options['adds']
+        barrier = threading.Barrier(threads_count)
+        errors = []
+        threads = [
+            threading.Thread(target=self.add_to_cart, args=(cart.id, product_ids, adds, barrier, errors))
+            for _ in range(threads_count)
+        ]
+
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        expected = {product_id: 0 for product_id in product_ids}
+        for i in range(adds):
+            expected[product_ids[i % len(product_ids)]] += threads_count
+        actual = dict(CartItem.objects.filter(cart=cart).values_list('product_id', 'quantity'))
+        cart.delete()
+
+        self.stdout.write(f'{threads_count * adds} adds from {threads_count} threads in {elapsed * 1000:.0f} ms')
+        if errors:
+            raise CommandError(f'{len(errors)} threads failed, first error: {errors[0]!r}')
+        if actual != expected:
+            raise CommandError(f'Lost updates: expected {expected}, got {actual}')
+        self.stdout.write(self.style.SUCCESS('No lost updates.'))
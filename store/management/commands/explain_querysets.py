@@ -0,0 +1,114 @@
+import json
+import re
+from uuid import uuid4
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from store import urls
+from store.models import Cart, Customer, Order, Product
+
+
+def full_scans(plan, vendor):
+    """
+    Returns the tables read without an index according to an EXPLAIN output.
+    """
+    if vendor == 'mysql':
+        return sorted(set(_mysql_full_scans(json.loads(plan))))
+    if vendor == 'postgresql':
+        return sorted(set(re.findall(r'Seq Scan on (\w+)', plan)))
+    if vendor == 'sqlite':
+        return sorted({
+            match.group(1)
+            for match in re.finditer(r'\bSCAN (\w+)(.*)', plan)
+            if 'INDEX' not in match.group(2)
+        })
+    return []
+
+
+def _mysql_full_scans(node):
+    if isinstance(node, dict):
+        if node.get('access_type') == 'ALL':
+            yield node.get('table_name')
+        for value in node.values():
+            yield from _mysql_full_scans(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from _mysql_full_scans(value)
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs EXPLAIN on the queryset of every store viewset and reports the tables "
+        "that are still read with a full scan. Run it against a realistically sized "
+        "database, on tiny tables the planner prefers scans anyway."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fail-on-scan', action='store_true',
+                            help='exit with an error when any queryset does a full scan')
+        parser.add_argument('--verbose-plan', action='store_true', help='print the full plans')
+
+    def get_users(self):
+        User = get_user_model()
+        customer = Customer.objects.select_related('user').first()
+        staff = User(id=0, username='explain-staff', is_staff=True)
+        return {
+            'staff': staff,
+            'customer': customer.user if customer else User(id=0, username='explain-customer'),
+        }
+
+    def get_url_kwargs(self):
+        return {
+            'product_pk': Product.objects.values_list('pk', flat=True).first() or 0,
+            'cart_pk': Cart.objects.values_list('pk', flat=True).first() or uuid4(),
+            'order_pk': Order.objects.values_list('pk', flat=True).first() or 0,
+        }
+
+    def get_querysets(self):
+        factory = APIRequestFactory()
+        url_kwargs = self.get_url_kwargs()
+        registry = urls.router.registry + urls.products_router.registry \
+            + urls.cart_router.registry + urls.order_router.registry
+
+        for prefix, viewset, basename in registry:
+            seen = set()
+            for user_label, user in self.get_users().items():
+                request = factory.get('/')
+                request.user = user
+                view = viewset(request=Request(request), args=(), kwargs=url_kwargs,
+                               format_kwarg=None, action='list', basename=basename)
+                view.request.user = user
+                queryset = view.filter_queryset(view.get_queryset())
+                if queryset.query.is_empty():
+                    # A viewset whose rows don't come from the database.
+                    continue
+                sql = str(queryset.query)
+                if sql in seen:
+                    continue
+                seen.add(sql)
+                # Explain the page that is actually fetched, not the whole table.
+                page_size = getattr(view.paginator, 'page_size', None) or 100
+                yield f'{viewset.__name__} ({user_label})', queryset[:page_size]
+
+    def handle(self, *args, **options):
+        vendor = connection.vendor
+        explain_options = {'format': 'json'} if vendor == 'mysql' else {}
+        offenders = []
+
+        for label, queryset in self.get_querysets():
+            plan = queryset.explain(**explain_options)
+            tables = full_scans(plan, vendor)
+            if tables:
+                offenders.append(label)
+                self.stdout.write(self.style.WARNING(f'{label}: full scan on {", ".join(tables)}'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'{label}: ok'))
+            if options['verbose_plan']:
+                self.stdout.write(plan)
+
+        if offenders and options['fail_on_scan']:
+            raise CommandError(f'{len(offenders)} querysets do full scans')
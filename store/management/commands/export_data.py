@@ -0,0 +1,64 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.http import HttpRequest, QueryDict
+from rest_framework.exceptions import ValidationError
+from rest_framework.request import Request
+
+from store.exports import stream_export
+from store.views import OrderViewSet, ProductViewSet
+
+VIEWSETS = {
+    'products': ProductViewSet,
+    'orders': OrderViewSet,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Writes every product or order to a file as NDJSON or CSV, streamed like the export/ endpoints. "
+        "--query takes the same query string as the endpoint, e.g. 'inventory__gt=0&ordering=-unit_price'."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(VIEWSETS))
+        parser.add_argument('--format', choices=['ndjson', 'csv'], default='ndjson')
+        parser.add_argument('--output', '-o', default='-', help='file to write, - for stdout')
+        parser.add_argument('--query', default='', help='filters, search and ordering as a query string')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='rows fetched and written at a time')
+
+    def get_queryset(self, viewset_class, query):
+        http_request = HttpRequest()
+        http_request.method = 'GET'
+        http_request.GET = QueryDict(query)
+        view = viewset_class(request=Request(http_request), format_kwarg=None, action='export', kwargs={})
+        # Same filter backends as the endpoint, without the per user restriction of get_queryset().
+        queryset = view.filter_queryset(view.queryset.all())
+        return view, (queryset if queryset.ordered else queryset.order_by('pk'))
+
+    def handle(self, *args, **options):
+        viewset_class = VIEWSETS[options['dataset']]
+        try:
+            view, queryset = self.get_queryset(viewset_class, options['query'])
+        except ValidationError as e:
+            raise CommandError(f'Invalid --query: {e.detail}')
+        serializer_class = viewset_class.export_serializer_class or viewset_class.serializer_class
+
+        started = time.perf_counter()
+        written = 0
+        output = sys.stdout.buffer if options['output'] == '-' else open(options['output'], 'wb')
+        try:
+            for chunk in stream_export(queryset, serializer_class, options['format'],
+                                       view.get_serializer_context(), options['chunk_size']):
+                output.write(chunk)
+                written += len(chunk)
+        finally:
+            if output is not sys.stdout.buffer:
+                output.close()
+
+        if options['output'] != '-':
+            self.stdout.write(self.style.SUCCESS(
+                f'Wrote {written / 1024 / 1024:.1f} MB of {options["dataset"]} to {options["output"]} '
+                f'in {time.perf_counter() - started:.1f}s'
+            ))
@@ -1,136 +1,314 @@
 import random
-from faker import Faker
-from datetime import datetime, timedelta
-import factory
-from factory.fuzzy import FuzzyDateTime
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from multiprocessing import get_context
 
-from django.db import transaction
-from django.utils import timezone
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.core.management.base import BaseCommand
-from django.utils.timezone import make_aware
-from django.utils.timezone import get_current_timezone
-from config import settings
-
-from store.models import Address, Cart, CartItem, Category, Comment, Order, OrderItem, Product, Discount, Customer
-from store.factories import (
-    CartFactory,
-    CategoryFactory,
-    CommentFactory,
-    OrderItemFactory,
-    ProductFactory,
-    DiscountFactory,
-    CustomerFactory,
-    AddressFactory,
-    OrderFactory,
-    CartItemFactory,
-)
-
-faker = Faker()
-
-list_of_models = [CartItem, Cart, OrderItem, Order, Product, Category, Comment, Discount, Address, Customer]
-
-NUM_CATEGORIES = 100
-NUM_DISCOUNTS = 10
-NUM_PRODUCTS = 1000
-NUM_CUSTOMERS = 100
-NUM_ORDERS = 30
-NUM_CARTS = 100
+from django.core.management.color import no_style
+from django.db import connection, connections, models, transaction
+from django.db.models import Max
+from faker import Faker
+
+from store.caching import bump_versions
+from store.models import Address, Cart, CartItem, Category, Comment, Customer, Discount, Order, OrderItem, Product
+
+FAKE_USERNAME_PREFIX = 'fake_'
+
+START = datetime(2019, 1, 1, tzinfo=timezone.utc)
+SPAN_SECONDS = int((datetime(2023, 1, 1, tzinfo=timezone.utc) - START).total_seconds())
+
+ORDER_STATUSES = [Order.ORDER_STATUS_UNPAID, Order.ORDER_STATUS_CANCELED]
+COMMENT_STATUSES = [
+    Comment.COMMENT_STATUS_WAITING, Comment.COMMENT_STATUS_APPROVED, Comment.COMMENT_STATUS_NOT_APPROVED,
+]
+
+
+class Vocabulary:
+    """
+    Faker is only used to fill small pools of words and texts once per
+    process; rows are then assembled by picking from the pools.
+    """
+
+    def __init__(self, seed):
+        faker = Faker()
+        faker.seed_instance(seed)
+        self.words = faker.words(2000)
+        self.sentences = [faker.sentence(nb_words=5) for _ in range(500)]
+        self.paragraphs = [faker.paragraph(nb_sentences=3) for _ in range(500)]
+        self.first_names = [faker.first_name() for _ in range(500)]
+        self.last_names = [faker.last_name() for _ in range(500)]
+
+
+_vocabularies = {}
+
+
+def get_vocabulary(seed):
+    if seed not in _vocabularies:
+        _vocabularies[seed] = Vocabulary(seed)
+    return _vocabularies[seed]
+
+
+def cart_id(number):
+    return uuid.UUID(int=number, version=4)
+
+
+def timestamps(rng, count):
+    return [START + timedelta(seconds=rng.randrange(SPAN_SECONDS)) for _ in range(count)]
+
+
+def make_categories(rng, vocabulary, ids, sizes):
+    titles = rng.choices(vocabulary.sentences, k=len(ids))
+    descriptions = rng.choices(vocabulary.sentences, k=len(ids))
+    yield Category, [
+        Category(id=i, title=title, description=description)
+        for i, title, description in zip(ids, titles, descriptions)
+    ]
+
+
+def make_discounts(rng, vocabulary, ids, sizes):
+    yield Discount, [
+        Discount(id=i, discount=rng.randint(1, 80) / 100, description=rng.choice(vocabulary.sentences))
+        for i in ids
+    ]
+
+
+def make_products(rng, vocabulary, ids, sizes):
+    count = len(ids)
+    names = [' '.join(rng.choices(vocabulary.words, k=3)) for _ in range(count)]
+    categories = rng.choices(range(1, sizes['categories'] + 1), k=count)
+    descriptions = rng.choices(vocabulary.paragraphs, k=count)
+    prices = [Decimal(rng.randint(100, 100000)) / 100 for _ in range(count)]
+    inventories = rng.choices(range(1, 101), k=count)
+    created = timestamps(rng, count)
+    yield Product, [
+        Product(
+            id=i, name=name.title(), slug=name.replace(' ', '-').lower(), category_id=category_id,
+            description=description, unit_price=unit_price, inventory=inventory,
+            datetime_created=datetime_created,
+            datetime_modified=datetime_created + timedelta(hours=rng.randint(1, 500)),
+        )
+        for i, name, category_id, description, unit_price, inventory, datetime_created
+        in zip(ids, names, categories, descriptions, prices, inventories, created)
+    ]
+
+
+def make_customers(rng, vocabulary, ids, sizes):
+    User = get_user_model()
+    user_offset = sizes['first_user_id'] - 1
+    first_names = rng.choices(vocabulary.first_names, k=len(ids))
+    last_names = rng.choices(vocabulary.last_names, k=len(ids))
+    joined = timestamps(rng, len(ids))
+    yield User, [
+        User(
+            id=user_offset + i, username=f'{FAKE_USERNAME_PREFIX}{i}', email=f'{FAKE_USERNAME_PREFIX}{i}@example.com',
+            password='!', first_name=first_name, last_name=last_name, date_joined=date_joined,
+        )
+        for i, first_name, last_name, date_joined in zip(ids, first_names, last_names, joined)
+    ]
+    yield Customer, [
+        Customer(
+            id=i, user_id=user_offset + i, phone_number=f'09{i:09d}',
+            birth_date=date(1990, 1, 1) + timedelta(days=rng.randrange(9131)) if rng.random() > 0.3 else None,
+        )
+        for i in ids
+    ]
+    yield Address, [
+        Address(customer_id=i, province=rng.choice(vocabulary.words), city=rng.choice(vocabulary.words),
+                street=f'street {rng.randint(1, 50)}')
+        for i in ids
+    ]
+
+
+def make_orders(rng, vocabulary, ids, sizes):
+    product_ids = range(1, sizes['products'] + 1)
+    customers = rng.choices(range(1, sizes['customers'] + 1), k=len(ids))
+    statuses = rng.choices(ORDER_STATUSES, k=len(ids))
+    created = timestamps(rng, len(ids))
+    yield Order, [
+        Order(id=i, customer_id=customer_id, status=status, datetime_created=datetime_created)
+        for i, customer_id, status, datetime_created in zip(ids, customers, statuses, created)
+    ]
+    items = []
+    for i in ids:
+        for product_id in rng.sample(product_ids, rng.randint(1, min(sizes['items_per_order'], len(product_ids)))):
+            items.append(OrderItem(order_id=i, product_id=product_id, quantity=rng.randint(1, 20),
+                                   unit_price=Decimal(rng.randint(100, 100000)) / 100))
+    yield OrderItem, items
+
+
+def make_comments(rng, vocabulary, ids, sizes):
+    count = len(ids)
+    products = rng.choices(range(1, sizes['products'] + 1), k=count)
+    names = rng.choices(vocabulary.first_names, k=count)
+    bodies = rng.choices(vocabulary.paragraphs, k=count)
+    statuses = rng.choices(COMMENT_STATUSES, k=count)
+    created = timestamps(rng, count)
+    yield Comment, [
+        Comment(product_id=product_id, name=name, body=body, status=status, datetime_created=datetime_created)
+        for product_id, name, body, status, datetime_created in zip(products, names, bodies, statuses, created)
+    ]
+
+
+def make_carts(rng, vocabulary, ids, sizes):
+    product_ids = range(1, sizes['products'] + 1)
+    yield Cart, [
+        Cart(id=cart_id(i), created_at=created_at, last_activity=created_at)
+        for i, created_at in zip(ids, timestamps(rng, len(ids)))
+    ]
+    items = []
+    for i in ids:
+        for product_id in rng.sample(product_ids, rng.randint(1, min(sizes['items_per_cart'], len(product_ids)))):
+            items.append(CartItem(cart_id=cart_id(i), product_id=product_id, quantity=rng.randint(1, 20)))
+    yield CartItem, items
+
+
+# In dependency order, every stage only references rows of earlier stages.
+STAGES = [
+    ('categories', make_categories),
+    ('discounts', make_discounts),
+    ('products', make_products),
+    ('customers', make_customers),
+    ('orders', make_orders),
+    ('comments', make_comments),
+    ('carts', make_carts),
+]
+GENERATORS = dict(STAGES)
+
+
+@contextmanager
+def backdated():
+    """
+    Lets bulk_create keep the generated values of auto_now(_add) fields.
+    """
+    fields = [
+        field
+        for model in apps.get_models()
+        for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def insert_chunk(task):
+    """
+    Generates and inserts one chunk of a stage. Every chunk has its own
+    random generator derived from the seed, so the data is the same
+    whatever the number of processes.
+    """
+    stage, first_id, count, seed, sizes, batch_size = task
+    rng = random.Random(f'{seed}-{stage}-{first_id}')
+    ids = range(first_id, first_id + count)
+    rows = 0
+    with transaction.atomic(), backdated():
+        for model, objs in GENERATORS[stage](rng, get_vocabulary(seed), ids, sizes):
+            # The plain QuerySet skips the per-product counter updates of
+            # Comment.objects; the counters are rebuilt once at the end.
+            models.QuerySet(model).bulk_create(objs, batch_size=batch_size)
+            rows += len(objs)
+    return rows
 
 
 class Command(BaseCommand):
-    help = "Generates fake data"
-
-    @transaction.atomic
-    def handle(self, *args, **kwargs):
-        self.stdout.write("Deleting old data...")
-        models = list_of_models
-        for m in models:
-            m.objects.all().delete()
-
-        self.stdout.write("Creating new data...\n")
-
-        tz = timezone.get_current_timezone()
-
-        # Categories data
-        print(f"Adding {NUM_CATEGORIES} categories...", end='')
-        all_categories = [CategoryFactory(top_product=None) for _ in range(NUM_CATEGORIES)]
-        print('DONE')
-
-        # Discounts data
-        print(f"Adding {NUM_DISCOUNTS} discounts...", end='')
-        all_discounts = [DiscountFactory() for _ in range(NUM_DISCOUNTS)]
-        print('DONE')
-
-        # Products data
-        print(f"Adding {NUM_PRODUCTS} product...", end='')
-        all_products = list()
-        for _ in range(NUM_PRODUCTS):
-            new_product = ProductFactory(category_id=random.choice(all_categories).id)
-            new_product.datetime_created = datetime(random.randrange(2019, 2023),random.randint(1,12),random.randint(1,12), tzinfo=timezone.utc)
-            new_product.datetime_modified = new_product.datetime_created + timedelta(hours=random.randint(1, 500))
-            new_product.save()
-            all_products.append(new_product)
-        print('DONE')
-
-        # Customers data
-        print(f"Adding {NUM_CUSTOMERS} customers...", end='')
-        all_customers = [(CustomerFactory() if (random.random() > 0.3) else CustomerFactory(birth_date=None)) for _ in range(NUM_CUSTOMERS) ]
-        print('DONE')
-
-        # Addresses data
-        print(f"Adding customers addresses...", end='')
-        all_addresses = [
-            AddressFactory(customer_id=customer.id) for customer in all_customers
+    help = (
+        "Replaces the store data with generated data. Rows are generated and inserted in chunks, "
+        "optionally by several processes (fork based, MySQL and PostgreSQL only). The same --seed gives the same data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=int, default=100)
+        parser.add_argument('--discounts', type=int, default=10)
+        parser.add_argument('--products', type=int, default=1000)
+        parser.add_argument('--customers', type=int, default=100)
+        parser.add_argument('--orders', type=int, default=30)
+        parser.add_argument('--comments', type=int, default=None, help='defaults to three per product')
+        parser.add_argument('--carts', type=int, default=100)
+        parser.add_argument('--items-per-order', type=int, default=10, help='maximum products per order')
+        parser.add_argument('--items-per-cart', type=int, default=10, help='maximum products per cart')
+        parser.add_argument('--chunk-size', type=int, default=10000, help='rows generated per task and transaction')
+        parser.add_argument('--batch-size', type=int, default=2000, help='rows per INSERT statement')
+        parser.add_argument('--processes', type=int, default=1)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def flush(self):
+        """
+        Empties every store table with TRUNCATE (DELETE on SQLite) instead of
+        loading the rows for the delete collector, then removes the users
+        created by a previous run.
+        """
+        store_tables = [model._meta.db_table for model in apps.get_app_config('store').get_models(include_auto_created=True)]
+        connection.ops.execute_sql_flush(
+            connection.ops.sql_flush(no_style(), store_tables, reset_sequences=True, allow_cascade=True)
+        )
+        User = get_user_model()
+        users = User.objects.filter(username__startswith=FAKE_USERNAME_PREFIX)
+        users._raw_delete(users.db)
+
+    def run_stage(self, stage, total, options, sizes, pool):
+        chunk_size = options['chunk_size']
+        tasks = [
+            (stage, first_id, min(chunk_size, total - first_id + 1), options['seed'], sizes, options['batch_size'])
+            for first_id in range(1, total + 1, chunk_size)
         ]
-        print('DONE')
-
-        # Orders data
-        print(f"Adding {NUM_ORDERS} orders...", end='')
-        all_orders = [OrderFactory(
-            customer_id=random.choice(all_customers).id
-        ) for _ in range(NUM_ORDERS)]
-        for order in all_orders:
-            order.datetime_created = datetime(random.randrange(2019, 2023),random.randint(1,12),random.randint(1,12), tzinfo=timezone.utc)
-            order.save()
-        print('DONE')
-
-        # OrderItems data
-        print(f"Adding order items...", end='')
-        all_order_items = list()
-        for order in all_orders:
-            products = random.sample(all_products, random.randint(1, 10))
-            for product in products:
-                order_item = OrderItemFactory(
-                    order_id=order.id,
-                    product_id=product.id,
-                    unit_price=product.unit_price,
-                )
-                all_order_items.append(order_item)
-        print('DONE')
-
-        # Comments data
-        print(f"Adding product comments...", end='')
-        for product in all_products:
-            for _ in range(random.randint(1, 5)):
-                comment = CommentFactory(product_id=product.id)
-                comment.datetime_created = datetime(random.randrange(2019, 2023), random.randint(1,12),random.randint(1, 12), tzinfo=timezone.utc)
-                comment.save()
-        print('DONE')
-
-        # Carts data
-        print(f"Adding {NUM_CARTS} carts...", end='')
-        all_carts = [CartFactory() for _ in range(NUM_CARTS)]
-        print('DONE')
-
-        # CartItems data
-        print(f"Adding cart items...", end='')
-        all_cart_items = list()
-        for cart in all_carts:
-            products = random.sample(all_products, random.randint(1, 10))
-            for product in products:
-                cart_item = CartItemFactory(
-                    cart_id=cart.id,
-                    product_id=product.id,
-                )
-                all_cart_items.append(cart_item)
-        print('DONE')
+        self.stdout.write(f'Adding {total} {stage}...', ending='')
+        self.stdout.flush()
+        started = time.perf_counter()
+        results = pool.imap_unordered(insert_chunk, tasks) if pool else map(insert_chunk, tasks)
+        rows = sum(results)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'DONE, {rows} rows in {elapsed:.1f}s ({rows / elapsed if elapsed else 0:.0f} rows/s)')
+
+    def handle(self, *args, **options):
+        if options['comments'] is None:
+            options['comments'] = 3 * options['products']
+        sizes = {stage: options[stage] for stage, _ in STAGES}
+        sizes['items_per_order'] = options['items_per_order']
+        sizes['items_per_cart'] = options['items_per_cart']
+
+        started = time.perf_counter()
+        self.stdout.write('Deleting old data...')
+        self.flush()
+        User = get_user_model()
+        sizes['first_user_id'] = (User.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+
+        self.stdout.write('Creating new data...')
+        pool = None
+        if options['processes'] > 1 and connection.vendor == 'sqlite':
+            self.stdout.write(self.style.WARNING('SQLite allows a single writer, ignoring --processes.'))
+        elif options['processes'] > 1:
+            # Forked children must not share the parent's database connection.
+            connections.close_all()
+            pool = get_context('fork').Pool(options['processes'])
+        try:
+            for stage, _ in STAGES:
+                if sizes[stage]:
+                    self.run_stage(stage, sizes[stage], options, sizes, pool)
+        finally:
+            if pool:
+                pool.close()
+                pool.join()
+
+        # Rows were inserted with explicit ids, move the sequences past them.
+        sequence_sql = connection.ops.sequence_reset_sql(no_style(), [Category, Discount, Product, Customer, Order, User])
+        if sequence_sql:
+            with connection.cursor() as cursor:
+                for statement in sequence_sql:
+                    cursor.execute(statement)
+
+        call_command('rebuild_comment_counters', stdout=self.stdout)
+        if apps.is_installed('analytics'):
+            call_command('backfill_sales_rollups', '--rebuild', stdout=self.stdout)
+        bump_versions(Product, Category, Comment)
+        self.stdout.write(self.style.SUCCESS(f'Done in {time.perf_counter() - started:.1f}s'))
@@ -0,0 +1,52 @@
+import csv
+import io
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.imports import ProductImporter, iter_ndjson
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates or updates products from a CSV or NDJSON file, a batch per transaction, like "
+        "POST /store/products/import/. Rows with an id update that product, the others create one; "
+        "category is the category title. A CSV written by `export_data products` imports as is."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='file to read, - for stdin')
+        parser.add_argument('--format', choices=['ndjson', 'csv'],
+                            help='defaults to the extension of the file, ndjson for stdin')
+        parser.add_argument('--batch-size', type=int, default=500, help='rows validated and written at a time')
+        parser.add_argument('--max-errors', type=int, default=20, help='invalid rows to print')
+
+    def read_rows(self, source, file_format):
+        if file_format == 'csv':
+            # Empty cells count as missing, e.g. the id of a new product.
+            for row in csv.DictReader(io.TextIOWrapper(source, encoding='utf-8', newline='')):
+                yield {key: value for key, value in row.items() if value != ''}
+        else:
+            yield from iter_ndjson(source)
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or ('csv' if options['path'].endswith('.csv') else 'ndjson')
+        importer = ProductImporter(options['batch_size'], max_errors=options['max_errors'])
+
+        started = time.perf_counter()
+        source = sys.stdin.buffer if options['path'] == '-' else open(options['path'], 'rb')
+        try:
+            result = importer.run(self.read_rows(source, file_format))
+        finally:
+            if source is not sys.stdin.buffer:
+                source.close()
+
+        for error in result['errors']:
+            messages = '; '.join(f'{field}: {" ".join(map(str, errors))}' for field, errors in error['errors'].items())
+            self.stderr.write(f'row {error["row"]}: {messages}')
+        style = self.style.SUCCESS if not result['failed'] else self.style.WARNING
+        self.stdout.write(style(
+            f'Created {result["created"]} and updated {result["updated"]} products, {result["failed"]} rows '
+            f'failed, in {time.perf_counter() - started:.1f}s'
+        ))
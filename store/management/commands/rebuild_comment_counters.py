@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+
+from store.models import Product
+
+
+class Command(BaseCommand):
+    help = "Recomputes Product.comments_count and Product.approved_comments_count from the comments table"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000,
+                            help='number of product ids refreshed per UPDATE statement')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        last_id = Product.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+
+        updated = 0
+        for start in range(0, last_id + 1, chunk_size):
+            updated += Product.objects \
+                .filter(id__gte=start, id__lt=start + chunk_size) \
+                .refresh_comment_counts()
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt comment counters of {updated} products.'))
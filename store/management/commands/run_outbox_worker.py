@@ -0,0 +1,59 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Min
+from django.utils import timezone
+
+from store.models import OrderEvent
+from store.outbox import get_dispatcher
+
+
+class Command(BaseCommand):
+    help = (
+        "Delivers the pending order events of the outbox: retries, events whose in-process "
+        "dispatch died and everything when STORE_OUTBOX['DISPATCH_ON_COMMIT'] is off"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--interval', type=float, default=1.0, help='seconds to sleep when nothing is due')
+        parser.add_argument('--report-every', type=float, default=10.0, help='seconds between progress reports')
+        parser.add_argument('--once', action='store_true', help='exit once no event is due')
+
+    def report(self, delivered, rescheduled, elapsed):
+        pending = OrderEvent.objects.filter(status=OrderEvent.EVENT_STATUS_PENDING) \
+            .aggregate(count=Count('id'), oldest=Min('datetime_created'))
+        lag = (timezone.now() - pending['oldest']).total_seconds() if pending['oldest'] else 0
+        self.stdout.write(
+            f'{delivered} delivered, {rescheduled} retried or failed, '
+            f'{delivered / elapsed if elapsed else 0:.1f} events/s, '
+            f'{pending["count"]} pending, lag {lag:.1f}s'
+        )
+
+    def handle(self, *args, **options):
+        dispatcher = get_dispatcher()
+        delivered = rescheduled = 0
+        started = last_report = time.monotonic()
+
+        try:
+            while True:
+                event_ids = dispatcher.due(options['batch_size'])
+                for result in dispatcher.executor.map(dispatcher.run, event_ids):
+                    if result is True:
+                        delivered += 1
+                    elif result is False:
+                        rescheduled += 1
+
+                now = time.monotonic()
+                if now - last_report >= options['report_every']:
+                    self.report(delivered, rescheduled, now - started)
+                    last_report = now
+                if not event_ids:
+                    if options['once']:
+                        break
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            dispatcher.shutdown()
+            self.report(delivered, rescheduled, time.monotonic() - started)
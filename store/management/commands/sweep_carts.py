@@ -0,0 +1,52 @@
+import argparse
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.sweeper import get_sweeper
+
+
+def duty_cycle(value):
+    value = float(value)
+    if not 0 < value <= 1:
+        raise argparse.ArgumentTypeError(f'must be greater than 0 and at most 1, not {value}')
+    return value
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes the carts that saw no activity for STORE_CARTS['TTL_DAYS'] days, in small throttled "
+        "batches. Runs forever, sweeping every --interval seconds, unless --once is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='sweep once and exit')
+        parser.add_argument('--interval', type=float, default=300.0, help='seconds between sweeps')
+        parser.add_argument('--ttl-days', type=float)
+        parser.add_argument('--batch-size', type=int, help='carts deleted per transaction to start with')
+        parser.add_argument('--max-batch-seconds', type=float,
+                            help='batches slower than this halve the batch size')
+        parser.add_argument('--duty-cycle', type=duty_cycle, help='fraction of the wall time spent deleting')
+
+    def report(self, stats):
+        self.stdout.write(
+            f'Deleted {stats["carts"]} carts and {stats["items"]} cart items in {stats["batches"]} batches, '
+            f'{stats["seconds"]:.2f}s ({stats["db_seconds"]:.2f}s in the database, '
+            f'slowest batch {stats["slowest_batch_ms"]:.1f}ms, batch size now {stats["batch_size"]})'
+        )
+
+    def handle(self, *args, **options):
+        sweeper = get_sweeper(
+            ttl_days=options['ttl_days'],
+            batch_size=options['batch_size'],
+            max_batch_seconds=options['max_batch_seconds'],
+            duty_cycle=options['duty_cycle'],
+        )
+        try:
+            while True:
+                self.report(sweeper.sweep())
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,179 @@
+import logging
+import random
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('store.queries')
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryRecorder:
+    """
+    `execute_wrapper` that counts the queries of one request, their time
+    and how often each SQL shape ran. Parameters are not part of the shape,
+    so the same query issued per row of a list shows up as one shape with a
+    high count.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.shapes[sql] += 1
+
+    def repeated(self, threshold):
+        return [(sql, count) for sql, count in self.shapes.most_common() if count >= threshold]
+
+
+class QueryMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def record(self, view, recorder, over_budget, repeated):
+        with self._lock:
+            metrics = self._views.setdefault(view, {
+                'requests': 0, 'queries': 0, 'db_ms': 0.0, 'max_queries': 0, 'over_budget': 0, 'n_plus_one': 0,
+            })
+            metrics['requests'] += 1
+            metrics['queries'] += recorder.count
+            metrics['db_ms'] += recorder.duration * 1000
+            metrics['max_queries'] = max(metrics['max_queries'], recorder.count)
+            metrics['over_budget'] += int(over_budget)
+            metrics['n_plus_one'] += int(bool(repeated))
+
+    def stats(self):
+        with self._lock:
+            return {
+                view: dict(metrics, queries_per_request=round(metrics['queries'] / metrics['requests'], 2),
+                           db_ms=round(metrics['db_ms'], 3))
+                for view, metrics in self._views.items()
+            }
+
+
+query_metrics = QueryMetrics()
+
+
+def get_query_budget(view_func, method):
+    """
+    Reads `query_budget` from the view class: an int for every action or a
+    dict keyed by action name (or HTTP method for plain views).
+    """
+    view_class = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+    budget = getattr(view_class, 'query_budget', None)
+    if isinstance(budget, dict):
+        actions = getattr(view_func, 'actions', None) or {}
+        action = actions.get(method.lower(), method.lower())
+        return budget.get(action)
+    return budget
+
+
+class QueryBudgetMiddleware:
+    """
+    Records the queries of a sample of requests, enforces the per view
+    `query_budget` and reports repeated query shapes (N+1). Unsampled
+    requests only pay for one random() call. The queries a streaming
+    response runs while it's consumed come after the view returned and
+    aren't counted, so streaming actions are left without a budget.
+
+    Works in both handler modes. Connections are thread local, so under
+    ASGI the recorder is installed on the connections of the thread that
+    runs the ORM calls of the request, which costs two extra hops on
+    sampled requests only.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        config = getattr(settings, 'STORE_QUERY_BUDGET', {})
+        self.sample_rate = config.get('SAMPLE_RATE', 1.0)
+        self.n_plus_one_threshold = config.get('N_PLUS_ONE_THRESHOLD', 5)
+        self.raise_on_violation = config.get('RAISE', False)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        with self.recording(recorder):
+            response = self.get_response(request)
+        self.report(request, response, recorder)
+        return response
+
+    async def __acall__(self, request):
+        if random.random() >= self.sample_rate:
+            return await self.get_response(request)
+
+        recorder = QueryRecorder()
+        stack = await sync_to_async(self.recording)(recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        self.report(request, response, recorder)
+        return response
+
+    def recording(self, recorder):
+        stack = ExitStack()
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(recorder))
+        return stack
+
+    def report(self, request, response, recorder):
+        # Read from the resolver rather than process_view, which the async
+        # handler would run through sync_to_async on every request.
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return
+        view_func = match.func
+        view_class = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+        view = f'{view_func.__module__}.{(view_class or view_func).__name__}'
+        budget = get_query_budget(view_func, request.method)
+        over_budget = budget is not None and recorder.count > budget
+        repeated = recorder.repeated(self.n_plus_one_threshold)
+        query_metrics.record(view, recorder, over_budget, repeated)
+
+        details = {
+            'view': view,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': recorder.count,
+            'db_ms': round(recorder.duration * 1000, 3),
+            'budget': budget,
+        }
+        if settings.DEBUG:
+            response['X-DB-Queries'] = str(recorder.count)
+        if repeated:
+            logger.warning('repeated queries in %s: %s', view,
+                           '; '.join(f'{count}x {sql[:200]}' for sql, count in repeated),
+                           extra=dict(details, repeated=[count for _, count in repeated]))
+        if over_budget:
+            logger.warning('%s ran %s queries, budget is %s', view, recorder.count, budget, extra=details)
+            if self.raise_on_violation:
+                raise QueryBudgetExceeded(f'{view} ran {recorder.count} queries, budget is {budget}')
+        else:
+            logger.debug('%s ran %s queries', view, recorder.count, extra=details)
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.15 on 2026-10-18 20:12
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_comment_counters(apps, schema_editor):
+    Product = apps.get_model('store', 'Product')
+    Comment = apps.get_model('store', 'Comment')
+    comments = Comment.objects.filter(product=OuterRef('pk')).order_by().values('product')
+    Product.objects.update(
+        comments_count=Coalesce(Subquery(
+            comments.annotate(count=Count('id')).values('count')), 0),
+        approved_comments_count=Coalesce(Subquery(
+            comments.filter(status='a').annotate(count=Count('id')).values('count')), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0014_alter_cartitem_cart'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='approved_comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_comment_counters, migrations.RunPython.noop),
+    ]
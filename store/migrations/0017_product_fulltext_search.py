@@ -0,0 +1,22 @@
+from django.db import migrations
+
+
+def install(apps, schema_editor):
+    from store.search import install_fulltext
+    install_fulltext(schema_editor)
+
+
+def uninstall(apps, schema_editor):
+    from store.search import uninstall_fulltext
+    uninstall_fulltext(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0016_store_access_path_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
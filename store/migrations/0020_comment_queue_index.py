@@ -0,0 +1,17 @@
+# Generated by Django 5.1.15 on 2026-10-18 21:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0019_cart_last_activity'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['status', 'datetime_created', 'id'], name='store_comment_queue_idx'),
+        ),
+    ]
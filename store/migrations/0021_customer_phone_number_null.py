@@ -0,0 +1,24 @@
+# Generated by Django 5.1.15 on 2026-10-18 21:18
+
+from django.db import migrations, models
+
+
+def blank_phone_numbers_to_null(apps, schema_editor):
+    Customer = apps.get_model('store', 'Customer')
+    Customer.objects.filter(phone_number='').update(phone_number=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0020_comment_queue_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='customer',
+            name='phone_number',
+            field=models.CharField(blank=True, max_length=255, null=True, unique=True),
+        ),
+        migrations.RunPython(blank_phone_numbers_to_null, migrations.RunPython.noop),
+    ]
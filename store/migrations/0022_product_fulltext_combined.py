@@ -0,0 +1,18 @@
+from django.db import migrations
+
+
+def install(apps, schema_editor):
+    # Moves MySQL from separate name and title indexes to one index over both.
+    from store.search import install_fulltext
+    install_fulltext(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0021_customer_phone_number_null'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, migrations.RunPython.noop),
+    ]
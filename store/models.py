@@ -1,7 +1,12 @@
-from django.db import models
+from django.db import connections, models, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.core.validators import MinValueValidator
 from uuid import uuid4
 from django.conf import settings
+from django.utils import timezone
+
+from .caching import bump_scoped_versions, bump_versions
 
 
 class Category(models.Model):
@@ -21,6 +26,23 @@ class Discount(models.Model):
         return f'{self.discount} | {self.description}'
 
 
+class ProductQuerySet(models.QuerySet):
+    def add_comment_counts(self, comments=0, approved=0):
+        return self.update(
+            comments_count=F('comments_count') + comments,
+            approved_comments_count=F('approved_comments_count') + approved,
+        )
+
+    def refresh_comment_counts(self):
+        comments = Comment.objects.filter(product=OuterRef('pk')).order_by().values('product')
+        return self.update(
+            comments_count=Coalesce(Subquery(
+                comments.annotate(count=Count('id')).values('count')), 0),
+            approved_comments_count=Coalesce(Subquery(
+                comments.filter(status=Comment.COMMENT_STATUS_APPROVED).annotate(count=Count('id')).values('count')), 0),
+        )
+
+
 class Product(models.Model):
     name = models.CharField(max_length=255)
     slug = models.SlugField()
@@ -31,6 +53,19 @@ class Product(models.Model):
     discounts = models.ManyToManyField(Discount, blank=True, related_name='products')
     datetime_created = models.DateTimeField(auto_now_add=True)
     datetime_modified = models.DateTimeField(auto_now=True)
+    comments_count = models.PositiveIntegerField(default=0, editable=False)
+    approved_comments_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = ProductQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['category', 'unit_price'], name='store_prod_cat_price_idx'),
+            models.Index(fields=['category', 'name'], name='store_prod_cat_name_idx'),
+            models.Index(fields=['unit_price', 'id'], name='store_prod_price_idx'),
+            models.Index(fields=['name', 'id'], name='store_prod_name_idx'),
+            models.Index(fields=['inventory', 'id'], name='store_prod_inventory_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -38,7 +73,8 @@ class Product(models.Model):
 
 class Customer(models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.PROTECT)
-    phone_number = models.CharField(max_length=255, unique=True)
+    # Null until given, unique among the customers who gave one.
+    phone_number = models.CharField(max_length=255, unique=True, null=True, blank=True)
     birth_date = models.DateField(null=True, blank=True)
 
     def __str__(self):
@@ -85,6 +121,13 @@ class Order(models.Model):
     objects = models.Manager()
     unpaid_orders = UnpaidOrderManager()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['customer', 'status', '-datetime_created'], name='store_order_cust_status_idx'),
+            models.Index(fields=['status', '-datetime_created'], name='store_order_status_idx'),
+            models.Index(fields=['-datetime_created'], name='store_order_created_idx'),
+        ]
+
     def __str__(self):
         return f'order id: {self.id}'
 
@@ -99,12 +142,80 @@ class OrderItem(models.Model):
         unique_together = [['order', 'product']]
 
 
-class CommentManager(models.Manager):
+class OrderEvent(models.Model):
+    """
+    Outbox row written in the same transaction as the order it is about, so
+    an event exists if and only if the order was committed.
+    """
+    EVENT_ORDER_CREATED = 'order_created'
+    EVENT_ORDER_STATUS_CHANGED = 'order_status_changed'
+
+    EVENT_STATUS_PENDING = 'p'
+    EVENT_STATUS_DELIVERED = 'd'
+    EVENT_STATUS_FAILED = 'f'
+
+    EVENT_STATUS = [
+        (EVENT_STATUS_PENDING, 'Pending'),
+        (EVENT_STATUS_DELIVERED, 'Delivered'),
+        (EVENT_STATUS_FAILED, 'Failed'),
+    ]
+
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='events')
+    event = models.CharField(max_length=50, default=EVENT_ORDER_CREATED)
+    status = models.CharField(max_length=1, choices=EVENT_STATUS, default=EVENT_STATUS_PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    datetime_created = models.DateTimeField(auto_now_add=True)
+    datetime_delivered = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'available_at'], name='store_event_status_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.event} of order {self.order_id}'
+
+
+class CommentQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        if not {'status', 'product', 'product_id'} & kwargs.keys():
+            return super().update(**kwargs)
+        with transaction.atomic(using=self.db):
+            product_ids = set(self.order_by().values_list('product_id', flat=True).distinct())
+            rows = super().update(**kwargs)
+            new_product = kwargs.get('product_id', kwargs.get('product'))
+            if new_product is not None:
+                product_ids.add(getattr(new_product, 'pk', new_product))
+            Product.objects.filter(id__in=product_ids).refresh_comment_counts()
+        bump_versions(Comment)
+        bump_scoped_versions(Comment, product_ids)
+        return rows
+
+    def bulk_create(self, objs, *args, **kwargs):
+        with transaction.atomic(using=self.db):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            deltas = {}
+            for comment in objs:
+                comments, approved = deltas.get(comment.product_id, (0, 0))
+                deltas[comment.product_id] = (
+                    comments + 1,
+                    approved + (comment.status == Comment.COMMENT_STATUS_APPROVED),
+                )
+            for product_id, (comments, approved) in deltas.items():
+                Product.objects.filter(pk=product_id).add_comment_counts(comments, approved)
+        bump_versions(Comment)
+        bump_scoped_versions(Comment, [product_id for product_id, (_, approved) in deltas.items() if approved])
+        return objs
+
+
+class CommentManager(models.Manager.from_queryset(CommentQuerySet)):
     def get_approved(self):
         return self.get_queryset().filter(status=Comment.COMMENT_STATUS_APPROVED)
 
 
-class ApprovedCommentManager(models.Manager):
+class ApprovedCommentManager(models.Manager.from_queryset(CommentQuerySet)):
     def get_queryset(self):
         return super().get_queryset().filter(status=Comment.COMMENT_STATUS_APPROVED)
 
@@ -128,10 +239,84 @@ class Comment(models.Model):
     objects = CommentManager()
     approved = ApprovedCommentManager()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', 'status', '-datetime_created'], name='store_comment_prod_status_idx'),
+            # The moderation queue, oldest first.
+            models.Index(fields=['status', 'datetime_created', 'id'], name='store_comment_queue_idx'),
+        ]
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Remember the stored state so the counter handlers can apply deltas.
+        # Deferred fields are read by load_stored_state() before a write.
+        self._loaded_status = self.__dict__.get('status', models.DEFERRED)
+        self._loaded_product_id = self.__dict__.get('product_id', models.DEFERRED)
+
+    def load_stored_state(self):
+        if self.pk is None or models.DEFERRED not in (self._loaded_status, self._loaded_product_id):
+            return
+        stored = Comment.objects.filter(pk=self.pk).values_list('status', 'product_id').first()
+        self._loaded_status, self._loaded_product_id = stored or (None, None)
+
+
+class CartQuerySet(models.QuerySet):
+    def touch(self):
+        return self.update(last_activity=timezone.now())
+
 
 class Cart(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid4)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Moved forward by every change to the items, carts idle for longer than
+    # STORE_CARTS['TTL_DAYS'] are deleted by `manage.py sweep_carts`.
+    last_activity = models.DateTimeField(default=timezone.now)
+
+    objects = CartQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='store_cart_created_idx'),
+            models.Index(fields=['last_activity'], name='store_cart_activity_idx'),
+        ]
+
+
+class CartItemQuerySet(models.QuerySet):
+    def add_items(self, cart_id, quantities):
+        """
+        Adds `{product_id: quantity}` to a cart in a single INSERT that bumps
+        the quantity of the products already in the cart, so concurrent adds
+        neither lose updates nor hit the (cart, product) unique constraint.
+        """
+        if not quantities:
+            return 0
+        connection = connections[self.db]
+        meta = self.model._meta
+        table = connection.ops.quote_name(meta.db_table)
+        cart_column, product_column, quantity_column = (
+            connection.ops.quote_name(meta.get_field(name).column) for name in ['cart', 'product', 'quantity']
+        )
+        cart_id = meta.get_field('cart').get_db_prep_save(cart_id, connection)
+
+        values = ', '.join(['(%s, %s, %s)'] * len(quantities))
+        params = []
+        for product_id, quantity in quantities.items():
+            params += [cart_id, product_id, quantity]
+
+        if connection.vendor == 'mysql':
+            conflict = f'ON DUPLICATE KEY UPDATE {quantity_column} = {quantity_column} + VALUES({quantity_column})'
+        else:
+            conflict = (
+                f'ON CONFLICT ({cart_column}, {product_column}) '
+                f'DO UPDATE SET {quantity_column} = {table}.{quantity_column} + excluded.{quantity_column}'
+            )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} ({cart_column}, {product_column}, {quantity_column}) '
+                f'VALUES {values} {conflict}',
+                params,
+            )
+            return cursor.rowcount
 
 
 class CartItem(models.Model):
@@ -139,5 +324,7 @@ class CartItem(models.Model):
     product = models.ForeignKey(Product, on_delete=models.PROTECT, related_name='cart_items')
     quantity = models.SmallIntegerField(default=1)
 
+    objects = CartItemQuerySet.as_manager()
+
     class Meta:
         unique_together = [['cart', 'product']]
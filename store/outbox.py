@@ -0,0 +1,133 @@
+"""
+Delivery of the events stored in the `OrderEvent` outbox.
+
+`publish` writes the event in the caller's transaction and, once that
+commits, hands it to a thread pool, so receivers never add latency to the
+request. Every attempt first claims the event by pushing `available_at` a
+lease into the future; an event whose worker died becomes due again when
+the lease expires and is picked up by `run_outbox_worker`. Delivery is at
+least once, receivers have to be idempotent.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Order, OrderEvent
+from .signals import order_created, order_status_changed
+
+logger = logging.getLogger(__name__)
+
+SIGNALS = {
+    OrderEvent.EVENT_ORDER_CREATED: order_created,
+    OrderEvent.EVENT_ORDER_STATUS_CHANGED: order_status_changed,
+}
+
+
+class Dispatcher:
+    def __init__(self, workers=4, max_attempts=8, backoff_seconds=2, max_backoff_seconds=3600,
+                 lease_seconds=300, dispatch_on_commit=True):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.lease_seconds = lease_seconds
+        self.dispatch_on_commit = dispatch_on_commit
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='outbox')
+            return self._executor
+
+    def submit(self, event_id):
+        return self.executor.submit(self.run, event_id)
+
+    def run(self, event_id):
+        close_old_connections()
+        try:
+            return self.deliver(event_id)
+        except Exception:
+            logger.exception('Delivering order event %s failed', event_id)
+        finally:
+            close_old_connections()
+
+    def claim(self, event_id):
+        now = timezone.now()
+        claimed = OrderEvent.objects \
+            .filter(id=event_id, status=OrderEvent.EVENT_STATUS_PENDING, available_at__lte=now) \
+            .update(attempts=F('attempts') + 1, available_at=now + timedelta(seconds=self.lease_seconds))
+        return claimed == 1
+
+    def deliver(self, event_id):
+        """
+        Sends the event to the receivers of its signal. Returns True when all
+        of them succeeded, False when it was rescheduled or gave up and None
+        when another worker holds the event.
+        """
+        if not self.claim(event_id):
+            return None
+        event = OrderEvent.objects.select_related('order').get(id=event_id)
+        responses = SIGNALS[event.event].send_robust(sender=Order, order=event.order)
+        errors = [
+            f'{getattr(receiver, "__qualname__", receiver)}: {response!r}'
+            for receiver, response in responses if isinstance(response, Exception)
+        ]
+
+        now = timezone.now()
+        events = OrderEvent.objects.filter(id=event_id)
+        if not errors:
+            events.update(status=OrderEvent.EVENT_STATUS_DELIVERED, datetime_delivered=now, last_error='')
+            return True
+        if event.attempts >= self.max_attempts:
+            events.update(status=OrderEvent.EVENT_STATUS_FAILED, last_error='\n'.join(errors))
+            logger.error('Giving up order event %s after %s attempts', event_id, event.attempts)
+        else:
+            delay = min(self.backoff_seconds * 2 ** (event.attempts - 1), self.max_backoff_seconds)
+            events.update(available_at=now + timedelta(seconds=delay), last_error='\n'.join(errors))
+        return False
+
+    def due(self, limit):
+        return list(
+            OrderEvent.objects
+            .filter(status=OrderEvent.EVENT_STATUS_PENDING, available_at__lte=timezone.now())
+            .order_by('available_at')
+            .values_list('id', flat=True)[:limit]
+        )
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+                self._executor = None
+
+
+_dispatcher = None
+
+
+def get_dispatcher():
+    global _dispatcher
+    if _dispatcher is None:
+        config = getattr(settings, 'STORE_OUTBOX', {})
+        _dispatcher = Dispatcher(**{key.lower(): value for key, value in config.items()})
+    return _dispatcher
+
+
+def publish(order, event=OrderEvent.EVENT_ORDER_CREATED):
+    """
+    Records `event` for `order`. Must be called inside the transaction that
+    creates or changes the order.
+    """
+    order_event = OrderEvent.objects.create(order=order, event=event)
+    dispatcher = get_dispatcher()
+    if dispatcher.dispatch_on_commit:
+        transaction.on_commit(lambda: dispatcher.submit(order_event.id))
+    return order_event
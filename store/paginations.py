@@ -1,5 +1,200 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 class DefaultPagination(PageNumberPagination):
     page_size = 10
+
+
+class KeysetPagination(BasePagination):
+    """
+    Seek based pagination over the ordering chosen by `OrderingFilter`.
+
+    The last row of a page is encoded in an opaque cursor and the next page
+    is fetched with `WHERE (ordering, id) > (cursor values)`, so there is no
+    COUNT(*) and no OFFSET scan no matter how deep the cursor is.
+    """
+    page_size = 10
+    cursor_query_param = 'cursor'
+    tie_breaker = 'id'
+    default_ordering = ('id',)
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(queryset, view)
+
+        cursor = self.decode_cursor(request, queryset)
+        self.reverse = bool(cursor and cursor['r'])
+
+        ordering = self.ordering
+        if self.reverse:
+            ordering = [self._flip(field) for field in ordering]
+        queryset = queryset.order_by(*ordering)
+        if cursor is not None:
+            queryset = queryset.filter(self.seek_filter(ordering, cursor['v']))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if self.reverse:
+            results.reverse()
+
+        # Moving backwards means there is always something after this page,
+        # and moving forwards from a cursor means there is something before.
+        if self.reverse:
+            self.has_next, self.has_previous = cursor is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+        self.page = results
+        return results
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_ordering(self, queryset, view):
+        ordering = [field for field in queryset.query.order_by if isinstance(field, str)]
+        if not ordering:
+            ordering = list(getattr(view, 'ordering', None) or self.default_ordering)
+
+        allowed = set(getattr(view, 'ordering_fields', None) or []) | {self.tie_breaker}
+        ordering = [field for field in ordering if field.lstrip('-') in allowed]
+        if not any(field.lstrip('-') in (self.tie_breaker, 'pk') for field in ordering):
+            ordering.append(self.tie_breaker)
+        return ordering
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def seek_filter(self, ordering, values):
+        """
+        Expand `(a, b, id) > (x, y, z)` into the OR-of-ANDs form, which also
+        works for mixed ascending/descending orderings.
+        """
+        condition = Q()
+        equal = {}
+        for field, value in zip(ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return condition
+
+    def encode_cursor(self, instance, reverse):
+        values = [self._to_json(getattr(instance, field.lstrip('-'))) for field in self.ordering]
+        payload = json.dumps({'o': self.ordering, 'v': values, 'r': reverse}, separators=(',', ':'))
+        cursor = urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request, queryset):
+        """
+        The cursor of the request with its values converted to those of the
+        ordering fields, or NotFound for anything but a cursor this class
+        encoded for the same ordering.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            payload = urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4))
+            cursor = json.loads(payload)
+            valid = (
+                isinstance(cursor, dict) and cursor.keys() == {'o', 'v', 'r'}
+                and cursor['o'] == self.ordering and isinstance(cursor['r'], bool)
+                and isinstance(cursor['v'], list) and len(cursor['v']) == len(self.ordering)
+                and all(isinstance(value, (str, int, float)) for value in cursor['v'])
+            )
+            if valid:
+                cursor['v'] = [
+                    self.get_field(queryset, field).to_python(value)
+                    for field, value in zip(self.ordering, cursor['v'])
+                ]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        if not valid:
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+    @staticmethod
+    def get_field(queryset, field):
+        name = field.lstrip('-')
+        if name in queryset.query.annotations:
+            return queryset.query.annotations[name].output_field
+        if name == 'pk':
+            return queryset.model._meta.pk
+        return queryset.model._meta.get_field(name)
+
+    @staticmethod
+    def _flip(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    @staticmethod
+    def _to_json(value):
+        if isinstance(value, Decimal):
+            return str(value)
+        if hasattr(value, 'isoformat'):
+            return value.isoformat()
+        return value
+
+
+class ProductPagination(DefaultPagination):
+    """
+    Page numbers by default, keyset pages when the client asks for them with
+    `?pagination=cursor` or already holds a cursor.
+    """
+    pagination_query_param = 'pagination'
+    keyset_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if params.get(self.pagination_query_param) == 'cursor' or self.keyset_class.cursor_query_param in params:
+            self.keyset = self.keyset_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        self.keyset = None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_next_link(self):
+        if getattr(self, 'keyset', None) is not None:
+            return self.keyset.get_next_link()
+        return super().get_next_link()
+
+    def get_previous_link(self):
+        if getattr(self, 'keyset', None) is not None:
+            return self.keyset.get_previous_link()
+        return super().get_previous_link()
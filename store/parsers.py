@@ -0,0 +1,15 @@
+from rest_framework.parsers import BaseParser
+
+from .imports import iter_ndjson
+
+
+class NDJSONParser(BaseParser):
+    """
+    Parses one JSON value per line, lazily: `request.data` is an iterator
+    that reads the body as it is consumed, so large uploads are never held
+    in memory at once.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return iter_ndjson(stream if stream is not None else [])
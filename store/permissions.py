@@ -1,6 +1,96 @@
+import threading
+
+from django.conf import settings
+from django.contrib.auth.models import Permission
+from django.core.signals import setting_changed
+from django.db.models import Q
+from django.dispatch import receiver
 from rest_framework import permissions
 import copy
 
+from .caching import LocMemLRUBackend, get_response_cache
+
+
+class PermissionCache:
+    """
+    The `app_label.codename` permissions of every user, kept across
+    requests. Entries are keyed by the permission versions of the user,
+    one for all users, bumped when a group's permissions change, and one
+    of the user, bumped when its groups or own permissions change. The
+    versions live in the response cache, so with a shared backend every
+    worker sees the bumps.
+    """
+
+    def __init__(self, timeout=300, max_entries=10000):
+        self.backend = LocMemLRUBackend(max_entries)
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def versions(self, user_id):
+        cache = get_response_cache()
+        return cache.versions([Permission])[0], cache.scoped_version(Permission, user_id)
+
+    def get_permissions(self, user_id):
+        key = ('perms', user_id, *self.versions(user_id))
+        perms = self.backend.get(key)
+        with self._lock:
+            if perms is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if perms is None:
+            # The user's and its groups' permissions in one query, where
+            # ModelBackend runs two.
+            perms = frozenset(
+                f'{app_label}.{codename}' for app_label, codename in
+                Permission.objects.filter(Q(user=user_id) | Q(group__user=user_id))
+                .values_list('content_type__app_label', 'codename').distinct()
+            )
+            self.backend.set(key, perms, self.timeout)
+        return perms
+
+    def has_perms(self, user, perm_list):
+        if not user or not user.is_authenticated or not user.is_active:
+            return False
+        if user.is_superuser:
+            return True
+        perms = self.get_permissions(user.pk)
+        return all(perm in perms for perm in perm_list)
+
+    def stats(self):
+        return {
+            'lookups_avoided': self.hits,
+            'lookups': self.misses,
+            'entries': len(self.backend),
+        }
+
+
+_permission_cache = None
+
+
+def get_permission_cache():
+    global _permission_cache
+    if _permission_cache is None:
+        config = getattr(settings, 'STORE_AUTH', {})
+        _permission_cache = PermissionCache(
+            timeout=config.get('PERMISSION_CACHE_TIMEOUT', 300),
+            max_entries=config.get('CACHE_MAX_ENTRIES', 10000),
+        )
+    return _permission_cache
+
+
+@receiver(setting_changed)
+def reset_permission_cache(setting, **kwargs):
+    global _permission_cache
+    if setting == 'STORE_AUTH':
+        _permission_cache = None
+
+
+def has_perms(user, perm_list):
+    return get_permission_cache().has_perms(user, perm_list)
+
 
 class IsStaffOrReadOnly(permissions.BasePermission):
     def has_permission(self, request, view):
@@ -11,10 +101,18 @@ class IsStaffOrReadOnly(permissions.BasePermission):
 
 class SendPrivetEmail(permissions.BasePermission):
     def has_permission(self, request, view):
-        return bool(request.user and request.user.has_perm('store.send_privet_email'))
+        return has_perms(request.user, ['store.send_privet_email'])
 
 
 class CustomDjangoPermission(permissions.DjangoModelPermissions):
-    def __int__(self):
+    def __init__(self):
         self.perms_map = copy.deepcopy(self.perms_map)
         self.perms_map['GET'] = ['%(app_label)s.view_%(model_name)s']
+
+    def has_permission(self, request, view):
+        if not request.user or (not request.user.is_authenticated and self.authenticated_users_only):
+            return False
+        if getattr(view, '_ignore_model_permissions', False):
+            return True
+        queryset = self._queryset(view)
+        return has_perms(request.user, self.get_required_permissions(request.method, queryset.model))
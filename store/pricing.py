@@ -0,0 +1,35 @@
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum, Value
+from django.db.models.functions import Round
+
+# Parsed once at import time instead of building Decimal(1.09) from a float per row.
+TAX_RATE = Decimal(str(getattr(settings, 'STORE_TAX_RATE', '0.09')))
+TAX_MULTIPLIER = 1 + TAX_RATE
+
+CENTS = Decimal('0.01')
+
+
+def price_after_tax(unit_price):
+    # ROUND_HALF_UP matches ROUND() on MySQL DECIMAL columns.
+    return (unit_price * TAX_MULTIPLIER).quantize(CENTS, rounding=ROUND_HALF_UP)
+
+
+def price_after_tax_expression(unit_price='unit_price'):
+    return Round(
+        F(unit_price) * Value(TAX_MULTIPLIER),
+        2,
+        output_field=DecimalField(max_digits=9, decimal_places=2),
+    )
+
+
+def line_total_expression(quantity='quantity', unit_price='product__unit_price'):
+    return ExpressionWrapper(
+        F(quantity) * F(unit_price),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+
+
+def total_expression(quantity, unit_price):
+    return Sum(line_total_expression(quantity, unit_price))
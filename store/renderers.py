@@ -0,0 +1,52 @@
+import csv
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.settings import api_settings
+
+
+def get_json_renderer():
+    """
+    The first JSON renderer of DEFAULT_RENDERER_CLASSES, so code that renders
+    outside of a DRF response produces the same bytes as the API.
+    """
+    for renderer_class in api_settings.DEFAULT_RENDERER_CLASSES:
+        if issubclass(renderer_class, JSONRenderer):
+            return renderer_class()
+    return JSONRenderer()
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+class NDJSONRenderer(BaseRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return get_json_renderer().render(data) + b'\n'
+
+
+class CSVRenderer(BaseRenderer):
+    """
+    Only renders the error bodies of the export endpoints, the rows
+    themselves are streamed by `store.exports`.
+    """
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if not isinstance(data, dict):
+            data = {'detail': data}
+        writer = csv.writer(Echo())
+        return ''.join(
+            writer.writerow([key, '; '.join(map(str, value)) if isinstance(value, list) else value])
+            for key, value in data.items()
+        ).encode()
@@ -0,0 +1,407 @@
+"""
+Product search behind the regular `?search=` parameter.
+
+Every backend returns the queryset filtered to matching products and
+annotated with `search_rank` (higher is better). Like `SearchFilter`, all
+terms of the query have to match; each term matches as a prefix.
+"""
+import bisect
+import json
+import math
+import re
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import connection
+from django.db.models import Case, FloatField, Value, When
+from django.db.models.expressions import RawSQL
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from rest_framework.filters import SearchFilter
+
+from .models import Category, Product
+
+TOKEN_RE = re.compile(r'\w+')
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+class BaseSearchBackend:
+    def search(self, queryset, terms):
+        raise NotImplementedError
+
+    def no_results(self, queryset):
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField())).none()
+
+    def ranked(self, queryset, scores):
+        """
+        Annotates `search_rank` from a `{product_id: score}` mapping of the
+        best matches; any other row of the queryset ranks 0. The mapping is
+        sent as a single JSON parameter, which the database looks up far
+        faster than a CASE with one WHEN per product.
+        """
+        column = f'{connection.ops.quote_name(queryset.model._meta.db_table)}.{connection.ops.quote_name("id")}'
+        if connection.vendor == 'sqlite':
+            sql = f"""COALESCE(JSON_EXTRACT(%s, '$."' || {column} || '"'), 0)"""
+        elif connection.vendor == 'mysql':
+            sql = f"""COALESCE(JSON_EXTRACT(%s, CONCAT('$."', {column}, '"')), 0)"""
+        elif connection.vendor == 'postgresql':
+            sql = f"COALESCE((%s::jsonb ->> {column}::text)::float, 0)"
+        else:
+            rank = Case(
+                *[When(id=product_id, then=Value(score)) for product_id, score in scores.items()],
+                default=Value(0.0),
+                output_field=FloatField(),
+            )
+            return queryset.annotate(search_rank=rank)
+        payload = json.dumps({str(product_id): score for product_id, score in scores.items()})
+        return queryset.annotate(search_rank=RawSQL(sql, [payload], output_field=FloatField()))
+
+    def product_saved(self, product):
+        pass
+
+    def products_saved(self, products):
+        """
+        Called after bulk writes, which send no post_save.
+        """
+        for product in products:
+            self.product_saved(product)
+
+    def product_deleted(self, product):
+        pass
+
+    def category_saved(self, category):
+        pass
+
+
+class MySQLFullTextBackend(BaseSearchBackend):
+    """
+    A FULLTEXT index over the name and category title of every product, kept
+    in `store_product_ft` by triggers like the FTS5 table, and queried in
+    boolean mode so every term is required and prefix matched. Terms may
+    match in either column, as with the other backends; a FULLTEXT index
+    can't span the product and category tables themselves.
+    """
+    table = 'store_product_ft'
+
+    def search(self, queryset, terms):
+        tokens = tokenize(terms)
+        if not tokens:
+            return self.no_results(queryset)
+        query = ' '.join(f'+{token}*' for token in tokens)
+        product_table = Product._meta.db_table
+
+        matching_ids = RawSQL(
+            f'SELECT product_id FROM {self.table} WHERE MATCH (name, category_title) AGAINST (%s IN BOOLEAN MODE)',
+            [query],
+        )
+        rank = RawSQL(
+            f'COALESCE((SELECT MATCH (f.name, f.category_title) AGAINST (%s IN BOOLEAN MODE) FROM {self.table} f '
+            f'WHERE f.product_id = {product_table}.id), 0)',
+            [query],
+            output_field=FloatField(),
+        )
+        return queryset.filter(id__in=matching_ids).annotate(search_rank=rank)
+
+
+class SQLiteFTS5Backend(BaseSearchBackend):
+    """
+    An FTS5 table keyed by product id and kept in sync by triggers, so bulk
+    inserts and raw updates are indexed too. All matches are returned and the
+    `max_ranked` best of them get their bm25 score from a single FTS query;
+    a correlated bm25() per row would re-run the match for every product.
+    """
+    table = 'store_product_fts'
+
+    def __init__(self, max_ranked=200):
+        self.max_ranked = max_ranked
+
+    def search(self, queryset, terms):
+        tokens = tokenize(terms)
+        if not tokens:
+            return self.no_results(queryset)
+        query = ' '.join(f'"{token}"*' for token in tokens)
+
+        with connection.cursor() as cursor:
+            # bm25() is negative, more negative meaning more relevant.
+            cursor.execute(
+                f'SELECT rowid, -bm25({self.table}) FROM {self.table} '
+                f'WHERE {self.table} MATCH %s ORDER BY bm25({self.table}) LIMIT %s',
+                [query, self.max_ranked],
+            )
+            scores = dict(cursor.fetchall())
+        if not scores:
+            return self.no_results(queryset)
+
+        matching_ids = RawSQL(f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s', [query])
+        return self.ranked(queryset.filter(id__in=matching_ids), scores)
+
+
+class InvertedIndexBackend(BaseSearchBackend):
+    """
+    Pure Python fallback. The index is built lazily from the database on the
+    first search and kept up to date from the product and category signals.
+    Every match is returned with its score, like the rows `SearchFilter`
+    would return, and the paginator slices them.
+    """
+
+    def __init__(self, chunk_size=5000):
+        self.chunk_size = chunk_size
+        self._lock = threading.RLock()
+        self._built = False
+        self._postings = defaultdict(dict)
+        self._documents = {}
+        self._vocabulary = []
+
+    def build(self):
+        with self._lock:
+            self._postings.clear()
+            self._documents.clear()
+            rows = Product.objects.values_list('id', 'name', 'category__title').order_by()
+            for product_id, name, category_title in rows.iterator(chunk_size=self.chunk_size):
+                self._add(product_id, name, category_title)
+            self._vocabulary = sorted(self._postings)
+            self._built = True
+
+    def index(self, product_id, name, category_title):
+        with self._lock:
+            if not self._built:
+                return
+            self._remove(product_id)
+            for term in self._add(product_id, name, category_title):
+                index = bisect.bisect_left(self._vocabulary, term)
+                if index == len(self._vocabulary) or self._vocabulary[index] != term:
+                    self._vocabulary.insert(index, term)
+
+    def remove(self, product_id):
+        with self._lock:
+            if self._built:
+                self._remove(product_id)
+
+    def _add(self, product_id, name, category_title):
+        terms = tokenize(name) + tokenize(category_title or '')
+        counts = defaultdict(int)
+        for term in terms:
+            counts[term] += 1
+        for term, count in counts.items():
+            self._postings[term][product_id] = count
+        self._documents[product_id] = tuple(counts)
+        return counts
+
+    def _remove(self, product_id):
+        for term in self._documents.pop(product_id, ()):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(product_id, None)
+
+    def _expand(self, prefix):
+        start = bisect.bisect_left(self._vocabulary, prefix)
+        for term in self._vocabulary[start:]:
+            if not term.startswith(prefix):
+                break
+            yield term
+
+    def scores(self, terms):
+        with self._lock:
+            if not self._built:
+                self.build()
+            total = len(self._documents) or 1
+            scores = None
+            for token in tokenize(terms):
+                token_scores = defaultdict(float)
+                for term in self._expand(token):
+                    postings = self._postings[term]
+                    if not postings:
+                        continue
+                    idf = math.log(1 + total / len(postings))
+                    for product_id, count in postings.items():
+                        token_scores[product_id] += count * idf
+                if scores is None:
+                    scores = token_scores
+                else:
+                    scores = {pid: score + token_scores[pid] for pid, score in scores.items() if pid in token_scores}
+                if not scores:
+                    return {}
+            return dict(scores or {})
+
+    def search(self, queryset, terms):
+        scores = self.scores(terms)
+        if not scores:
+            return self.no_results(queryset)
+        # Every match scores above 0; filtering on the rank rather than an
+        # IN list keeps the query to one parameter however many match.
+        return self.ranked(queryset, scores).filter(search_rank__gt=0)
+
+    def product_saved(self, product):
+        if not self._built:
+            return
+        category_title = Category.objects.filter(pk=product.category_id).values_list('title', flat=True).first()
+        self.index(product.pk, product.name, category_title)
+
+    def products_saved(self, products):
+        if not self._built:
+            return
+        titles = dict(Category.objects.filter(pk__in={product.category_id for product in products})
+                      .values_list('id', 'title'))
+        for product in products:
+            self.index(product.pk, product.name, titles.get(product.category_id))
+
+    def product_deleted(self, product):
+        self.remove(product.pk)
+
+    def category_saved(self, category):
+        if not self._built:
+            return
+        for product_id, name in category.products.values_list('id', 'name').iterator(chunk_size=self.chunk_size):
+            self.index(product_id, name, category.title)
+
+
+VENDOR_BACKENDS = {
+    'mysql': MySQLFullTextBackend,
+    'sqlite': SQLiteFTS5Backend,
+}
+
+_search_backend = None
+
+
+def get_search_backend():
+    global _search_backend
+    if _search_backend is None:
+        config = getattr(settings, 'STORE_SEARCH', {})
+        backend = config.get('BACKEND', 'auto')
+        options = {key.lower(): value for key, value in config.get('OPTIONS', {}).items()}
+        if backend == 'auto':
+            backend_class = VENDOR_BACKENDS.get(connection.vendor, InvertedIndexBackend)
+        else:
+            backend_class = import_string(backend)
+        _search_backend = backend_class(**options)
+    return _search_backend
+
+
+@receiver(setting_changed)
+def reset_search_backend(setting, **kwargs):
+    global _search_backend
+    if setting == 'STORE_SEARCH':
+        _search_backend = None
+
+
+class ProductSearchFilter(SearchFilter):
+    """
+    `SearchFilter` replacement that hands `?search=` to the configured
+    backend. Results are ordered by relevance unless `?ordering=` is given.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = request.query_params.get(self.search_param, '').strip()
+        if not terms:
+            return queryset
+        queryset = get_search_backend().search(queryset, terms)
+        if not request.query_params.get('ordering'):
+            queryset = queryset.order_by('-search_rank', 'id')
+        return queryset
+
+
+SQLITE_FTS5_SQL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS store_product_fts USING fts5(name, category_title)",
+    """CREATE TRIGGER IF NOT EXISTS store_product_fts_insert AFTER INSERT ON store_product BEGIN
+        INSERT INTO store_product_fts (rowid, name, category_title)
+        VALUES (new.id, new.name, (SELECT title FROM store_category WHERE id = new.category_id));
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS store_product_fts_update AFTER UPDATE OF name, category_id ON store_product BEGIN
+        UPDATE store_product_fts
+        SET name = new.name, category_title = (SELECT title FROM store_category WHERE id = new.category_id)
+        WHERE rowid = new.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS store_product_fts_delete AFTER DELETE ON store_product BEGIN
+        DELETE FROM store_product_fts WHERE rowid = old.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS store_category_fts_update AFTER UPDATE OF title ON store_category BEGIN
+        UPDATE store_product_fts SET category_title = new.title
+        WHERE rowid IN (SELECT id FROM store_product WHERE category_id = new.id);
+    END""",
+]
+
+MYSQL_FULLTEXT_SQL = [
+    """CREATE TABLE IF NOT EXISTS store_product_ft (
+        product_id bigint NOT NULL PRIMARY KEY,
+        name varchar(255) NOT NULL,
+        category_title varchar(255) NULL,
+        FULLTEXT INDEX store_product_ft_idx (name, category_title)
+    ) ENGINE=InnoDB""",
+    "DROP TRIGGER IF EXISTS store_product_ft_insert",
+    """CREATE TRIGGER store_product_ft_insert AFTER INSERT ON store_product FOR EACH ROW
+        INSERT INTO store_product_ft (product_id, name, category_title)
+        VALUES (NEW.id, NEW.name, (SELECT title FROM store_category WHERE id = NEW.category_id))""",
+    "DROP TRIGGER IF EXISTS store_product_ft_update",
+    """CREATE TRIGGER store_product_ft_update AFTER UPDATE ON store_product FOR EACH ROW
+        UPDATE store_product_ft
+        SET name = NEW.name, category_title = (SELECT title FROM store_category WHERE id = NEW.category_id)
+        WHERE product_id = NEW.id AND NOT (OLD.name <=> NEW.name AND OLD.category_id <=> NEW.category_id)""",
+    "DROP TRIGGER IF EXISTS store_product_ft_delete",
+    """CREATE TRIGGER store_product_ft_delete AFTER DELETE ON store_product FOR EACH ROW
+        DELETE FROM store_product_ft WHERE product_id = OLD.id""",
+    "DROP TRIGGER IF EXISTS store_category_ft_update",
+    """CREATE TRIGGER store_category_ft_update AFTER UPDATE ON store_category FOR EACH ROW
+        UPDATE store_product_ft f INNER JOIN store_product p ON p.id = f.product_id
+        SET f.category_title = NEW.title
+        WHERE p.category_id = NEW.id AND NOT (OLD.title <=> NEW.title)""",
+]
+
+# The separate name and title indexes of the first MySQL layout, which made
+# every term match within one of the two columns.
+MYSQL_LEGACY_INDEXES = [
+    ('store_product', 'store_product_name_ft'),
+    ('store_category', 'store_category_title_ft'),
+]
+
+
+def install_fulltext(schema_editor):
+    """
+    Creates the vendor specific full-text structures and indexes the
+    existing rows. Used by the migrations, safe to run again, e.g. after a
+    table rebuild dropped the SQLite triggers.
+    """
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for statement in SQLITE_FTS5_SQL:
+            schema_editor.execute(statement)
+        schema_editor.execute("DELETE FROM store_product_fts")
+        schema_editor.execute(
+            "INSERT INTO store_product_fts (rowid, name, category_title) "
+            "SELECT p.id, p.name, c.title FROM store_product p INNER JOIN store_category c ON p.category_id = c.id"
+        )
+    elif vendor == 'mysql':
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT DISTINCT table_name, index_name FROM information_schema.statistics "
+                "WHERE table_schema = DATABASE()"
+            )
+            existing = {tuple(row) for row in cursor.fetchall()}
+        for table, index in MYSQL_LEGACY_INDEXES:
+            if (table, index) in existing:
+                schema_editor.execute(f"DROP INDEX {index} ON {table}")
+        for statement in MYSQL_FULLTEXT_SQL:
+            schema_editor.execute(statement)
+        schema_editor.execute("DELETE FROM store_product_ft")
+        schema_editor.execute(
+            "INSERT INTO store_product_ft (product_id, name, category_title) "
+            "SELECT p.id, p.name, c.title FROM store_product p INNER JOIN store_category c ON p.category_id = c.id"
+        )
+
+
+def uninstall_fulltext(schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for name in ['store_product_fts_insert', 'store_product_fts_update',
+                     'store_product_fts_delete', 'store_category_fts_update']:
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {name}")
+        schema_editor.execute("DROP TABLE IF EXISTS store_product_fts")
+    elif vendor == 'mysql':
+        for name in ['store_product_ft_insert', 'store_product_ft_update',
+                     'store_product_ft_delete', 'store_category_ft_update']:
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {name}")
+        schema_editor.execute("DROP TABLE IF EXISTS store_product_ft")
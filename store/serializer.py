@@ -1,8 +1,13 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import identify_hasher
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.http import Http404
 from rest_framework import serializers
-from decimal import Decimal
+from . import pricing
+from .carts import get_cart_store
+from .checkout import place_order
 from .models import Product, Category, Comment, Cart, CartItem, Customer, Order, OrderItem, Discount
 from django.utils.text import slugify
-from django.db import transaction
 
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -31,7 +36,9 @@ class ProductSerializer(serializers.ModelSerializer):
     category = serializers.SerializerMethodField()
 
     def get_price_after_tax(self, product):
-        return round(product.unit_price * Decimal(1.09), 2)
+        if hasattr(product, 'price_after_tax'):
+            return product.price_after_tax
+        return pricing.price_after_tax(product.unit_price)
 
     def create(self, validated_data):
         product = Product(**validated_data)
@@ -54,6 +61,40 @@ class ProductSerializer(serializers.ModelSerializer):
     #     return data
 
 
+class ProductImportSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(required=False, help_text='updates this product instead of creating one')
+    category = serializers.CharField(max_length=255, help_text='category title')
+
+    class Meta:
+        model = Product
+        fields = ['id', 'name', 'category', 'description', 'unit_price', 'inventory']
+
+
+class UserImportSerializer(serializers.ModelSerializer):
+    password = serializers.CharField(required=False, write_only=True, help_text='hashed during the import')
+    password_hash = serializers.CharField(required=False, write_only=True,
+                                          help_text='a hash of a configured hasher, stored as is')
+    phone_number = serializers.CharField(max_length=255, required=False, allow_null=True, allow_blank=True)
+    birth_date = serializers.DateField(required=False, allow_null=True)
+
+    class Meta:
+        model = get_user_model()
+        fields = ['username', 'email', 'password', 'password_hash', 'first_name', 'last_name',
+                  'phone_number', 'birth_date']
+        # Uniqueness is checked by the importer for a whole batch at once.
+        extra_kwargs = {
+            'username': {'validators': [UnicodeUsernameValidator()]},
+            'email': {'validators': []},
+        }
+
+    def validate_password_hash(self, value):
+        try:
+            identify_hasher(value)
+        except ValueError:
+            raise serializers.ValidationError('Not a hash of any of the configured hashers.')
+        return value
+
+
 class CommentSerializer(serializers.ModelSerializer):
     product_name = serializers.SerializerMethodField()
 
@@ -62,6 +103,9 @@ class CommentSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'product_name', 'body']
 
     def get_product_name(self, comment):
+        # Lists of one product's comments pass its name in once.
+        if 'product_name' in self.context:
+            return self.context['product_name']
         return comment.product.name
 
     def create(self, validated_data):
@@ -69,6 +113,18 @@ class CommentSerializer(serializers.ModelSerializer):
         return Comment.objects.create(product_id=product_id, **validated_data)
 
 
+class CommentModerationSerializer(serializers.ModelSerializer):
+    product_name = serializers.CharField(read_only=True)
+
+    class Meta:
+        model = Comment
+        fields = ['id', 'product', 'product_name', 'name', 'body', 'status', 'datetime_created']
+
+
+class CommentModerationActionSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(), min_length=1, max_length=1000)
+
+
 class CaretProductSerializer(serializers.ModelSerializer):
 
     class Meta:
@@ -81,24 +137,62 @@ class UpdateCartItemSerializer(serializers.ModelSerializer):
         model = CartItem
         fields = ['quantity']
 
+    def update(self, instance, validated_data):
+        instance.quantity = validated_data.get('quantity', instance.quantity)
+        get_cart_store().set_quantity(self.context['cart_pk'], instance.id, instance.quantity)
+        return instance
+
+
+class CartProductField(serializers.PrimaryKeyRelatedField):
+    def to_internal_value(self, data):
+        # Looked up in bulk by AddCartItemListSerializer instead of one query per item.
+        products = self.context.get('products')
+        if products is None or isinstance(data, bool):
+            return super().to_internal_value(data)
+        product = products.get(str(data))
+        if product is None:
+            self.fail('does_not_exist', pk_value=data)
+        return product
+
+
+class AddCartItemListSerializer(serializers.ListSerializer):
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            product_ids = {
+                str(item['product']) for item in data
+                if isinstance(item, dict) and str(item.get('product')).isdigit()
+            }
+            self.context['products'] = {
+                str(product.pk): product for product in Product.objects.filter(pk__in=product_ids)
+            }
+        return super().to_internal_value(data)
+
+    def create(self, validated_data):
+        quantities = {}
+        for item in validated_data:
+            product_id = item['product'].id
+            quantities[product_id] = quantities.get(product_id, 0) + item.get('quantity', 1)
+        items = get_cart_store().add_items(self.context['cart_pk'], quantities)
+        if items is None:
+            raise Http404('No Cart matches the given query.')
+        return items
+
 
 class AddCartItemSerializer(serializers.ModelSerializer):
+    product = CartProductField(queryset=Product.objects.all())
+
     class Meta:
         model = CartItem
         fields = ['id', 'product', 'quantity']
+        list_serializer_class = AddCartItemListSerializer
 
     def create(self, validated_data):
         product = validated_data.get('product')
-        quantity = validated_data.get('quantity')
-        cart_pk = self.context['cart_pk']
-        try:
-            cart_item = CartItem.objects.get(cart_id=cart_pk, product_id=product.id)
-            cart_item.quantity += quantity
-            cart_item.save()
-        except CartItem.DoesNotExist:
-            cart_item = CartItem.objects.create(cart_id=cart_pk, **validated_data)
-        self.instance = cart_item
-        return cart_item
+        items = get_cart_store().add_items(self.context['cart_pk'], {product.id: validated_data.get('quantity', 1)})
+        if items is None:
+            raise Http404('No Cart matches the given query.')
+        self.instance = items[0]
+        return self.instance
 
 
 class CartItemSerializer(serializers.ModelSerializer):
@@ -110,6 +204,8 @@ class CartItemSerializer(serializers.ModelSerializer):
         fields = ['id', 'product', 'quantity', 'item_total']
 
     def get_item_total(self, cart_item):
+        if hasattr(cart_item, 'item_total'):
+            return cart_item.item_total
         return cart_item.quantity * cart_item.product.unit_price
 
 
@@ -124,6 +220,8 @@ class CartSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
     def get_total_price(self, cart):
+        if hasattr(cart, 'total_price'):
+            return cart.total_price or 0
         return sum([item.quantity * item.product.unit_price for item in cart.items.all()])
 
 
@@ -160,19 +258,24 @@ class OrderCustomerSerializer(serializers.ModelSerializer):
 
 class OrderSerializer(serializers.ModelSerializer):
     items = OrderItemsSerializer(many=True)
+    total_price = serializers.SerializerMethodField()
 
     class Meta:
         model = Order
-        fields = ['id', 'status', 'datetime_created', 'items']
+        fields = ['id', 'status', 'datetime_created', 'items', 'total_price']
 
+    def get_total_price(self, order):
+        if hasattr(order, 'total_price'):
+            return order.total_price or 0
+        return sum([item.quantity * item.unit_price for item in order.items.all()])
 
-class OrderAdminSerializer(serializers.ModelSerializer):
-    items = OrderItemsSerializer(many=True)
+
+class OrderAdminSerializer(OrderSerializer):
     customer = OrderCustomerSerializer()
 
     class Meta:
         model = Order
-        fields = ['id', 'customer', 'status', 'datetime_created', 'items']
+        fields = ['id', 'customer', 'status', 'datetime_created', 'items', 'total_price']
 
 
 class OrderUpdateSerializer(serializers.ModelSerializer):
@@ -184,47 +287,10 @@ class OrderUpdateSerializer(serializers.ModelSerializer):
 class OrderCreateSerializer(serializers.Serializer):
     cart_id = serializers.UUIDField()
 
-    def validated_cart_data(self, cart_id):
-        try:
-            if Cart.objects.prefetch_related('items').get(id=cart_id).items.count() == 0:
-                raise serializers.ValidationError('Your cart is empty. please add at least one item yo your cart')
-        except Cart.DoesNotExist:
-            raise serializers.ValidationError('There is no such a cart')
-
     def save(self, **kwargs):
-        with transaction.atomic():
-            cart_id = self.validated_data['cart_id']
-            user_id = self.context['user_id']
-            customer = Customer.objects.get(user_id=user_id)
-
-            order = Order()
-            order.customer = customer
-            order.save()
-
-            cart_items = CartItem.objects.select_related('product').filter(cart_id=cart_id)
-
-            order_items = [
-                OrderItem(
-                    order=order,
-                    product=cart_item.product,
-                    unit_price=cart_item.product.unit_price,
-                    quantity=cart_item.quantity,
-                ) for cart_item in cart_items
-            ]
-
-            OrderItem.objects.bulk_create(order_items)
-            Cart.objects.get(id=cart_id).delete()
-            return order
-
-            # order_items = list()
-            # for cart_item in cart_items:
-            #     order_item = OrderItem()
-            #     order_item.order = order
-            #     order_item.product_id = cart_item.product_id
-            #     order_item.unit_price = cart_item.product.unit_price
-            #     order_item.quantity = cart_item.quantity
-            #
-            #     order_items.append(order_item)
+        self.instance = place_order(self.validated_data['cart_id'], self.context['user_id'],
+                                    customer_id=self.context.get('customer_id'))
+        return self.instance
 
 
 
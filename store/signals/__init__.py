@@ -1,3 +1,4 @@
 from django.dispatch import Signal
 
 order_created = Signal()
+order_status_changed = Signal()
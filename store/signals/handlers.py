@@ -1,10 +1,131 @@
-from django.db.models.signals import post_save
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group, Permission
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
 from django.dispatch import receiver
-from ..models import Customer
-from config import settings
+from ..authentication import get_identity_cache
+from ..caching import bump_scoped_versions, bump_versions
+from ..models import Category, Comment, Customer, Product
+from ..search import get_search_backend
+from django.conf import settings
 
 
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
 def create_customer_profile_for_newly_created_user(sender , instance, created, **kwargs):
-    if created:
+    # store.accounts.register_user creates the customer in the same transaction.
+    if created and not getattr(instance, '_creating_customer', False):
         Customer.objects.create(user=instance)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def invalidate_cached_user(sender, instance, **kwargs):
+    get_identity_cache().invalidate(instance.pk)
+
+
+@receiver(post_save, sender=Customer)
+@receiver(post_delete, sender=Customer)
+def invalidate_cached_customer(sender, instance, **kwargs):
+    get_identity_cache().invalidate(instance.user_id)
+
+
+@receiver(m2m_changed, sender=get_user_model().groups.through)
+@receiver(m2m_changed, sender=get_user_model().user_permissions.through)
+def bump_user_permissions(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        bump_scoped_versions(Permission, [instance.pk])
+    elif pk_set:
+        # Changed from the group or permission side, pk_set holds the users.
+        bump_scoped_versions(Permission, pk_set)
+    else:
+        bump_versions(Permission)
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def bump_group_permissions(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_versions(Permission)
+
+
+@receiver(post_delete, sender=Group)
+@receiver(post_delete, sender=Permission)
+def bump_permissions_on_delete(sender, **kwargs):
+    bump_versions(Permission)
+
+
+def _is_approved(status):
+    return int(status == Comment.COMMENT_STATUS_APPROVED)
+
+
+@receiver(pre_save, sender=Comment)
+@receiver(pre_delete, sender=Comment)
+def load_comment_state(sender, instance, raw=False, **kwargs):
+    # Instances loaded with only() or defer() don't know their stored status.
+    if not raw:
+        instance.load_stored_state()
+
+
+@receiver(post_save, sender=Comment)
+def bump_comment_pages_on_save(sender, instance, raw=False, **kwargs):
+    # Connected before the counter handler, which resets `_loaded_status`.
+    # Only approved comments are listed, so waiting ones don't invalidate.
+    if raw or not (_is_approved(instance.status) or _is_approved(instance._loaded_status)):
+        return
+    bump_scoped_versions(Comment, {instance.product_id, instance._loaded_product_id} - {None})
+
+
+@receiver(post_delete, sender=Comment)
+def bump_comment_pages_on_delete(sender, instance, **kwargs):
+    if _is_approved(instance._loaded_status):
+        bump_scoped_versions(Comment, [instance._loaded_product_id])
+
+
+@receiver(post_save, sender=Comment)
+def update_product_comment_counts_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        Product.objects.filter(pk=instance.product_id).add_comment_counts(1, _is_approved(instance.status))
+    elif instance._loaded_product_id != instance.product_id:
+        Product.objects.filter(pk=instance._loaded_product_id) \
+            .add_comment_counts(-1, -_is_approved(instance._loaded_status))
+        Product.objects.filter(pk=instance.product_id).add_comment_counts(1, _is_approved(instance.status))
+    elif instance._loaded_status != instance.status:
+        delta = _is_approved(instance.status) - _is_approved(instance._loaded_status)
+        Product.objects.filter(pk=instance.product_id).add_comment_counts(0, delta)
+    instance._loaded_status = instance.status
+    instance._loaded_product_id = instance.product_id
+
+
+@receiver(post_delete, sender=Comment)
+def update_product_comment_counts_on_delete(sender, instance, **kwargs):
+    Product.objects.filter(pk=instance._loaded_product_id) \
+        .add_comment_counts(-1, -_is_approved(instance._loaded_status))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def bump_response_cache_version(sender, **kwargs):
+    bump_versions(sender)
+
+
+@receiver(post_save, sender=Product)
+def index_saved_product(sender, instance, raw=False, **kwargs):
+    if not raw:
+        get_search_backend().product_saved(instance)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_deleted_product(sender, instance, **kwargs):
+    get_search_backend().product_deleted(instance)
+
+
+@receiver(post_save, sender=Category)
+def reindex_category_products(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        get_search_backend().category_saved(instance)
@@ -0,0 +1,94 @@
+"""
+Deletion of abandoned carts.
+
+Carts idle for longer than the TTL are deleted a batch at a time, each batch
+in its own short transaction: the expired ids are read through the
+`last_activity` index and locked (skipping carts a request holds), then
+their items and the carts are removed with plain DELETE statements, without
+loading the rows for the delete collector.
+
+The sweeper throttles itself so it never holds the tables for long: a
+batch slower than `max_batch_seconds` halves the next batch, a fast one
+grows it back, and after every batch it sleeps long enough to use at most
+`duty_cycle` of the wall time.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Cart, CartItem
+
+logger = logging.getLogger(__name__)
+
+
+class CartSweeper:
+    def __init__(self, ttl_days=30, batch_size=500, min_batch_size=50, max_batch_size=5000,
+                 max_batch_seconds=0.1, duty_cycle=0.25):
+        if not 0 < duty_cycle <= 1:
+            raise ValueError(f'duty_cycle must be greater than 0 and at most 1, not {duty_cycle!r}')
+        self.ttl = timedelta(days=ttl_days)
+        self.batch_size = batch_size
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.max_batch_seconds = max_batch_seconds
+        self.duty_cycle = duty_cycle
+
+    def delete_batch(self, cutoff, limit):
+        with transaction.atomic():
+            cart_ids = list(
+                Cart.objects.select_for_update(skip_locked=True)
+                .filter(last_activity__lt=cutoff)
+                .order_by('last_activity')
+                .values_list('id', flat=True)[:limit]
+            )
+            if not cart_ids:
+                return 0, 0
+            items = CartItem.objects.filter(cart_id__in=cart_ids)._raw_delete(CartItem.objects.db)
+            carts = Cart.objects.filter(id__in=cart_ids)._raw_delete(Cart.objects.db)
+        return carts, items
+
+    def sweep(self, max_batches=None):
+        """
+        Deletes every cart that expired before the sweep started and returns
+        the counts and timings of the run.
+        """
+        cutoff = timezone.now() - self.ttl
+        stats = {'carts': 0, 'items': 0, 'batches': 0, 'seconds': 0.0, 'db_seconds': 0.0, 'slowest_batch_ms': 0.0}
+        started = time.perf_counter()
+        while max_batches is None or stats['batches'] < max_batches:
+            batch_started = time.perf_counter()
+            carts, items = self.delete_batch(cutoff, self.batch_size)
+            elapsed = time.perf_counter() - batch_started
+            if not carts:
+                break
+            stats['carts'] += carts
+            stats['items'] += items
+            stats['batches'] += 1
+            stats['db_seconds'] += elapsed
+            stats['slowest_batch_ms'] = max(stats['slowest_batch_ms'], elapsed * 1000)
+
+            if elapsed > self.max_batch_seconds:
+                self.batch_size = max(self.min_batch_size, self.batch_size // 2)
+            elif elapsed < self.max_batch_seconds / 2:
+                self.batch_size = min(self.max_batch_size, self.batch_size * 2)
+            time.sleep(elapsed * (1 - self.duty_cycle) / self.duty_cycle)
+
+        stats['seconds'] = time.perf_counter() - started
+        stats['batch_size'] = self.batch_size
+        logger.info('Swept %s carts and %s items in %.1fs', stats['carts'], stats['items'], stats['seconds'],
+                    extra=stats)
+        return stats
+
+
+def get_sweeper(**overrides):
+    config = getattr(settings, 'STORE_CARTS', {})
+    options = {
+        key.lower(): value for key, value in config.items()
+        if key in ('TTL_DAYS', 'BATCH_SIZE', 'MAX_BATCH_SECONDS', 'DUTY_CYCLE')
+    }
+    options.update({key: value for key, value in overrides.items() if value is not None})
+    return CartSweeper(**options)
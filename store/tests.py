@@ -1,3 +1,302 @@
-from django.test import TestCase
+import json
+import threading
+import time
+from base64 import urlsafe_b64encode
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import urls
+from .authentication import StatelessJWTAuthentication, get_identity_cache
+from .carts import KVCartStore, ORMCartStore
+from .middleware import get_query_budget
+from .models import Category, Comment, Customer, Product
+from .sweeper import CartSweeper
+from .views import OrderViewSet, ProductViewSet
+
+
+class ConcurrentAddItemsTests(TransactionTestCase):
+    """
+    Adds to one cart from many threads at once: every add must be counted,
+    none may fail on the (cart, product) unique constraint.
+    """
+    threads = 8
+    adds = 10
+
+    def setUp(self):
+        category = Category.objects.create(title='Books')
+        self.product_ids = [
+            Product.objects.create(name=f'Book {i}', slug=f'book-{i}', category=category, description='',
+                                   unit_price='10.00', inventory=100).id
+            for i in range(2)
+        ]
+
+    def add_concurrently(self, store, cart_id):
+        barrier = threading.Barrier(self.threads)
+        errors = []
+
+        def add():
+            try:
+                barrier.wait()
+                for i in range(self.adds):
+                    store.add_items(cart_id, {self.product_ids[i % 2]: 1})
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=add) for _ in range(self.threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def assert_quantities(self, store, cart_id):
+        expected = self.threads * self.adds // 2
+        self.assertEqual(
+            {item.product_id: item.quantity for item in store.items(cart_id)},
+            {product_id: expected for product_id in self.product_ids},
+        )
+
+    # SQLite's in-memory test database locks whole tables against a second writer.
+    @skipUnlessDBFeature('test_db_allows_multiple_connections')
+    def test_orm_cart_store(self):
+        store = ORMCartStore()
+        cart = store.create()
+        self.add_concurrently(store, cart.id)
+        self.assert_quantities(store, cart.id)
+
+    def test_kv_cart_store(self):
+        store = KVCartStore()
+        cart = store.create()
+        self.add_concurrently(store, cart.id)
+        self.assert_quantities(store, cart.id)
+
+
+class ExplainQuerysetsTests(TestCase):
+    """
+    `explain_querysets` goes through every registered viewset; those whose
+    rows don't come from the database are skipped.
+    """
+
+    def explain(self):
+        output = StringIO()
+        call_command('explain_querysets', stdout=output)
+        return output.getvalue()
+
+    def viewsets(self):
+        registry = urls.router.registry + urls.products_router.registry \
+            + urls.cart_router.registry + urls.order_router.registry
+        return {viewset.__name__ for _, viewset, _ in registry}
+
+    def test_orm_cart_store(self):
+        output = self.explain()
+        for name in self.viewsets():
+            self.assertIn(f'{name} (', output)
+
+    @override_settings(STORE_CARTS={'BACKEND': 'store.carts.KVCartStore'})
+    def test_kv_cart_store(self):
+        output = self.explain()
+        for name in self.viewsets() - {'CartViewSet', 'CartItemsViewSet'}:
+            self.assertIn(f'{name} (', output)
+        self.assertNotIn('CartViewSet (', output)
+        self.assertNotIn('CartItemsViewSet (', output)
+
+
+def encode_cursor(cursor):
+    return urlsafe_b64encode(json.dumps(cursor).encode()).decode().rstrip('=')
+
+
+class KeysetCursorTests(TestCase):
+    """
+    Any cursor but one the pagination encoded for the same ordering is a 404.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='Books')
+        cls.products = [
+            Product.objects.create(name=f'Book {i}', slug=f'book-{i}', category=category, description='',
+                                   unit_price=f'{i}.50', inventory=1)
+            for i in range(12)
+        ]
+        Comment.objects.bulk_create([
+            Comment(product=cls.products[0], name=f'reader {i}', body='body', status=Comment.COMMENT_STATUS_APPROVED)
+            for i in range(12)
+        ])
+
+    def comments(self, cursor):
+        return APIClient().get(f'/store/products/{self.products[0].pk}/comments/', {'cursor': cursor})
+
+    def products_page(self, cursor):
+        return APIClient().get('/store/products/', {'pagination': 'cursor', 'ordering': 'unit_price', 'cursor': cursor})
+
+    def test_next_pages(self):
+        response = APIClient().get(f'/store/products/{self.products[0].pk}/comments/')
+        self.assertEqual(len(response.data['results']), 10)
+        response = APIClient().get(response.data['next'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 2)
+
+        response = APIClient().get('/store/products/', {'pagination': 'cursor', 'ordering': 'unit_price'})
+        response = APIClient().get(response.data['next'])
+        self.assertEqual([product['id'] for product in response.data['results']],
+                         [product.pk for product in self.products[10:]])
+
+    def test_malformed_cursors(self):
+        ordering = ['-datetime_created', '-id']
+        valid = {'o': ordering, 'v': ['2026-01-01T00:00:00+00:00', 5], 'r': False}
+        cursors = {
+            'not base64': '%%%',
+            'not json': encode_cursor('x')[:-2] + '!!',
+            'not an object': encode_cursor([1, 2, 3]),
+            'missing r': encode_cursor({'o': ordering, 'v': valid['v']}),
+            'extra key': encode_cursor(dict(valid, x=1)),
+            'r not a bool': encode_cursor(dict(valid, r=1)),
+            'other ordering': encode_cursor(dict(valid, o=['id'])),
+            'v not a list': encode_cursor(dict(valid, v='x')),
+            'v too short': encode_cursor(dict(valid, v=[5])),
+            'dict value': encode_cursor(dict(valid, v=[{'a': 1}, 5])),
+            'list value': encode_cursor(dict(valid, v=['2026-01-01T00:00:00+00:00', [5]])),
+            'null value': encode_cursor(dict(valid, v=[None, 5])),
+            'not a datetime': encode_cursor(dict(valid, v=['yesterday', 5])),
+            'not an integer': encode_cursor(dict(valid, v=['2026-01-01T00:00:00+00:00', 'five'])),
+        }
+        for label, cursor in cursors.items():
+            with self.subTest(label):
+                self.assertEqual(self.comments(cursor).status_code, 404)
+        self.assertEqual(self.comments(encode_cursor(valid)).status_code, 200)
+
+    def test_malformed_decimal_cursor(self):
+        cursor = {'o': ['unit_price', 'id'], 'v': ['cheap', 5], 'r': False}
+        self.assertEqual(self.products_page(encode_cursor(cursor)).status_code, 404)
+        cursor['v'] = ['1.50', 5]
+        self.assertEqual(self.products_page(encode_cursor(cursor)).status_code, 200)
+
+
+class KVCartCheckoutTests(TestCase):
+    """
+    The checkout claim of a KVCartStore cart is released on every outcome
+    but a commit, and keeps the cart from changing meanwhile.
+    """
+
+    def setUp(self):
+        category = Category.objects.create(title='Books')
+        self.product = Product.objects.create(name='Book', slug='book', category=category, description='',
+                                              unit_price='10.00', inventory=10)
+        self.store = KVCartStore()
+        self.store.claim_seconds = 0.05
+        self.cart = self.store.create()
+        self.store.add_items(self.cart.id, {self.product.id: 2})
+
+    def test_commit_deletes_the_cart(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic(), self.store.checkout(self.cart.id) as quantities:
+                self.assertEqual(quantities, {self.product.id: 2})
+        self.assertIsNone(self.store.get(self.cart.id))
+        with transaction.atomic(), self.store.checkout(self.cart.id) as quantities:
+            self.assertIsNone(quantities)
+
+    def test_failed_block_releases_the_claim(self):
+        with self.assertRaises(ValueError):
+            with transaction.atomic(), self.store.checkout(self.cart.id):
+                raise ValueError
+        with transaction.atomic(), self.store.checkout(self.cart.id) as quantities:
+            self.assertEqual(quantities, {self.product.id: 2})
+
+    def test_rollback_after_the_block_expires_the_claim(self):
+        with self.assertRaises(ValueError):
+            with transaction.atomic():
+                with self.store.checkout(self.cart.id):
+                    pass
+                raise ValueError
+        with transaction.atomic(), self.store.checkout(self.cart.id) as quantities:
+            self.assertIsNone(quantities)
+        time.sleep(0.1)
+        with transaction.atomic(), self.store.checkout(self.cart.id) as quantities:
+            self.assertEqual(quantities, {self.product.id: 2})
+
+    def test_claimed_cart_takes_no_changes(self):
+        with transaction.atomic(), self.store.checkout(self.cart.id):
+            self.assertIsNone(self.store.add_items(self.cart.id, {self.product.id: 1}))
+            self.store.set_quantity(self.cart.id, self.product.id, 5)
+            self.store.remove_item(self.cart.id, self.product.id)
+            self.assertEqual([item.quantity for item in self.store.items(self.cart.id)], [2])
+
+
+class DeletedUserTokenTests(TestCase):
+    """
+    A still valid token of a deleted user fails authentication on the
+    stateless path as on the stateful one, instead of a 500 once something
+    reads the user.
+    """
+
+    def test_deleted_user(self):
+        user = get_user_model().objects.create(username='reader', email='reader@example.com')
+        token = AccessToken.for_user(user)
+        Customer.objects.filter(user=user).delete()
+        user.delete()
+        get_identity_cache().clear()
+        claims_user = StatelessJWTAuthentication().get_user(token)
+        self.assertTrue(claims_user.is_authenticated)
+        for attr in ('username', 'is_superuser', 'email'):
+            with self.subTest(attr), self.assertRaises(AuthenticationFailed):
+                getattr(claims_user, attr)
+
+
+class ProductSearchTests(TransactionTestCase):
+    """
+    Every search backend requires all terms, each matching the product name
+    or its category title. A TransactionTestCase, since InnoDB only indexes
+    committed rows.
+    """
+
+    def setUp(self):
+        fiction = Category.objects.create(title='Fiction')
+        poetry = Category.objects.create(title='Poetry')
+        self.novel = Product.objects.create(name='Dune', slug='dune', category=fiction, description='',
+                                            unit_price='10.00', inventory=1)
+        self.poems = Product.objects.create(name='Dune Songs', slug='dune-songs', category=poetry, description='',
+                                            unit_price='10.00', inventory=1)
+
+    def search(self, terms):
+        response = APIClient().get('/store/products/', {'search': terms})
+        return [product['id'] for product in response.data['results']]
+
+    def assert_matches(self):
+        self.assertEqual(self.search('dune fiction'), [self.novel.pk])
+        self.assertEqual(self.search('fict dun'), [self.novel.pk])
+        self.assertEqual(sorted(self.search('dune')), sorted([self.novel.pk, self.poems.pk]))
+        self.assertEqual(self.search('songs fiction'), [])
+
+    def test_vendor_backend(self):
+        self.assert_matches()
+
+    @override_settings(STORE_SEARCH={'BACKEND': 'store.search.InvertedIndexBackend'})
+    def test_inverted_index_backend(self):
+        self.assert_matches()
+
+
+class CartSweeperTests(TestCase):
+    def test_duty_cycle_bounds(self):
+        for duty_cycle in (0, -0.5, 1.5, float('nan')):
+            with self.subTest(duty_cycle), self.assertRaises(ValueError):
+                CartSweeper(duty_cycle=duty_cycle)
+            with self.subTest(duty_cycle), self.assertRaises(CommandError):
+                call_command('sweep_carts', '--once', f'--duty-cycle={duty_cycle}')
+        self.assertEqual(CartSweeper(duty_cycle=1).duty_cycle, 1)
+
+
+class QueryBudgetTests(TestCase):
+    def test_streamed_exports_have_no_budget(self):
+        # Their queries run after QueryBudgetMiddleware stopped counting.
+        for viewset in (ProductViewSet, OrderViewSet):
+            with self.subTest(viewset.__name__):
+                self.assertIsNone(get_query_budget(viewset.as_view({'get': 'export'}), 'GET'))
@@ -1,6 +1,6 @@
 from django.urls import path
 from rest_framework_nested import routers
-from store import views
+from store import async_views, views
 from django.urls import include
 
 app_name = 'store'
@@ -11,6 +11,7 @@ router.register('categories', views.CategoryViewSet, basename='category')
 router.register('carts', views.CartViewSet, basename='cart')
 router.register('customers', views.CustomerViewSet, basename='customer')
 router.register('orders', views.OrderViewSet, basename='order')
+router.register('moderation/comments', views.CommentModerationViewSet, basename='comment-moderation')
 
 products_router = routers.NestedDefaultRouter(router, 'products', lookup='product')
 products_router.register('comments', views.CommentViewSet, basename='product-comments')
@@ -26,6 +27,14 @@ urlpatterns = [
     path('', include(products_router.urls)),
     path('', include(cart_router.urls)),
     path('', include(order_router.urls)),
+    path('cache-stats/', views.ResponseCacheStatsView.as_view(), name='cache-stats'),
+    path('query-stats/', views.QueryStatsView.as_view(), name='query-stats'),
+    path('permission-stats/', views.PermissionCacheStatsView.as_view(), name='permission-stats'),
+    path('hashing-stats/', views.HashingStatsView.as_view(), name='hashing-stats'),
+    path('async/products/', async_views.product_list, name='async-product-list'),
+    path('async/products/<int:pk>/', async_views.product_detail, name='async-product-detail'),
+    path('async/categories/', async_views.category_list, name='async-category-list'),
+    path('async/carts/<uuid:pk>/', async_views.cart_detail, name='async-cart-detail'),
 
 ]
 
@@ -1,44 +1,71 @@
+import hashlib
+from collections.abc import Iterator
+
 from rest_framework.generics import ListCreateAPIView, RetrieveUpdateDestroyAPIView
+from django.http import Http404
 from django.shortcuts import get_object_or_404
-from .models import Product, Category, Comment, Cart, CartItem, Customer, Order, OrderItem
-from django.db.models import Count, Prefetch
+from .models import Product, Category, Comment, Customer, Order, OrderItem, Cart, CartItem
+from django.db.models import Count, F, Prefetch
 from rest_framework.decorators import api_view
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from .serializer import ProductSerializer, CartSerializer, CategorySerializer, CommentSerializer, CartItemSerializer, \
     AddCartItemSerializer, UpdateCartItemSerializer, CustomerSerializer, OrderSerializer, OrderItemsSerializer, \
-    OrderAdminSerializer, OrderCreateSerializer, OrderUpdateSerializer
+    OrderAdminSerializer, OrderCreateSerializer, OrderUpdateSerializer, CommentModerationSerializer, \
+    CommentModerationActionSerializer
 from rest_framework import status
 from rest_framework.viewsets import ModelViewSet
 from django_filters.rest_framework import DjangoFilterBackend
-from .filter import ProductFilter
-from rest_framework.filters import OrderingFilter, SearchFilter
+from .filter import OrderFilter, ProductFilter
+from rest_framework.filters import OrderingFilter
 from rest_framework.pagination import PageNumberPagination
-from .paginations import DefaultPagination
+from .paginations import KeysetPagination, ProductPagination
+from .parsers import NDJSONParser
+from rest_framework.parsers import JSONParser
 from rest_framework.viewsets import GenericViewSet
 from rest_framework.mixins import CreateModelMixin, DestroyModelMixin, RetrieveModelMixin
 from rest_framework.decorators import action
+from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
-from .permissions import IsStaffOrReadOnly, SendPrivetEmail, CustomDjangoPermission
-from .signals import order_created
-
-
-class ProductViewSet(ModelViewSet):
+from .permissions import IsStaffOrReadOnly, SendPrivetEmail, CustomDjangoPermission, get_permission_cache
+from . import pricing
+from .caching import CachedResponseMixin, get_response_cache
+from .authentication import StatelessJWTAuthentication, get_customer_id, get_identity_cache
+from .carts import get_cart_store
+from .exports import ExportMixin
+from .hashing import get_hashing_executor
+from .imports import ProductImporter
+from .fast_serializers import FastReadMixin, FastRetrieveMixin, compile_serializer
+from .middleware import query_metrics
+from .search import ProductSearchFilter
+
+
+class ProductViewSet(ExportMixin, CachedResponseMixin, FastReadMixin, ModelViewSet):
     serializer_class = ProductSerializer
-    queryset = Product.objects.select_related('category').annotate(comments_count=Count('comments')).order_by('id')
-    filter_backends = [DjangoFilterBackend, OrderingFilter, SearchFilter]
+    queryset = Product.objects.select_related('category') \
+        .annotate(price_after_tax=pricing.price_after_tax_expression()) \
+        .order_by('id')
+    filter_backends = [DjangoFilterBackend, OrderingFilter, ProductSearchFilter]
     search_fields = ['name', 'category__title']
-    ordering_fields = ['name', 'unit_price', 'inventory']
+    ordering_fields = ['name', 'unit_price', 'inventory', 'price_after_tax']
     # filterset_fields = ['category_id', 'inventory']
     filterset_class = ProductFilter
-    pagination_class = DefaultPagination
+    pagination_class = ProductPagination
+    # The import runs a few queries per batch of rows, so it has no budget.
+    # Nor has the export: it queries a chunk at a time while the response
+    # streams, after QueryBudgetMiddleware stopped counting.
+    query_budget = {'list': 3, 'retrieve': 3, 'create': 3, 'update': 3, 'partial_update': 3, 'destroy': 3}
+    authentication_classes = [StatelessJWTAuthentication]
     permission_classes = [IsStaffOrReadOnly]
+    cache_models = [Product, Category, Comment]
+    import_batch_size = 500
 
     def get_serializer_context(self):
         return {'request': self.request}
 
     # fiter by input in URLs
     # def get_queryset(self):
-    #     queryset = Product.objects.select_related('category').annotate(comments_count=Count('comments')).all()
+    #     queryset = Product.objects.select_related('category').all()
     #     category_id_params = self.request.query_params.get('category_id')
     #     if category_id_params is not None:
     #         queryset = queryset.filter(category_id=category_id_params)
@@ -52,11 +79,27 @@ class ProductViewSet(ModelViewSet):
         product.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
-
-class CategoryViewSet(ModelViewSet):
+    @action(detail=False, methods=['post'], url_path='import', permission_classes=[IsAdminUser],
+            parser_classes=[JSONParser, NDJSONParser])
+    def bulk_import(self, request):
+        """
+        Creates or updates the products of a JSON array or an NDJSON body,
+        see `store.imports`. Invalid rows are reported, the others saved.
+        """
+        rows = request.data
+        # A JSON array, or the lazy rows of an NDJSON body.
+        if not isinstance(rows, (list, Iterator)):
+            return Response({'detail': 'Expected a list of products.'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(ProductImporter(self.import_batch_size).run(rows))
+
+
+class CategoryViewSet(CachedResponseMixin, ModelViewSet):
     serializer_class = CategorySerializer
     queryset = Category.objects.annotate(products_count=Count('products'))
     permission_classes = [IsStaffOrReadOnly]
+    cache_models = [Category, Product]
+    query_budget = 2
+    authentication_classes = [StatelessJWTAuthentication]
 
     def destroy(self, request, pk):
         category = get_object_or_404(Category.objects.annotate(products_count=Count('products')), pk=pk)
@@ -68,27 +111,135 @@ class CategoryViewSet(ModelViewSet):
 
 
 class CommentViewSet(ModelViewSet):
+    """
+    Lists the approved comments of a product, newest first, in keyset pages.
+    The first page is cached per product until a comment of that product
+    is approved, unapproved or edited while approved.
+    """
     serializer_class = CommentSerializer
+    pagination_class = KeysetPagination
+    filter_backends = [OrderingFilter]
+    ordering = ['-datetime_created', '-id']
+    ordering_fields = ['datetime_created']
+    query_budget = {'list': 2, 'retrieve': 3, 'create': 3, 'update': 3, 'partial_update': 3, 'destroy': 3}
+    authentication_classes = [StatelessJWTAuthentication]
 
     def get_queryset(self):
         product_pk = self.kwargs['product_pk']
-        return Comment.objects.filter(product_id=product_pk).all()
+        if self.action == 'list':
+            # The product name is read once by list().
+            return Comment.approved.filter(product_id=product_pk)
+        if self.action == 'retrieve':
+            return Comment.approved.select_related('product').filter(product_id=product_pk)
+        return Comment.objects.select_related('product').filter(product_id=product_pk).all()
 
     def get_serializer_context(self):
         return {'product_pk': self.kwargs['product_pk']}
 
+    def list(self, request, product_pk):
+        product_name = Product.objects.filter(pk=product_pk).values_list('name', flat=True).first()
+        if product_name is None:
+            raise Http404('No Product matches the given query.')
+
+        cache = get_response_cache()
+        key = None
+        if not request.query_params:
+            parts = [request.get_host(), product_pk, product_name, cache.scoped_version(Comment, product_pk)]
+            key = 'store:comments:' + hashlib.sha1(repr(parts).encode()).hexdigest()
+            data = cache.get(key)
+            if data is not None:
+                return Response(data, headers={'X-Cache': 'HIT'})
+
+        page = self.paginate_queryset(self.filter_queryset(self.get_queryset()))
+        context = dict(self.get_serializer_context(), product_name=product_name)
+        response = self.get_paginated_response(compile_serializer(CommentSerializer).many(page, context))
+        if key is not None:
+            cache.set(key, response.data)
+            response['X-Cache'] = 'MISS'
+        return response
+
+
+class CommentModerationViewSet(GenericViewSet):
+    """
+    The waiting comments, oldest first, optionally of one `?product=`, with
+    bulk approve/reject of up to 1000 ids in one UPDATE.
+    """
+    serializer_class = CommentModerationSerializer
+    permission_classes = [IsAdminUser]
+    pagination_class = KeysetPagination
+    filter_backends = [OrderingFilter]
+    ordering = ['datetime_created', 'id']
+    ordering_fields = ['datetime_created']
+    query_budget = {'list': 1, 'approve': 4, 'reject': 4}
+    authentication_classes = [StatelessJWTAuthentication]
 
-class CartViewSet(CreateModelMixin,
+    def get_queryset(self):
+        queryset = Comment.objects.filter(status=Comment.COMMENT_STATUS_WAITING) \
+            .annotate(product_name=F('product__name'))
+        product = self.request.query_params.get('product')
+        if product is not None:
+            if not product.isdigit():
+                raise ValidationError({'product': 'A valid integer is required.'})
+            queryset = queryset.filter(product_id=product)
+        return queryset
+
+    def list(self, request):
+        page = self.paginate_queryset(self.filter_queryset(self.get_queryset()))
+        return self.get_paginated_response(compile_serializer(CommentModerationSerializer).many(page))
+
+    def moderate(self, request, new_status):
+        serializer = CommentModerationActionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        updated = Comment.objects.filter(id__in=serializer.validated_data['ids']) \
+            .exclude(status=new_status).update(status=new_status)
+        return Response({'updated': updated})
+
+    @action(detail=False, methods=['post'])
+    def approve(self, request):
+        return self.moderate(request, Comment.COMMENT_STATUS_APPROVED)
+
+    @action(detail=False, methods=['post'])
+    def reject(self, request):
+        return self.moderate(request, Comment.COMMENT_STATUS_NOT_APPROVED)
+
+
+class CartViewSet(FastRetrieveMixin,
+                  CreateModelMixin,
                   RetrieveModelMixin,
                   DestroyModelMixin,
                   GenericViewSet):
     serializer_class = CartSerializer
-    queryset = Cart.objects.prefetch_related('items__product')
     lookup_value_regex = '[0-9a-fA-F]{8}\-?[0-9a-fA-F]{4}\-?[0-9a-fA-F]{4}\-?[0-9a-fA-F]{4}\-?[0-9a-fA-F]{12}'
+    query_budget = 3
+    authentication_classes = [StatelessJWTAuthentication]
+
+    def get_queryset(self):
+        # Only read by explain_querysets: carts go through the store, which
+        # has no queryset unless it is the ORM one.
+        return getattr(get_cart_store(), 'cart_queryset', Cart.objects.none)()
+
+    def get_object(self):
+        cart = get_cart_store().get(self.kwargs['pk'])
+        if cart is None:
+            raise Http404('No Cart matches the given query.')
+        self.check_object_permissions(self.request, cart)
+        return cart
 
+    def perform_create(self, serializer):
+        serializer.instance = get_cart_store().create()
 
-class CartItemsViewSet(ModelViewSet):
+    def destroy(self, request, pk):
+        if not get_cart_store().delete(pk):
+            raise Http404('No Cart matches the given query.')
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class CartItemsViewSet(FastRetrieveMixin, ModelViewSet):
     http_method_names = ['get', 'post', 'patch', 'delete']
+    lookup_value_regex = '[0-9]+'
+    query_budget = {'list': 1, 'retrieve': 1, 'create': 4, 'partial_update': 3, 'destroy': 3, 'bulk': 4}
+    authentication_classes = [StatelessJWTAuthentication]
+
     def get_serializer_class(self):
         if self.request.method == 'POST':
             return AddCartItemSerializer
@@ -96,27 +247,57 @@ class CartItemsViewSet(ModelViewSet):
             return UpdateCartItemSerializer
         return CartItemSerializer
 
-    def get_queryset(self):
-        cart_pk = self.kwargs['cart_pk']
-        return CartItem.objects.select_related('product').filter(cart_id=cart_pk).all()
-
     def get_serializer_context(self):
         return {'cart_pk': self.kwargs['cart_pk']}
 
+    def get_queryset(self):
+        # Only read by explain_querysets, like CartViewSet.get_queryset().
+        store = get_cart_store()
+        if not hasattr(store, 'item_queryset'):
+            return CartItem.objects.none()
+        return store.item_queryset(self.kwargs['cart_pk'])
+
+    def get_object(self):
+        item = get_cart_store().get_item(self.kwargs['cart_pk'], self.kwargs['pk'])
+        if item is None:
+            raise Http404('No CartItem matches the given query.')
+        self.check_object_permissions(self.request, item)
+        return item
+
+    def list(self, request, cart_pk):
+        items = get_cart_store().items(cart_pk)
+        return Response(self.get_fast_serializer().many(items, self.get_serializer_context()))
+
+    def perform_destroy(self, instance):
+        get_cart_store().remove_item(self.kwargs['cart_pk'], instance.id)
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request, cart_pk):
+        serializer = AddCartItemSerializer(data=request.data, many=True, context=self.get_serializer_context())
+        serializer.is_valid(raise_exception=True)
+        items = serializer.save()
+        data = compile_serializer(CartItemSerializer).many(items, self.get_serializer_context())
+        return Response(data, status=status.HTTP_201_CREATED)
+
 
 class CustomerViewSet(ModelViewSet):
     serializer_class = CustomerSerializer
     queryset = Customer.objects.all()
     permission_classes = [IsAdminUser]
+    query_budget = 2
+    authentication_classes = [StatelessJWTAuthentication]
 
     @action(detail=False, methods=['PUT', 'GET'], permission_classes=[IsAuthenticated])
     def me(self, request):
         user_id = request.user.id
-        customer = Customer.objects.get(user_id=user_id)
         if request.method == 'GET':
+            customer = get_identity_cache().get_customer(user_id)
+            if customer is None:
+                raise Http404('No Customer matches the given query.')
             serializer = CustomerSerializer(customer)
             return Response(serializer.data)
         elif request.method == 'PUT':
+            customer = get_object_or_404(Customer, user_id=user_id)
             serializer = CustomerSerializer(customer, data=request.data)
             serializer.is_valid(raise_exception=True)
             serializer.save()
@@ -127,11 +308,25 @@ class CustomerViewSet(ModelViewSet):
         return Response(f'sending email to customer:{pk}')
 
 
-class OrderViewSet(ModelViewSet):
+class OrderViewSet(ExportMixin, FastReadMixin, ModelViewSet):
     http_method_names = ['get', 'patch', 'post', 'delete', 'options', 'head']
+    queryset = Order.objects.prefetch_related(
+        Prefetch(
+            'items', queryset=OrderItem.objects.select_related('product'))).select_related('customer__user') \
+        .annotate(total_price=pricing.total_expression('items__quantity', 'items__unit_price'))
+    filter_backends = [DjangoFilterBackend, OrderingFilter]
+    filterset_class = OrderFilter
+    ordering_fields = ['datetime_created', 'total_price']
+    export_serializer_class = OrderAdminSerializer
+    # Checkout is a fixed number of queries, see store.checkout. Like every
+    # budget, it assumes the user and customer come from the identity cache.
+    # The export streams its queries after the view returned, see
+    # ProductViewSet, so it has no budget.
+    query_budget = {'list': 2, 'retrieve': 2, 'create': 11}
+    authentication_classes = [StatelessJWTAuthentication]
 
     def get_permissions(self):
-        if self.request.method in ['PATCH', 'DELETE']:
+        if self.request.method in ['PATCH', 'DELETE'] or self.action == 'export':
             return [IsAdminUser()]
         return [IsAuthenticated()]
 
@@ -147,25 +342,22 @@ class OrderViewSet(ModelViewSet):
         return OrderSerializer
 
     def get_queryset(self):
-        queryset = Order.objects.prefetch_related(
-            Prefetch(
-                'items', queryset=OrderItem.objects.select_related('product'))).select_related('customer__user').all()
+        queryset = super().get_queryset()
         user = self.request.user
         if user.is_staff:
             return queryset
-        return queryset.filter(customer__user_id=user.id)
+        return queryset.filter(customer_id=get_customer_id(user))
 
     def get_serializer_context(self):
-        return {'user_id': self.request.user.id}
+        return {'user_id': self.request.user.id, 'customer_id': get_customer_id(self.request.user)}
 
     def create(self, request, *args, **kwargs):
         create_order_serializer = OrderCreateSerializer(
             data=request.data,
-            context={'user_id': self.request.user.id})
+            context=self.get_serializer_context())
         create_order_serializer.is_valid(raise_exception=True)
         created_order = create_order_serializer.save()
-
-        order_created.send_rebust(self.__class__, order=created_order)
+        created_order = self.get_queryset().get(pk=created_order.pk)
 
         serializer = OrderSerializer(created_order)
         return Response(serializer.data)
@@ -177,3 +369,30 @@ class OrderItemViewSet(ModelViewSet):
         order_pk = self.kwargs['order_pk']
         return OrderItem.objects.select_related('product').filter(order_id=order_pk)
 
+
+class ResponseCacheStatsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(get_response_cache().stats())
+
+
+class QueryStatsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(query_metrics.stats())
+
+
+class PermissionCacheStatsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(get_permission_cache().stats())
+
+
+class HashingStatsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(get_hashing_executor().stats())